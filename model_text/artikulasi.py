@@ -128,11 +128,61 @@ class SequenceAligner:
     Menggunakan Needleman-Wunsch algorithm (dynamic programming)
     """
 
+    # Kode arah traceback (disimpan sebagai int8)
+    DONE, DIAGONAL, UP, LEFT = 0, 1, 2, 3
+
     @staticmethod
     def calculate_similarity(word1: str, word2: str) -> float:
         """Calculate similarity between two words"""
         return SequenceMatcher(None, word1.lower(), word2.lower()).ratio()
 
+    @staticmethod
+    def match_matrix(
+        reference: List[str],
+        detected: List[str],
+        match_threshold: float = 0.7
+    ) -> np.ndarray:
+        """
+        Matriks boolean (m x n): similarity(ref, det) >= match_threshold
+
+        Dihitung sekali per pasangan kata unik. Pasangan yang batas atas
+        similarity-nya (2*min(len)/(len1+len2), sama dengan real_quick_ratio)
+        sudah di bawah threshold dilewati tanpa memanggil SequenceMatcher.
+        """
+        ref_lower = [w.lower() for w in reference]
+        det_lower = [w.lower() for w in detected]
+        ref_unique = list(dict.fromkeys(ref_lower))
+        det_unique = list(dict.fromkeys(det_lower))
+        ref_index = {w: k for k, w in enumerate(ref_unique)}
+        det_index = {w: k for k, w in enumerate(det_unique)}
+
+        ref_len = np.array([len(w) for w in ref_unique], dtype=np.float64)
+        det_len = np.array([len(w) for w in det_unique], dtype=np.float64)
+        total_len = ref_len[:, None] + det_len[None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            upper_bound = np.where(
+                total_len > 0,
+                2.0 * np.minimum(ref_len[:, None], det_len[None, :]) / total_len,
+                1.0
+            )
+
+        unique_match = np.zeros((len(ref_unique), len(det_unique)), dtype=bool)
+        matcher = SequenceMatcher(None)
+        for b, det_word in enumerate(det_unique):
+            candidates = np.nonzero(upper_bound[:, b] >= match_threshold)[0]
+            if len(candidates) == 0:
+                continue
+            # SequenceMatcher meng-cache info seq2, jadi seq2 (kata terdeteksi) dipasang sekali
+            matcher.set_seq2(det_word)
+            for a in candidates:
+                matcher.set_seq1(ref_unique[a])
+                if matcher.quick_ratio() >= match_threshold:
+                    unique_match[a, b] = matcher.ratio() >= match_threshold
+
+        rows = np.array([ref_index[w] for w in ref_lower], dtype=np.int64)
+        cols = np.array([det_index[w] for w in det_lower], dtype=np.int64)
+        return unique_match[np.ix_(rows, cols)]
+
     @staticmethod
     def align_sequences(
         reference: List[str],
@@ -140,7 +190,12 @@ class SequenceAligner:
         match_threshold: float = 0.7
     ) -> List[Tuple[Optional[str], Optional[str], str]]:
         """
-        Align two sequences dengan dynamic programming
+        Align two sequences dengan dynamic programming (NumPy)
+
+        Hasil identik dengan versi awal align_sequences_naive di
+        benchmark_aligner.py (skor dan urutan tie-break diagonal > up > left sama). Tabel DP diisi per baris: nilai 'left'
+        adalah rantai dp[i][j-1] - 1, sehingga satu baris cukup dihitung dengan
+        prefix-max (np.maximum.accumulate) atas max(diagonal, up).
 
         Returns:
             List of (ref_word, det_word, match_type)
@@ -148,82 +203,57 @@ class SequenceAligner:
         """
         m, n = len(reference), len(detected)
 
-        # Initialize DP table
-        # dp[i][j] = (score, traceback)
-        dp = [[None for _ in range(n + 1)] for _ in range(m + 1)]
-
-        # Scoring
         MATCH_SCORE = 2
         MISMATCH_PENALTY = -1
         GAP_PENALTY = -1
 
-        # Initialize first row and column
-        for i in range(m + 1):
-            dp[i][0] = (i * GAP_PENALTY, 'up')
-        for j in range(n + 1):
-            dp[0][j] = (j * GAP_PENALTY, 'left')
-        dp[0][0] = (0, 'done')
+        is_match = SequenceAligner.match_matrix(reference, detected, match_threshold)
+        match_score = np.where(is_match, MATCH_SCORE, MISMATCH_PENALTY).astype(np.int64)
 
-        # Fill DP table
+        score = np.arange(n + 1, dtype=np.int64) * GAP_PENALTY
+        trace = np.empty((m + 1, n + 1), dtype=np.int8)
+        trace[0, :] = SequenceAligner.LEFT
+        trace[1:, 0] = SequenceAligner.UP
+        trace[0, 0] = SequenceAligner.DONE
+
+        offsets = np.arange(1, n + 1, dtype=np.int64) * GAP_PENALTY
         for i in range(1, m + 1):
-            for j in range(1, n + 1):
-                ref_word = reference[i-1]
-                det_word = detected[j-1]
-
-                # Calculate similarity
-                similarity = SequenceAligner.calculate_similarity(ref_word, det_word)
-
-                # Match/mismatch score
-                if similarity >= match_threshold:
-                    match_score = MATCH_SCORE
-                else:
-                    match_score = MISMATCH_PENALTY
-
-                # Three possible moves
-                diagonal = dp[i-1][j-1][0] + match_score
-                up = dp[i-1][j][0] + GAP_PENALTY  # deletion
-                left = dp[i][j-1][0] + GAP_PENALTY  # insertion
-
-                # Choose best move
-                max_score = max(diagonal, up, left)
-
-                if max_score == diagonal:
-                    dp[i][j] = (max_score, 'diagonal')
-                elif max_score == up:
-                    dp[i][j] = (max_score, 'up')
-                else:
-                    dp[i][j] = (max_score, 'left')
+            prev = score
+            diagonal = prev[:-1] + match_score[i - 1]
+            up = prev[1:] + GAP_PENALTY
+            best = np.maximum(diagonal, up)
+
+            # dp[i][j] = max(best[j], dp[i][j-1] + GAP) dengan dp[i][0] = i * GAP
+            row_start = i * GAP_PENALTY
+            shifted = np.maximum.accumulate(np.maximum(best - offsets, row_start))
+            row = shifted + offsets
+
+            trace[i, 1:] = np.where(
+                row == diagonal, SequenceAligner.DIAGONAL,
+                np.where(row == up, SequenceAligner.UP, SequenceAligner.LEFT)
+            )
+            score = np.concatenate(([row_start], row))
 
         # Traceback to get alignment
         alignment = []
         i, j = m, n
 
         while i > 0 or j > 0:
-            if dp[i][j][1] == 'diagonal':
-                ref_word = reference[i-1]
-                det_word = detected[j-1]
-                similarity = SequenceAligner.calculate_similarity(ref_word, det_word)
-
-                if similarity >= match_threshold:
-                    match_type = "match"
-                else:
-                    match_type = "substitution"
-
-                alignment.append((ref_word, det_word, match_type))
+            move = trace[i, j]
+            if move == SequenceAligner.DIAGONAL:
+                match_type = "match" if is_match[i-1, j-1] else "substitution"
+                alignment.append((reference[i-1], detected[j-1], match_type))
                 i -= 1
                 j -= 1
-
-            elif dp[i][j][1] == 'up':
+            elif move == SequenceAligner.UP:
                 # Deletion (word in reference but not in detected)
                 alignment.append((reference[i-1], None, "deletion"))
                 i -= 1
-
-            else:  # 'left'
+            else:
                 # Insertion (word in detected but not in reference)
                 alignment.append((None, detected[j-1], "insertion"))
                 j -= 1
 
-        # Reverse to get correct order
         alignment.reverse()
 
         return alignment
@@ -0,0 +1,227 @@
+"""
+Speech Assessment Service
+Satu pipeline untuk semua penilaian: audio di-decode sekali ke 16 kHz mono,
+VAD (tempo) dan Whisper (transkrip) berjalan bersamaan di buffer yang sama,
+lalu transkrip dibagikan ke scorer teks (artikulasi, struktur, topik) secara paralel.
+
+Semua model dimuat sekali saat service dibuat dan tetap di memori antar request.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+import whisper
+
+from artikulasi import PracticalPronunciationAssessment
+from speech_to_text import SpeechToText
+from tempo import TempoAnalyzer
+import struktur_berbicara
+
+SAMPLE_RATE = 16000
+
+
+def load_audio(audio_path: str, sampling_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode file audio (format apa pun yang didukung ffmpeg) ke float32 mono"""
+    return whisper.load_audio(audio_path, sr=sampling_rate)
+
+
+def segments_from_words(words: List[Dict], sampling_rate: int = SAMPLE_RATE,
+                        min_silence_sec: float = 0.1) -> List[Dict]:
+    """
+    Bangun segmen bicara (format Silero VAD, dalam sample) dari word timestamps Whisper.
+    Kata yang jaraknya kurang dari min_silence_sec digabung ke segmen yang sama.
+    """
+    segments = []
+    for word in words:
+        start = int(word['start'] * sampling_rate)
+        end = int(word['end'] * sampling_rate)
+        if segments and start - segments[-1]['end'] < min_silence_sec * sampling_rate:
+            segments[-1]['end'] = max(segments[-1]['end'], end)
+        else:
+            segments.append({'start': start, 'end': end})
+    return segments
+
+
+class SpeechAssessmentService:
+    """Service penilaian public speaking dengan model yang tetap dimuat"""
+
+    def __init__(
+        self,
+        whisper_model: str = "medium",
+        device: str = None,
+        language: str = "id",
+        structure_model_path: str = './best_model',
+        topic_dataset_path: Optional[str] = None,
+        tempo_source: str = "vad",
+        max_workers: int = 4
+    ):
+        """
+        Args:
+            whisper_model: Nama model Whisper
+            device: 'cpu' / 'cuda'; default cuda jika tersedia
+            language: Bahasa transkripsi
+            structure_model_path: Path model klasifikasi struktur
+            topic_dataset_path: Dataset topik (JSON); tanpa ini analisis topik dilewati
+            tempo_source: "vad" (Silero VAD) atau "whisper" (pakai word timestamps, tanpa VAD)
+            max_workers: Jumlah thread untuk tahap yang berjalan paralel
+        """
+        print("🚀 Initializing Speech Assessment Service")
+        self.tempo_source = tempo_source
+
+        self.stt = SpeechToText(model_name=whisper_model, device=device, language=language)
+
+        # TempoAnalyzer memanggil torch.set_num_threads(1); kembalikan supaya Whisper di CPU tidak ikut lambat
+        num_threads = torch.get_num_threads()
+        self.tempo = TempoAnalyzer(load_vad=(tempo_source == "vad"))
+        torch.set_num_threads(num_threads)
+
+        self.pronunciation = PracticalPronunciationAssessment(language=language)
+
+        self.structure_model_path = structure_model_path
+        struktur_berbicara.get_model(structure_model_path)
+
+        self.topic = None
+        if topic_dataset_path is not None:
+            from kata_kunci import AdvancedTopicRelevanceAnalyzer
+            self.topic = AdvancedTopicRelevanceAnalyzer(topic_dataset_path)
+
+        # Whisper dan Silero VAD menyimpan state saat inferensi, jadi tiap model dipakai satu request sekaligus
+        self._stt_lock = threading.Lock()
+        self._vad_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        print("✅ Speech Assessment Service ready!\n")
+
+    def _transcribe(self, audio: np.ndarray) -> Dict:
+        with self._stt_lock:
+            return self.stt.transcribe(audio)
+
+    def _detect_speech(self, audio: np.ndarray) -> List[Dict]:
+        with self._vad_lock:
+            return self.tempo.detect_speech(torch.from_numpy(audio), SAMPLE_RATE)
+
+    def _analyze_tempo(self, transcription: Dict, speech_timestamps: Optional[List[Dict]]) -> Dict:
+        words = [
+            word
+            for segment in transcription.get('segments', [])
+            for word in segment.get('words', [])
+        ]
+        if speech_timestamps is None:
+            speech_timestamps = segments_from_words(words, SAMPLE_RATE)
+
+        result = self.tempo.analyze_segments(speech_timestamps, SAMPLE_RATE)
+
+        # Kecepatan bicara dari word timestamps Whisper
+        speech_sec = sum(seg['end'] - seg['start'] for seg in speech_timestamps) / SAMPLE_RATE
+        result['speaking_rate'] = {
+            'total_words': len(words),
+            'speech_duration_sec': round(speech_sec, 2),
+            'words_per_minute': round(len(words) / speech_sec * 60, 1) if speech_sec > 0 else 0.0
+        }
+        return result
+
+    def _analyze_pronunciation(self, transcript: str, reference_text: str) -> Dict:
+        result = self.pronunciation.assess_pronunciation(
+            transcribed_text=transcript,
+            reference_text=reference_text
+        )
+        return self.pronunciation.get_simple_result(result)
+
+    def _analyze_structure(self, transcript: str) -> Dict:
+        result = struktur_berbicara.analyze_speech(
+            transcript, model_path=self.structure_model_path, verbose=False
+        )
+        return result['score']
+
+    def _analyze_topic(self, transcript: str, topic_id: str) -> Dict:
+        return self.topic.analyze_relevance(transcript, topic_id)['summary_result']
+
+    def assess(
+        self,
+        audio_path: str,
+        reference_text: Optional[str] = None,
+        topic_id: Optional[str] = None
+    ) -> Dict:
+        """
+        Penilaian lengkap satu rekaman
+
+        Args:
+            audio_path: Path file audio
+            reference_text: Teks acuan untuk penilaian artikulasi (opsional)
+            topic_id: ID topik untuk analisis relevansi (opsional)
+
+        Returns:
+            Dict berisi transkrip, hasil tiap scorer dan waktu per tahap
+        """
+        timings = {}
+        start_time = time.time()
+
+        # 1. Decode sekali
+        audio = load_audio(audio_path)
+        timings['decode'] = time.time() - start_time
+
+        # 2. Whisper dan VAD di buffer yang sama, berjalan bersamaan
+        stage_start = time.time()
+        vad_future = None
+        if self.tempo.model is not None:
+            vad_future = self.executor.submit(self._detect_speech, audio)
+        transcription = self._transcribe(audio)
+        speech_timestamps = vad_future.result() if vad_future is not None else None
+        timings['transcribe_vad'] = time.time() - stage_start
+
+        transcript = transcription['text'].strip()
+
+        # 3. Scorer teks dan tempo secara paralel
+        stage_start = time.time()
+        futures = {
+            'tempo': self.executor.submit(self._analyze_tempo, transcription, speech_timestamps),
+            'structure': self.executor.submit(self._analyze_structure, transcript),
+        }
+        if reference_text is not None:
+            futures['pronunciation'] = self.executor.submit(
+                self._analyze_pronunciation, transcript, reference_text
+            )
+        if topic_id is not None and self.topic is not None:
+            futures['topic'] = self.executor.submit(self._analyze_topic, transcript, topic_id)
+
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = {"error": f"Analysis failed: {str(e)}", "status": "failed"}
+        timings['scoring'] = time.time() - stage_start
+        timings['total'] = time.time() - start_time
+
+        return {
+            'transcript': transcript,
+            'duration_sec': round(len(audio) / SAMPLE_RATE, 2),
+            **results,
+            'timings': {k: round(v, 3) for k, v in timings.items()}
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+# ==================== DEMO ====================
+
+if __name__ == "__main__":
+    import sys
+
+    audio_path = sys.argv[1] if len(sys.argv) > 1 else "./bad.wav"
+
+    service = SpeechAssessmentService(whisper_model="medium", language="id")
+    result = service.assess(audio_path)
+
+    print("=" * 70)
+    print("📊 HASIL PENILAIAN")
+    print("=" * 70)
+    print(f"📝 Transkrip: {result['transcript']}")
+    print(f"⏱️ Tempo: {result['tempo'].get('summary', result['tempo'])}")
+    print(f"🏗️ Struktur: {result['structure']}")
+    print(f"⏲️ Waktu per tahap: {result['timings']}")
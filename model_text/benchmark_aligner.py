@@ -0,0 +1,185 @@
+"""
+BENCHMARK SEQUENCE ALIGNER
+Bandingkan SequenceAligner.align_sequences (NumPy) dengan align_sequences_naive
+pada transkrip 50 / 500 / 2000 kata, sekaligus memastikan hasil alignment identik.
+
+Pemakaian:
+    python benchmark_aligner.py
+    python benchmark_aligner.py --sizes 50 500 2000 --skip-naive-above 2000
+"""
+
+import argparse
+import random
+import time
+
+from typing import List, Optional, Tuple
+
+from artikulasi import SequenceAligner
+
+VOCAB = [
+    "saya", "kamu", "dia", "kami", "mereka", "akan", "sudah", "belum", "sedang",
+    "pergi", "datang", "makan", "minum", "membaca", "menulis", "belajar", "bekerja",
+    "rumah", "sekolah", "kantor", "pasar", "jalan", "kota", "desa", "buku", "meja",
+    "yang", "dan", "atau", "tetapi", "karena", "untuk", "dengan", "dari", "ke", "di",
+    "presentasi", "pengetahuan", "pembelajaran", "kesempatan", "perusahaan",
+]
+
+
+def align_sequences_naive(
+    reference: List[str],
+    detected: List[str],
+    match_threshold: float = 0.7
+) -> List[Tuple[Optional[str], Optional[str], str]]:
+    """
+    Versi awal SequenceAligner.align_sequences (list-of-tuples, SequenceMatcher
+    di setiap sel). Acuan untuk verifikasi dan benchmark.
+
+    Returns:
+        List of (ref_word, det_word, match_type)
+        match_type: "match", "substitution", "insertion", "deletion"
+    """
+    m, n = len(reference), len(detected)
+
+    # Initialize DP table
+    # dp[i][j] = (score, traceback)
+    dp = [[None for _ in range(n + 1)] for _ in range(m + 1)]
+
+    # Scoring
+    MATCH_SCORE = 2
+    MISMATCH_PENALTY = -1
+    GAP_PENALTY = -1
+
+    # Initialize first row and column
+    for i in range(m + 1):
+        dp[i][0] = (i * GAP_PENALTY, 'up')
+    for j in range(n + 1):
+        dp[0][j] = (j * GAP_PENALTY, 'left')
+    dp[0][0] = (0, 'done')
+
+    # Fill DP table
+    for i in range(1, m + 1):
+        for j in range(1, n + 1):
+            ref_word = reference[i-1]
+            det_word = detected[j-1]
+
+            # Calculate similarity
+            similarity = SequenceAligner.calculate_similarity(ref_word, det_word)
+
+            # Match/mismatch score
+            if similarity >= match_threshold:
+                match_score = MATCH_SCORE
+            else:
+                match_score = MISMATCH_PENALTY
+
+            # Three possible moves
+            diagonal = dp[i-1][j-1][0] + match_score
+            up = dp[i-1][j][0] + GAP_PENALTY  # deletion
+            left = dp[i][j-1][0] + GAP_PENALTY  # insertion
+
+            # Choose best move
+            max_score = max(diagonal, up, left)
+
+            if max_score == diagonal:
+                dp[i][j] = (max_score, 'diagonal')
+            elif max_score == up:
+                dp[i][j] = (max_score, 'up')
+            else:
+                dp[i][j] = (max_score, 'left')
+
+    # Traceback to get alignment
+    alignment = []
+    i, j = m, n
+
+    while i > 0 or j > 0:
+        if dp[i][j][1] == 'diagonal':
+            ref_word = reference[i-1]
+            det_word = detected[j-1]
+            similarity = SequenceAligner.calculate_similarity(ref_word, det_word)
+
+            if similarity >= match_threshold:
+                match_type = "match"
+            else:
+                match_type = "substitution"
+
+            alignment.append((ref_word, det_word, match_type))
+            i -= 1
+            j -= 1
+
+        elif dp[i][j][1] == 'up':
+            # Deletion (word in reference but not in detected)
+            alignment.append((reference[i-1], None, "deletion"))
+            i -= 1
+
+        else:  # 'left'
+            # Insertion (word in detected but not in reference)
+            alignment.append((None, detected[j-1], "insertion"))
+            j -= 1
+
+    # Reverse to get correct order
+    alignment.reverse()
+
+    return alignment
+
+
+def make_transcripts(n_words: int, error_rate: float, seed: int):
+    """Referensi acak + versi 'terdeteksi' dengan substitusi/hapus/sisip kata"""
+    rng = random.Random(seed)
+    reference = [rng.choice(VOCAB) for _ in range(n_words)]
+    detected = []
+    for word in reference:
+        r = rng.random()
+        if r < error_rate / 3:
+            continue  # deletion
+        if r < 2 * error_rate / 3:
+            # substitution: kata mirip (typo) atau kata lain
+            if rng.random() < 0.5 and len(word) > 2:
+                k = rng.randrange(len(word))
+                word = word[:k] + rng.choice("aiueo") + word[k + 1:]
+            else:
+                word = rng.choice(VOCAB)
+        detected.append(word)
+        if r > 1 - error_rate / 3:
+            detected.append(rng.choice(VOCAB))  # insertion
+    return reference, detected
+
+
+def timeit(fn, *args, repeat: int = 1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SequenceAligner")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-naive-above", type=int, default=None,
+                        help="lewati versi naive untuk ukuran di atas nilai ini")
+    args = parser.parse_args()
+
+    print(f"{'words':>6} {'naive (s)':>11} {'numpy (s)':>11} {'speedup':>9}  identical")
+    print("-" * 52)
+    for n_words in args.sizes:
+        reference, detected = make_transcripts(n_words, args.error_rate, seed=n_words)
+        fast_time, fast = timeit(SequenceAligner.align_sequences, reference, detected, repeat=args.repeat)
+
+        if args.skip_naive_above is not None and n_words > args.skip_naive_above:
+            print(f"{n_words:>6} {'-':>11} {fast_time:>11.4f} {'-':>9}  -")
+            continue
+
+        naive_time, naive = timeit(align_sequences_naive, reference, detected)
+        identical = fast == naive
+        print(f"{n_words:>6} {naive_time:>11.4f} {fast_time:>11.4f} {naive_time / fast_time:>8.1f}x  {identical}")
+        if not identical:
+            raise SystemExit(f"❌ Hasil alignment berbeda untuk {n_words} kata")
+
+    print("✅ Semua hasil alignment identik")
+
+
+if __name__ == "__main__":
+    main()
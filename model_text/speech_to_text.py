@@ -6,7 +6,9 @@ Standalone Speech-to-Text module using Whisper
 
 import whisper
 import torch
+import numpy as np
 import warnings
+from typing import Union
 warnings.filterwarnings('ignore')
 
 
@@ -38,12 +40,16 @@ class SpeechToText:
 
         self.language = language
 
-    def transcribe(self, audio_path: str, **kwargs):
+    def transcribe(self, audio_path: Union[str, np.ndarray], **kwargs):
         """
         Transcribe audio file to text.
+        audio_path can also be a float32 16 kHz mono waveform (already decoded).
         Returns dict: {'text': str, 'segments': list, 'language': str}
         """
-        print(f"🎧 Transcribing: {audio_path}")
+        if isinstance(audio_path, str):
+            print(f"🎧 Transcribing: {audio_path}")
+        else:
+            print(f"🎧 Transcribing waveform: {len(audio_path) / whisper.audio.SAMPLE_RATE:.1f}s")
         result = self.model.transcribe(
             audio_path,
             language=self.language,
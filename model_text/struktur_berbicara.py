@@ -7,11 +7,13 @@ dengan scoring otomatis untuk penilaian
 # import os
 # os.environ['WANDB_DISABLED'] = 'true'
 
+import os
+import threading
 import pandas as pd
 import torch
 import re
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Union
 
 # ============ 1. SENTENCE SPLITTER ============
 
@@ -23,57 +25,112 @@ def split_into_sentences(text: str) -> List[str]:
     sentences = [s.strip() for s in sentences if s.strip()]
     return sentences
 
-# ============ 2. BATCH PREDICTION ============
+# ============ 2. MODEL REGISTRY ============
+
+# Model dimuat sekali per proses, key: (path absolut, device, quantize)
+_MODEL_REGISTRY: Dict[Tuple[str, str, bool], Tuple] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_model(model_path='./best_model', device: str = None, quantize: bool = False):
+    """
+    Ambil (tokenizer, model, device) dari registry, load dari disk hanya saat pertama kali
+
+    Args:
+        model_path: Path ke model yang sudah di-train
+        device: 'cpu' / 'cuda'; default cuda jika tersedia
+        quantize: Dynamic int8 quantization untuk layer Linear (hanya di CPU)
+    """
+    if device is None:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    quantize = quantize and device == 'cpu'
+    key = (os.path.abspath(model_path), device, quantize)
+
+    with _REGISTRY_LOCK:
+        if key not in _MODEL_REGISTRY:
+            tokenizer = AutoTokenizer.from_pretrained(model_path)
+            model = AutoModelForSequenceClassification.from_pretrained(model_path)
+            model.eval()
+            if quantize:
+                model = torch.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            model.to(device)
+            _MODEL_REGISTRY[key] = (tokenizer, model, device)
+        return _MODEL_REGISTRY[key]
+
+
+def clear_model_registry():
+    """Lepas semua model yang sudah dimuat"""
+    with _REGISTRY_LOCK:
+        _MODEL_REGISTRY.clear()
+
+# ============ 3. BATCH PREDICTION ============
 
 def predict_sentences(sentences: List[str], model_path='./best_model',
-                      confidence_threshold: float = 0.7) -> List[Dict]:
-    """Prediksi label untuk list kalimat"""
+                      confidence_threshold: float = 0.7, batch_size: int = 32,
+                      device: str = None, quantize: bool = False) -> List[Dict]:
+    """
+    Prediksi label untuk list kalimat
+
+    Kalimat diurutkan berdasarkan panjang token lalu diproses per batch dengan
+    dynamic padding (padding hanya sampai kalimat terpanjang di batch, max 128).
+    Urutan hasil tetap sama dengan urutan input.
+    """
 
-    tokenizer = AutoTokenizer.from_pretrained(model_path)
-    model = AutoModelForSequenceClassification.from_pretrained(model_path)
-    model.eval()
+    tokenizer, model, device = get_model(model_path, device, quantize)
 
     label_map = {0: 'opening', 1: 'content', 2: 'closing'}
-    results = []
+    results = [None] * len(sentences)
+    if not sentences:
+        return []
+
+    # Urutkan berdasarkan jumlah token supaya padding di tiap batch minimal
+    lengths = [len(ids) for ids in tokenizer(sentences, add_special_tokens=True,
+                                             max_length=128, truncation=True)['input_ids']]
+    order = sorted(range(len(sentences)), key=lambda i: lengths[i])
 
-    for idx, sentence in enumerate(sentences):
+    for start in range(0, len(order), batch_size):
+        batch_idx = order[start:start + batch_size]
         inputs = tokenizer(
-            sentence,
+            [sentences[i] for i in batch_idx],
             add_special_tokens=True,
             max_length=128,
-            padding='max_length',
+            padding='longest',
             truncation=True,
             return_tensors='pt'
         )
+        inputs = {k: v.to(device) for k, v in inputs.items()}
 
         with torch.no_grad():
             outputs = model(**inputs)
-            probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            predicted_class = torch.argmax(probs, dim=-1).item()
-            confidence = probs[0][predicted_class].item()
-
-        predicted_label = label_map[predicted_class]
-
-        # 🔁 Jika opening / closing tapi confidence rendah → ubah jadi content
-        if predicted_label in ['opening', 'closing'] and confidence < confidence_threshold:
-            predicted_label = 'content'
-
-        results.append({
-            'sentence_idx': idx,
-            'text': sentence,
-            'predicted_label': predicted_label,
-            'confidence': confidence,
-            'probs': {
-                'opening': probs[0][0].item(),
-                'content': probs[0][1].item(),
-                'closing': probs[0][2].item()
+            probs = torch.nn.functional.softmax(outputs.logits, dim=-1).float().cpu()
+
+        for row, idx in enumerate(batch_idx):
+            predicted_class = torch.argmax(probs[row]).item()
+            confidence = probs[row][predicted_class].item()
+            predicted_label = label_map[predicted_class]
+
+            # 🔁 Jika opening / closing tapi confidence rendah → ubah jadi content
+            if predicted_label in ['opening', 'closing'] and confidence < confidence_threshold:
+                predicted_label = 'content'
+
+            results[idx] = {
+                'sentence_idx': idx,
+                'text': sentences[idx],
+                'predicted_label': predicted_label,
+                'confidence': confidence,
+                'probs': {
+                    'opening': probs[row][0].item(),
+                    'content': probs[row][1].item(),
+                    'closing': probs[row][2].item()
+                }
             }
-        })
 
     return results
 
 
-# ============ 3. POST-PROCESSING & HEURISTICS ============
+# ============ 4. POST-PROCESSING & HEURISTICS ============
 
 def apply_structure_rules(predictions: List[Dict]) -> List[Dict]:
     """
@@ -121,7 +178,7 @@ def apply_structure_rules(predictions: List[Dict]) -> List[Dict]:
 
     return predictions
 
-# ============ 4. STRUCTURE SEGMENTATION ============
+# ============ 5. STRUCTURE SEGMENTATION ============
 
 def segment_speech_structure(predictions: List[Dict]) -> Dict:
     """
@@ -140,7 +197,7 @@ def segment_speech_structure(predictions: List[Dict]) -> Dict:
 
     return structure
 
-# ============ 5. SCORING SYSTEM ============
+# ============ 6. SCORING SYSTEM ============
 
 def calculate_structure_score(structure: Dict) -> Dict:
     """
@@ -189,32 +246,55 @@ def calculate_structure_score(structure: Dict) -> Dict:
         'closing_count': len(structure['closing'])
     }
 
-# ============ 6. MAIN ANALYSIS FUNCTION ============
+# ============ 7. MAIN ANALYSIS FUNCTION ============
 
-def analyze_speech(transcript: str, model_path='./best_model',
-                   apply_rules=True, verbose=True) -> Dict:
+def analyze_speech(transcript: Union[str, List[str]], model_path='./best_model',
+                   apply_rules=True, verbose=True, batch_size: int = 32,
+                   quantize: bool = False) -> Union[Dict, List[Dict]]:
     """
     Fungsi utama untuk menganalisis struktur speech
 
     Args:
-        transcript: Teks lengkap dari speech
+        transcript: Teks lengkap dari speech, atau list transkrip untuk bulk scoring
+                    (semua kalimat dari semua transkrip diprediksi dalam batch bersama)
         model_path: Path ke model yang sudah di-train
         apply_rules: Apakah menggunakan heuristic rules
         verbose: Tampilkan detail atau tidak
+        batch_size: Jumlah kalimat per batch prediksi
+        quantize: Pakai model dynamic int8 (CPU)
 
     Returns:
-        Dict berisi hasil analisis lengkap
+        Dict berisi hasil analisis lengkap (list of Dict jika input berupa list)
     """
 
+    transcripts = [transcript] if isinstance(transcript, str) else list(transcript)
+
     # 1. Split into sentences
-    sentences = split_into_sentences(transcript)
+    all_sentences = [split_into_sentences(t) for t in transcripts]
+
+    # 2. Predict semua kalimat sekaligus
+    flat = [s for sentences in all_sentences for s in sentences]
+    flat_predictions = predict_sentences(flat, model_path, batch_size=batch_size, quantize=quantize)
+
+    results = []
+    offset = 0
+    for text, sentences in zip(transcripts, all_sentences):
+        predictions = flat_predictions[offset:offset + len(sentences)]
+        offset += len(sentences)
+        for idx, pred in enumerate(predictions):
+            pred['sentence_idx'] = idx
+        results.append(_analyze_predictions(text, sentences, predictions, apply_rules, verbose))
+
+    return results[0] if isinstance(transcript, str) else results
+
+
+def _analyze_predictions(transcript: str, sentences: List[str], predictions: List[Dict],
+                         apply_rules=True, verbose=True) -> Dict:
+    """Rules, segmentasi, scoring dan laporan untuk satu transkrip"""
 
     if verbose:
         print(f"📝 Jumlah kalimat terdeteksi: {len(sentences)}")
 
-    # 2. Predict each sentence
-    predictions = predict_sentences(sentences, model_path)
-
     # 3. Apply rules (optional)
     if apply_rules:
         predictions = apply_structure_rules(predictions)
@@ -13,8 +13,17 @@ warnings.filterwarnings('ignore')
 class TempoAnalyzer:
     """Analyzer untuk tempo dan jeda bicara"""
     
-    def __init__(self):
-        """Initialize Silero VAD model"""
+    def __init__(self, load_vad: bool = True):
+        """
+        Initialize Silero VAD model
+        
+        Args:
+            load_vad: False jika segmen bicara didapat dari sumber lain (analyze_segments saja)
+        """
+        if not load_vad:
+            self.model = None
+            return
+        
         print("🔄 Loading Silero VAD model...")
         
         torch.set_num_threads(1)
@@ -55,17 +64,51 @@ class TempoAnalyzer:
         try:
             # Read audio
             wav = self.read_audio(audio_path, sampling_rate=sampling_rate)
-            
-            # Detect speech segments
-            speech_timestamps = self.get_speech_timestamps(
-                wav,
-                self.model,
-                sampling_rate=sampling_rate,
-                threshold=0.5,
-                min_speech_duration_ms=250,
-                min_silence_duration_ms=100
-            )
-            
+        except Exception as e:
+            return {
+                "error": f"Analysis failed: {str(e)}",
+                "status": "failed"
+            }
+        
+        return self.analyze_waveform(wav, sampling_rate)
+    
+    def detect_speech(self, wav: torch.Tensor, sampling_rate: int = 16000) -> List[Dict]:
+        """Deteksi segmen bicara (dalam sample) dari waveform mono yang sudah di-decode"""
+        return self.get_speech_timestamps(
+            wav,
+            self.model,
+            sampling_rate=sampling_rate,
+            threshold=0.5,
+            min_speech_duration_ms=250,
+            min_silence_duration_ms=100
+        )
+    
+    def analyze_waveform(self, wav: torch.Tensor, sampling_rate: int = 16000) -> Dict:
+        """
+        Analisis tempo dari waveform mono (torch.Tensor float) tanpa membaca file lagi
+        """
+        try:
+            speech_timestamps = self.detect_speech(wav, sampling_rate)
+        except Exception as e:
+            return {
+                "error": f"Analysis failed: {str(e)}",
+                "status": "failed"
+            }
+        
+        return self.analyze_segments(speech_timestamps, sampling_rate)
+    
+    def analyze_segments(self, speech_timestamps: List[Dict], sampling_rate: int = 16000) -> Dict:
+        """
+        Analisis tempo dari segmen bicara yang sudah terdeteksi
+        
+        Args:
+            speech_timestamps: List {'start': sample, 'end': sample} (format Silero VAD)
+            sampling_rate: Sample rate yang dipakai untuk posisi sample
+        
+        Returns:
+            Dictionary berisi hasil analisis
+        """
+        try:
             if not speech_timestamps:
                 return {
                     "error": "No speech detected in audio",
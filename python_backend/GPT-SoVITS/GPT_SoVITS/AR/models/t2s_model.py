@@ -10,11 +10,14 @@ from torchmetrics.classification import MulticlassAccuracy
 from tqdm import tqdm
 
 from AR.models.utils import (
+    apply_repetition_penalty,
     dpo_loss,
     get_batch_logps,
+    is_cancelled,
     make_pad_mask,
     make_pad_mask_left,
     make_reject_y,
+    multinomial_sample_one_no_sync,
     sample,
     topk_sampling,
 )
@@ -118,6 +121,12 @@ class T2SBlock:
 
         self.false = torch.tensor(False, dtype=torch.bool)
 
+    def qkv(self, x: torch.Tensor):
+        return F.linear(x, self.qkv_w, self.qkv_b)
+
+    def out(self, x: torch.Tensor):
+        return F.linear(x, self.out_w, self.out_b)
+
     @torch.jit.ignore
     def to_mask(
         self,
@@ -139,7 +148,7 @@ class T2SBlock:
         padding_mask: Optional[torch.Tensor] = None,
         torch_sdpa: bool = True,
     ):
-        q, k, v = F.linear(self.to_mask(x, padding_mask), self.qkv_w, self.qkv_b).chunk(3, dim=-1)
+        q, k, v = self.qkv(self.to_mask(x, padding_mask)).chunk(3, dim=-1)
 
         batch_size = q.shape[0]
         q_len = q.shape[1]
@@ -159,7 +168,7 @@ class T2SBlock:
             attn = scaled_dot_product_attention(q, k, v, attn_mask)
 
         attn = attn.transpose(1, 2).reshape(batch_size, q_len, -1)
-        attn = F.linear(self.to_mask(attn, padding_mask), self.out_w, self.out_b)
+        attn = self.out(self.to_mask(attn, padding_mask))
 
         x = x + attn
         x = F.layer_norm(x, [self.hidden_dim], self.norm_w1, self.norm_b1, self.norm_eps1)
@@ -181,7 +190,7 @@ class T2SBlock:
         attn_mask: torch.Tensor = None,
         torch_sdpa: bool = True,
     ):
-        q, k, v = F.linear(x, self.qkv_w, self.qkv_b).chunk(3, dim=-1)
+        q, k, v = self.qkv(x).chunk(3, dim=-1)
 
         k_cache = torch.cat([k_cache, k], dim=1)
         v_cache = torch.cat([v_cache, v], dim=1)
@@ -200,7 +209,7 @@ class T2SBlock:
             attn = scaled_dot_product_attention(q, k, v, attn_mask)
 
         attn = attn.transpose(1, 2).reshape(batch_size, q_len, -1)
-        attn = F.linear(attn, self.out_w, self.out_b)
+        attn = self.out(attn)
 
         x = x + attn
         x = F.layer_norm(
@@ -220,6 +229,84 @@ class T2SBlock:
         )
         return x, k_cache, v_cache
 
+    def decode_next_token_static(
+        self,
+        x: torch.Tensor,
+        k_cache: torch.Tensor,
+        v_cache: torch.Tensor,
+        cache_len: int,
+        attn_mask: Optional[torch.Tensor] = None,
+        torch_sdpa: bool = True,
+    ):
+        # k_cache/v_cache 为预分配的 [B, capacity, D] 缓冲区, 原地写入, 只读取前 kv_len 个位置
+        q, k, v = self.qkv(x).chunk(3, dim=-1)
+
+        batch_size = q.shape[0]
+        q_len = q.shape[1]
+        kv_len = cache_len + q_len
+
+        k_cache[:, cache_len:kv_len] = k
+        v_cache[:, cache_len:kv_len] = v
+
+        q = q.view(batch_size, q_len, self.num_heads, -1).transpose(1, 2)
+        k = k_cache[:, :kv_len].view(batch_size, kv_len, self.num_heads, -1).transpose(1, 2)
+        v = v_cache[:, :kv_len].view(batch_size, kv_len, self.num_heads, -1).transpose(1, 2)
+
+        if torch_sdpa:
+            attn = F.scaled_dot_product_attention(q, k, v, (~attn_mask) if attn_mask is not None else None)
+        else:
+            attn = scaled_dot_product_attention(q, k, v, attn_mask)
+
+        attn = attn.transpose(1, 2).reshape(batch_size, q_len, -1)
+        attn = self.out(attn)
+
+        x = x + attn
+        x = F.layer_norm(
+            x,
+            [self.hidden_dim],
+            self.norm_w1,
+            self.norm_b1,
+            self.norm_eps1,
+        )
+        x = x + self.mlp.forward(x)
+        x = F.layer_norm(
+            x,
+            [self.hidden_dim],
+            self.norm_w2,
+            self.norm_b2,
+            self.norm_eps2,
+        )
+        return x
+
+
+@torch.jit.script
+class T2SKVCache:
+    """
+    Fixed-capacity KV cache shared by all T2S blocks.
+    k_caches/v_caches: one [B, capacity, D] buffer per layer, only the first `length` positions are valid.
+    """
+
+    def __init__(self, k_caches: List[torch.Tensor], v_caches: List[torch.Tensor], length: int):
+        self.k_caches = k_caches
+        self.v_caches = v_caches
+        self.length: int = length
+
+    def capacity(self) -> int:
+        return self.k_caches[0].shape[1]
+
+    def index_select(self, index: torch.Tensor):
+        # 移除batch中已经生成完毕的序列
+        for i in range(len(self.k_caches)):
+            self.k_caches[i] = torch.index_select(self.k_caches[i], 0, index)
+            self.v_caches[i] = torch.index_select(self.v_caches[i], 0, index)
+
+    def trim_left(self, n: int):
+        # 丢弃所有序列共有的左侧 padding 位置, 之后每步的 attention 少算 n 列
+        for i in range(len(self.k_caches)):
+            self.k_caches[i] = self.k_caches[i][:, n:]
+            self.v_caches[i] = self.v_caches[i][:, n:]
+        self.length -= n
+
 
 @torch.jit.script
 class T2STransformer:
@@ -256,6 +343,45 @@ class T2STransformer:
             )
         return x, k_cache, v_cache
 
+    def process_prompt_static(
+        self,
+        x: torch.Tensor,
+        attn_mask: torch.Tensor,
+        capacity: int,
+        padding_mask: Optional[torch.Tensor] = None,
+        torch_sdpa: bool = True,
+    ):
+        k_caches: List[torch.Tensor] = []
+        v_caches: List[torch.Tensor] = []
+        kv_len = x.shape[1]
+        for i in range(self.num_blocks):
+            x, k_cache_, v_cache_ = self.blocks[i].process_prompt(x, attn_mask, padding_mask, torch_sdpa)
+            k_buf = torch.empty(
+                (k_cache_.shape[0], capacity, k_cache_.shape[2]), dtype=k_cache_.dtype, device=k_cache_.device
+            )
+            v_buf = torch.empty(
+                (v_cache_.shape[0], capacity, v_cache_.shape[2]), dtype=v_cache_.dtype, device=v_cache_.device
+            )
+            k_buf[:, :kv_len] = k_cache_
+            v_buf[:, :kv_len] = v_cache_
+            k_caches.append(k_buf)
+            v_caches.append(v_buf)
+        return x, T2SKVCache(k_caches, v_caches, kv_len)
+
+    def decode_next_token_static(
+        self,
+        x: torch.Tensor,
+        kv_cache: T2SKVCache,
+        attn_mask: Optional[torch.Tensor] = None,
+        torch_sdpa: bool = True,
+    ):
+        for i in range(self.num_blocks):
+            x = self.blocks[i].decode_next_token_static(
+                x, kv_cache.k_caches[i], kv_cache.v_caches[i], kv_cache.length, attn_mask, torch_sdpa
+            )
+        kv_cache.length += x.shape[1]
+        return x
+
 
 class Text2SemanticDecoder(nn.Module):
     def __init__(self, config, norm_first=False, top_k=3):
@@ -509,6 +635,13 @@ class Text2SemanticDecoder(nn.Module):
         acc = self.ar_accuracy_metric(logits.detach(), targets).item()
         return loss, acc
 
+    def embed_text(self, x: torch.LongTensor, bert_feature: Optional[torch.Tensor]) -> torch.Tensor:
+        x = self.ar_text_embedding(x)
+        if bert_feature is None:
+            ### 非中文文本的bert特征全为0, bert_proj(0) 就是偏置, 不必构造全零特征再做投影
+            return x + self.bert_proj.bias
+        return x + self.bert_proj(bert_feature.transpose(1, 2))
+
     # 需要看下这个函数和 forward 的区别以及没有 semantic 的时候 prompts 输入什么
     def infer(
         self,
@@ -575,6 +708,13 @@ class Text2SemanticDecoder(nn.Module):
             y = torch.concat([y, samples], dim=1)
         return y
 
+    def kv_cache_capacity(self, src_len: int, early_stop_num: int = -1, max_steps: int = 1500) -> int:
+        """
+        KV cache capacity for one decode: x_len + prompt_len + max_new_tokens.
+        """
+        max_new_tokens = max_steps if early_stop_num == -1 else min(max_steps, early_stop_num + 2)
+        return src_len + max_new_tokens
+
     def pad_y_eos(self, y, y_mask_int, eos_id):
         targets = F.pad(y, (0, 1), value=0) + eos_id * F.pad(y_mask_int, (0, 1), value=1)
         # 错位
@@ -608,11 +748,11 @@ class Text2SemanticDecoder(nn.Module):
             )
 
         max_len = kwargs.get("max_len", x_lens.max())
+        cancel_event = kwargs.get("cancel_event", None)
         x_list = []
         for x_item, bert_item in zip(x, bert_feature):
             # max_len = max(max_len, x_item.shape[0], bert_item.shape[1])
-            x_item = self.ar_text_embedding(x_item.unsqueeze(0))
-            x_item = x_item + self.bert_proj(bert_item.transpose(0, 1).unsqueeze(0))
+            x_item = self.embed_text(x_item.unsqueeze(0), bert_item.unsqueeze(0) if bert_item is not None else None)
             x_item = self.ar_text_position(x_item).squeeze(0)
             # x_item = F.pad(x_item,(0,0,0,max_len-x_item.shape[0]),value=0) if x_item.shape[0]<max_len else x_item  ### padding right
             x_item = (
@@ -627,8 +767,6 @@ class Text2SemanticDecoder(nn.Module):
         x_len = x.shape[1]
         stop = False
 
-        k_cache = None
-        v_cache = None
         ###################  first step ##########################
         assert y is not None, "Error: Prompt free is not supported batch_infer!"
         ref_free = False
@@ -636,8 +774,20 @@ class Text2SemanticDecoder(nn.Module):
         y_emb = self.ar_audio_embedding(y)
         y_len = y_emb.shape[1]
         prefix_len = y.shape[1]
-        y_lens = torch.LongTensor([y_emb.shape[1]] * y_emb.shape[0]).to(x.device)
-        y_pos = self.ar_audio_position(y_emb)
+        prompt_lens: Optional[torch.LongTensor] = kwargs.get("prompt_lens", None)
+        if prompt_lens is None:
+            y_lens = torch.LongTensor([y_emb.shape[1]] * y_emb.shape[0]).to(x.device)
+            y_pos = self.ar_audio_position(y_emb)
+        else:
+            ### 每行的参考音频不同(多音色拼batch), prompts 已左侧 padding 到相同长度,
+            ### 位置编码按每行的实际长度从 0 开始计算, padding 部分置零
+            y_lens = prompt_lens.to(x.device)
+            pad_lens = (y_len - y_lens).unsqueeze(1)
+            positions = torch.arange(y_len, device=x.device).unsqueeze(0) - pad_lens
+            self.ar_audio_position.extend_pe(y_emb)
+            pe = self.ar_audio_position.pe[0, positions.clamp(min=0)]
+            y_pos = y_emb * self.ar_audio_position.x_scale + self.ar_audio_position.alpha * pe
+            y_pos = y_pos.masked_fill((positions < 0).unsqueeze(-1), 0)
         xy_pos = torch.concat([x, y_pos], dim=1)
 
         ##### create mask #####
@@ -695,20 +845,27 @@ class Text2SemanticDecoder(nn.Module):
         # [PAD, PAD, PAD, 1, 2, 3,   4,   5,   6]]
 
         ###### decode #####
+        ### 每行文本左侧 padding 的长度, 长文本的行结束后, 剩余行共有的 padding 可以从 kv cache 中裁掉
+        x_pad_lens = max_len - x_lens.to(x.device)
         y_list = [None] * y.shape[0]
         batch_idx_map = list(range(y.shape[0]))
         idx_list = [None] * y.shape[0]
+        kv_cache = None
+        capacity = self.kv_cache_capacity(src_len, early_stop_num)
         for idx in tqdm(range(1500)):
             if idx == 0:
-                xy_dec, k_cache, v_cache = self.t2s_transformer.process_prompt(xy_pos, attn_mask, None)
+                xy_dec, kv_cache = self.t2s_transformer.process_prompt_static(xy_pos, attn_mask, capacity, None)
             else:
-                xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache, attn_mask)
+                xy_dec = self.t2s_transformer.decode_next_token_static(
+                    xy_pos, kv_cache, attn_mask[:, :, :, : kv_cache.length + 1]
+                )
             logits = self.ar_predict_layer(xy_dec[:, -1])
 
             if idx == 0:
-                attn_mask = F.pad(attn_mask[:, :, -1].unsqueeze(-2), (0, 1), value=False)
-            else:
-                attn_mask = F.pad(attn_mask, (0, 1), value=False)
+                ### 预分配解码阶段的mask, 之后每步只取前kv_len个位置
+                decode_mask = torch.zeros((bsz, self.num_head, 1, capacity), dtype=torch.bool, device=x.device)
+                decode_mask[:, :, :, :src_len] = attn_mask[:, :, -1].unsqueeze(-2)
+                attn_mask = decode_mask
 
             if idx < 11:  ###至少预测出10个token不然不给停止（0.4s）
                 logits = logits[:, :-1] 
@@ -741,10 +898,15 @@ class Text2SemanticDecoder(nn.Module):
                 # index = torch.LongTensor(batch_idx_map).to(y.device)
                 y = torch.index_select(y, dim=0, index=reserved_idx_of_batch_for_y)
                 attn_mask = torch.index_select(attn_mask, dim=0, index=reserved_idx_of_batch_for_y)
-                if k_cache is not None:
-                    for i in range(len(k_cache)):
-                        k_cache[i] = torch.index_select(k_cache[i], dim=0, index=reserved_idx_of_batch_for_y)
-                        v_cache[i] = torch.index_select(v_cache[i], dim=0, index=reserved_idx_of_batch_for_y)
+                y_lens = torch.index_select(y_lens, dim=0, index=reserved_idx_of_batch_for_y)
+                x_pad_lens = torch.index_select(x_pad_lens, dim=0, index=reserved_idx_of_batch_for_y)
+                if kv_cache is not None:
+                    kv_cache.index_select(reserved_idx_of_batch_for_y)
+                    trim = int(x_pad_lens.min()) if x_pad_lens.shape[0] > 0 else 0
+                    if trim > 0:
+                        kv_cache.trim_left(trim)
+                        attn_mask = attn_mask[:, :, :, trim:]
+                        x_pad_lens = x_pad_lens - trim
 
             if (early_stop_num != -1 and (y.shape[1] - prefix_len) > early_stop_num) or idx == 1499:
                 print("use early stop num:", early_stop_num)
@@ -754,6 +916,13 @@ class Text2SemanticDecoder(nn.Module):
                     idx_list[batch_index] = idx
                     y_list[batch_index] = y[i, :-1]
 
+            if is_cancelled(cancel_event):
+                print("T2S Decoding cancelled")
+                stop = True
+                for i, batch_index in enumerate(batch_idx_map):
+                    idx_list[batch_index] = idx
+                    y_list[batch_index] = y[i, :-1]
+
             if None not in idx_list:
                 stop = True
 
@@ -766,9 +935,13 @@ class Text2SemanticDecoder(nn.Module):
 
             ####################### update next step ###################################
             y_emb = self.ar_audio_embedding(y[:, -1:])
-            xy_pos = y_emb * self.ar_audio_position.x_scale + self.ar_audio_position.alpha * self.ar_audio_position.pe[
-                :, y_len + idx
-            ].to(dtype=y_emb.dtype, device=y_emb.device)
+            if prompt_lens is None:
+                pe = self.ar_audio_position.pe[:, y_len + idx]
+            else:
+                pe = self.ar_audio_position.pe[0, y_lens + idx].unsqueeze(1)
+            xy_pos = y_emb * self.ar_audio_position.x_scale + self.ar_audio_position.alpha * pe.to(
+                dtype=y_emb.dtype, device=y_emb.device
+            )
 
         if None in idx_list:
             for i in range(x.shape[0]):
@@ -796,18 +969,18 @@ class Text2SemanticDecoder(nn.Module):
         y_list = []
         idx_list = []
         for i in range(len(x)):
-            y, idx = next(self.infer_panel_naive(
+            y, idx = self.infer_panel_deferred(
                 x[i].unsqueeze(0),
                 x_lens[i],
                 prompts[i].unsqueeze(0) if prompts is not None else None,
-                bert_feature[i].unsqueeze(0),
+                bert_feature[i].unsqueeze(0) if bert_feature[i] is not None else None,
                 top_k,
                 top_p,
                 early_stop_num,
                 temperature,
                 repetition_penalty,
                 **kwargs,
-            ))
+            )
             y_list.append(y[0])
             idx_list.append(idx)
 
@@ -830,11 +1003,11 @@ class Text2SemanticDecoder(nn.Module):
     ):
         mute_emb_sim_matrix = kwargs.get("mute_emb_sim_matrix", None)
         chunk_split_thershold = kwargs.get("chunk_split_thershold", 0.3)
+        cancel_event = kwargs.get("cancel_event", None)
         check_token_num = 2
 
 
-        x = self.ar_text_embedding(x)
-        x = x + self.bert_proj(bert_feature.transpose(1, 2))
+        x = self.embed_text(x, bert_feature)
         x = self.ar_text_position(x)
 
         # AR Decoder
@@ -845,8 +1018,7 @@ class Text2SemanticDecoder(nn.Module):
         stop = False
         # print(1111111,self.num_layers)
 
-        k_cache = None
-        v_cache = None
+        kv_cache = None
         ###################  first step ##########################
         if y is not None:
             y_emb = self.ar_audio_embedding(y)
@@ -884,14 +1056,15 @@ class Text2SemanticDecoder(nn.Module):
             .to(device=x.device, dtype=torch.bool)
         )
 
+        capacity = self.kv_cache_capacity(src_len, early_stop_num)
         token_counter = 0
         curr_ptr = prefix_len
         for idx in tqdm(range(1500)):
             token_counter+=1
             if xy_attn_mask is not None:
-                xy_dec, k_cache, v_cache = self.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+                xy_dec, kv_cache = self.t2s_transformer.process_prompt_static(xy_pos, xy_attn_mask, capacity, None)
             else:
-                xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache)
+                xy_dec = self.t2s_transformer.decode_next_token_static(xy_pos, kv_cache)
 
             logits = self.ar_predict_layer(xy_dec[:, -1])
 
@@ -915,7 +1088,7 @@ class Text2SemanticDecoder(nn.Module):
                 y=y[:, :-1]
                 token_counter -= 1
 
-            if idx == 1499:
+            if idx == 1499 or is_cancelled(cancel_event):
                 stop = True
 
             if stop:
@@ -963,6 +1136,140 @@ class Text2SemanticDecoder(nn.Module):
 
 
 
+    def _get_rng_state(self, device: torch.device) -> Optional[torch.Tensor]:
+        if device.type == "cuda":
+            return torch.cuda.get_rng_state(device)
+        if device.type == "cpu":
+            return torch.get_rng_state()
+        return None
+
+    def _set_rng_state(self, state: torch.Tensor, device: torch.device):
+        if device.type == "cuda":
+            torch.cuda.set_rng_state(state, device)
+        else:
+            torch.set_rng_state(state)
+
+    def infer_panel_deferred(
+        self,
+        x: torch.LongTensor,  #####全部文本token
+        x_lens: torch.LongTensor,
+        prompts: torch.LongTensor,  ####参考音频token
+        bert_feature: torch.LongTensor,
+        top_k: int = -100,
+        top_p: int = 100,
+        early_stop_num: int = -1,
+        temperature: float = 1.0,
+        repetition_penalty: float = 1.35,
+        check_interval: int = 16,
+        **kwargs,
+    ):
+        """
+        infer_panel_naive 的非流式版本, 相同随机种子下输出完全一致:
+        - 生成的 token 写入预分配的 buffer, 不再每步 torch.concat
+        - EOS 记录在设备端, 每 check_interval 步才同步一次判断是否停止
+        - 重复惩罚使用 [B, vocab] 的出现掩码, 不再每步 gather 整个历史
+        停止时多解码的几步所消耗的随机数会被回退, 保证后续句子的采样也不受影响。
+        kwargs 中的 cancel_event 被置位时立即返回已生成的部分, 不做上述回退。
+        """
+        cancel_event = kwargs.get("cancel_event", None)
+        x = self.embed_text(x, bert_feature)
+        x = self.ar_text_position(x)
+        device = x.device
+        bsz = x.shape[0]
+        x_len = x.shape[1]
+
+        if prompts is not None:
+            y_emb = self.ar_audio_embedding(prompts)
+            y_len = y_emb.shape[1]
+            xy_pos = torch.concat([x, self.ar_audio_position(y_emb)], dim=1)
+            ref_free = False
+        else:
+            prompts = torch.zeros(bsz, 0, dtype=torch.int, device=device)
+            y_len = 0
+            xy_pos = x
+            ref_free = True
+        prefix_len = y_len
+
+        src_len = x_len + y_len
+        x_attn_mask_pad = F.pad(torch.zeros((x_len, x_len), dtype=torch.bool), (0, y_len), value=True)
+        y_attn_mask = F.pad(torch.triu(torch.ones(y_len, y_len, dtype=torch.bool), diagonal=1), (x_len, 0), value=False)
+        xy_attn_mask = (
+            torch.concat([x_attn_mask_pad, y_attn_mask], dim=0)
+            .view(1, 1, src_len, src_len)
+            .expand(bsz, self.num_head, -1, -1)
+            .to(device=device)
+        )
+
+        ### 不依赖EOS的停止步数在解码前就能确定
+        last_step = 1499 if early_stop_num == -1 else min(1499, early_stop_num)
+        capacity = self.kv_cache_capacity(src_len, early_stop_num)
+        y_dtype = torch.promote_types(prompts.dtype, torch.int)
+        y_buf = torch.empty((bsz, prefix_len + last_step + 1), dtype=y_dtype, device=device)
+        y_buf[:, :prefix_len] = prompts
+        seen = torch.zeros((bsz, self.vocab_size), dtype=torch.bool, device=device)
+        seen.scatter_(1, prompts.long(), True)
+        no_eos = last_step + 1
+        eos_step = torch.full((), no_eos, dtype=torch.long, device=device)
+        check_interval = max(1, check_interval)
+        rng_state = self._get_rng_state(device)
+        if rng_state is None:
+            check_interval = 1
+        window_start = 0
+
+        for idx in range(last_step + 1):
+            if is_cancelled(cancel_event):
+                ### 请求已取消, 结果会被调用方丢弃
+                print("T2S Decoding cancelled")
+                return y_buf[:, : prefix_len + idx], (0 if ref_free else idx)
+            if idx == 0:
+                xy_dec, kv_cache = self.t2s_transformer.process_prompt_static(xy_pos, xy_attn_mask, capacity, None)
+            else:
+                xy_dec = self.t2s_transformer.decode_next_token_static(xy_pos, kv_cache)
+            logits = self.ar_predict_layer(xy_dec[:, -1])
+            if idx < 11:  ###至少预测出10个token不然不给停止（0.4s）
+                logits = logits[:, :-1]
+            logits = apply_repetition_penalty(logits, seen, repetition_penalty)
+            samples = sample(logits, None, top_k=top_k, top_p=top_p, temperature=temperature)[0]
+
+            y_buf[:, prefix_len + idx] = samples[:, 0]
+            seen.scatter_(1, samples.long(), True)
+            is_eos = (torch.argmax(logits, dim=-1) == self.EOS).logical_or(samples[:, 0] == self.EOS).any()
+            eos_step = torch.where(is_eos.logical_and(eos_step == no_eos), idx, eos_step)
+
+            if (idx + 1) % check_interval == 0 or idx == last_step:
+                first_eos = int(eos_step)
+                if first_eos != no_eos:
+                    if idx > first_eos:
+                        ### 回退多解码的步数消耗的随机数, 重放到EOS那一步为止
+                        self._set_rng_state(rng_state, device)
+                        for step in range(window_start, first_eos + 1):
+                            multinomial_sample_one_no_sync(
+                                torch.empty(
+                                    (bsz, self.vocab_size - (1 if step < 11 else 0)), dtype=logits.dtype, device=device
+                                )
+                            )
+                    break
+                if idx < last_step:
+                    rng_state = self._get_rng_state(device)
+                    window_start = idx + 1
+
+            y_emb = self.ar_audio_embedding(samples)
+            xy_pos = y_emb * self.ar_audio_position.x_scale + self.ar_audio_position.alpha * self.ar_audio_position.pe[
+                :, y_len + idx
+            ].to(dtype=y_emb.dtype, device=y_emb.device)
+
+        if first_eos != no_eos:
+            idx = first_eos
+            y = y_buf[:, : prefix_len + first_eos]
+        else:
+            y = y_buf[:, : prefix_len + last_step + 1]
+        if y.shape[1] == 0:
+            y = torch.zeros((bsz, 1), dtype=y_buf.dtype, device=device)
+            print("bad zero prediction")
+        if ref_free:
+            return y, 0
+        return y, idx
+
     def infer_panel(
         self,
         x: torch.LongTensor,  #####全部文本token
@@ -976,6 +1283,11 @@ class Text2SemanticDecoder(nn.Module):
         repetition_penalty: float = 1.35,
         **kwargs,
     ):
-        return next(self.infer_panel_naive(
+        if isinstance(x, list):
+            ### 多句拼batch: 左侧padding, 逐行判断EOS, 已结束的行从kv cache和logits计算中移除
+            return self.infer_panel_batch_infer(
+                x, x_lens, prompts, bert_feature, top_k, top_p, early_stop_num, temperature, repetition_penalty, **kwargs
+            )
+        return self.infer_panel_deferred(
             x, x_lens, prompts, bert_feature, top_k, top_p, early_stop_num, temperature, repetition_penalty, **kwargs
-        ))
+        )
@@ -189,6 +189,25 @@ def logits_to_probs(
     return probs
 
 
+def apply_repetition_penalty(logits: torch.Tensor, seen: torch.Tensor, repetition_penalty: float) -> torch.Tensor:
+    """
+    与 logits_to_probs 中按历史 token gather/scatter 的惩罚等价,
+    但只依赖一个 [B, vocab] 的 "是否出现过" 掩码, 每步开销不随历史长度增长。
+    """
+    if repetition_penalty == 1.0:
+        return logits
+    seen = seen[:, : logits.shape[1]]
+    score = torch.where(logits < 0, logits * repetition_penalty, logits / repetition_penalty)
+    return torch.where(seen, score, logits)
+
+
+def is_cancelled(cancel_event) -> bool:
+    """
+    cancel_event 为每个请求独立的 threading.Event, 解码循环每步检查一次, 被置位时提前结束
+    """
+    return cancel_event is not None and cancel_event.is_set()
+
+
 def sample(
     logits,
     previous_tokens: Optional[torch.Tensor] = None,
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncGenerator, List, Tuple
+
+import numpy as np
+
+
+class SentenceJob:
+    def __init__(self, voice: dict, sentence: dict, req: dict, future: asyncio.Future):
+        self.voice = voice
+        self.sentence = sentence
+        self.speed_factor: float = float(req.get("speed_factor", 1.0))
+        self.fragment_interval: float = float(req.get("fragment_interval", 0.3))
+        # 采样参数相同的句子才能放进同一次 infer_panel_batch_infer
+        self.sampling_key: tuple = (
+            int(req.get("top_k", 15)),
+            float(req.get("top_p", 1)),
+            float(req.get("temperature", 1)),
+            float(req.get("repetition_penalty", 1.35)),
+        )
+        self.future = future
+
+
+class BatchScheduler:
+    """
+    多音色请求调度器: 把多个并发请求(可以是不同的参考音频)切分出的句子放进一个 asyncio 队列,
+    每次最多取 max_batch_size 句, 按采样参数分组后合成一次 T2S batch (TTS.synthesize_batch),
+    再把每句的音频交还给所属请求的流。
+
+    GPU 推理只在一个工作线程里串行执行; 文本前端在另一个线程池里与推理重叠。
+    lock 与其他直接调用 TTS.run 的路径共享, 避免它们同时改写 tts.prompt_cache。
+    参考音色依赖当前的 SoVITS 模型 (ge 与参考特征), 而按请求切换权重的路径持锁期间会临时替换模型,
+    因此参考音色也在 lock 内构建, 保证与 _infer 使用同一个模型。
+    """
+
+    def __init__(
+        self,
+        tts,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 20,
+        lock: threading.Lock = None,
+        frontend_workers: int = 2,
+    ):
+        self.tts = tts
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.lock = lock if lock is not None else threading.Lock()
+        self.queue: asyncio.Queue = None
+        self.task: asyncio.Task = None
+        self.infer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts_infer")
+        self.frontend_executor = ThreadPoolExecutor(max_workers=frontend_workers, thread_name_prefix="tts_frontend")
+        self.batches = 0
+        self.sentences = 0
+
+    def start(self):
+        if self.task is None:
+            self.queue = asyncio.Queue()
+            self.task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def submit(self, req: dict) -> List[SentenceJob]:
+        """
+        做完参考音色与文本前端处理后把句子放入队列; 参数错误会在这里直接抛出。
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        voice, version = await loop.run_in_executor(self.frontend_executor, self._get_voice, req)
+        sentences = await loop.run_in_executor(
+            self.frontend_executor,
+            self.tts.text_preprocessor.preprocess,
+            req["text"],
+            req["text_lang"].lower(),
+            req.get("text_split_method", "cut5"),
+            version,
+        )
+        jobs = []
+        for sentence in sentences:
+            job = SentenceJob(voice, sentence, req, loop.create_future())
+            jobs.append(job)
+            self.queue.put_nowait(job)
+        return jobs
+
+    def _get_voice(self, req: dict) -> Tuple[dict, str]:
+        # 持锁时模型为默认权重, 参考音色与模型版本在锁内一起读取
+        with self.lock:
+            voice = self.tts.get_voice(
+                req["ref_audio_path"],
+                req["prompt_text"],
+                req["prompt_lang"].lower(),
+                req.get("aux_ref_audio_paths", None),
+                req.get("ref_audio_bytes", None),
+            )
+            return voice, self.tts.configs.version
+
+    async def stream(self, jobs: List[SentenceJob]) -> AsyncGenerator[Tuple[int, np.ndarray], None]:
+        try:
+            if len(jobs) == 0:
+                yield 16000, np.zeros(int(16000), dtype=np.int16)
+            for job in jobs:
+                yield await job.future
+        finally:
+            # 客户端断开时, 还在排队的句子不再推理
+            for job in jobs:
+                job.future.cancel()
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(jobs) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    jobs.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for job in jobs:
+                if not job.future.done():
+                    groups.setdefault(job.sampling_key, []).append(job)
+            for sampling_key, group in groups.items():
+                try:
+                    results = await loop.run_in_executor(self.infer_executor, self._infer, group, sampling_key)
+                except Exception as e:
+                    traceback.print_exc()
+                    for job in group:
+                        if not job.future.done():
+                            job.future.set_exception(e)
+                    continue
+                for job, result in zip(group, results):
+                    if not job.future.done():
+                        job.future.set_result(result)
+
+    def _infer(self, group: List[SentenceJob], sampling_key: tuple) -> List[Tuple[int, np.ndarray]]:
+        top_k, top_p, temperature, repetition_penalty = sampling_key
+        items = [
+            {
+                "voice": job.voice,
+                "phones": job.sentence["phones"],
+                "bert_features": job.sentence["bert_features"],
+                "speed_factor": job.speed_factor,
+            }
+            for job in group
+        ]
+        with self.lock:
+            audio_fragments = self.tts.synthesize_batch(
+                items,
+                top_k=top_k,
+                top_p=top_p,
+                temperature=temperature,
+                repetition_penalty=repetition_penalty,
+            )
+            results = [
+                self.tts.audio_postprocess(
+                    [[audio_fragment]],
+                    self.tts.configs.sampling_rate,
+                    None,
+                    job.speed_factor,
+                    False,
+                    job.fragment_interval,
+                    False,
+                )
+                for job, audio_fragment in zip(group, audio_fragments)
+            ]
+        self.batches += 1
+        self.sentences += len(group)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "sentences": self.sentences,
+            "avg_batch_size": self.sentences / self.batches if self.batches > 0 else 0.0,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+        }
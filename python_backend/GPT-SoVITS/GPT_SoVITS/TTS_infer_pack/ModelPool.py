@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import torch
+
+
+def module_nbytes(module: torch.nn.Module) -> int:
+    size = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        size += tensor.numel() * tensor.element_size()
+    return size
+
+
+def entry_nbytes(entry: dict) -> int:
+    size = module_nbytes(entry["model"]) if entry.get("model", None) is not None else 0
+    return size + entry.get("engine", {}).get("nbytes", 0)
+
+
+class ModelPool:
+    """
+    已加载的 GPT / SoVITS 模型的常驻池, key 为 (种类, 权重路径)。
+
+    每个条目是一个 dict, 其中 "model" 为 nn.Module, "engine" 为推理引擎为该权重加载的会话 (可选,
+    其 "nbytes" 计入占用), 其余为激活该模型时需要恢复的配置。
+    按参数与 buffer 的字节数之和做 LRU 淘汰, 正在使用的模型 (set_active) 不会被淘汰;
+    max_bytes 为 0 时只保留正在使用的模型, 与不使用模型池时的内存占用相同。
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._sizes: Dict[Tuple[str, str], int] = {}
+        self._total_bytes = 0
+        self._active: set = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple[str, str], entry: dict) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            size = entry_nbytes(entry)
+            self._entries[key] = entry
+            self._sizes[key] = size
+            self._total_bytes += size
+            self._evict(keep=key)
+
+    def set_active(self, keys: Iterable[Tuple[str, str]]) -> None:
+        with self._lock:
+            self._active = set(keys)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "models": [list(key) for key in self._entries],
+                "active": [list(key) for key in self._active],
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            }
+
+    def _evict(self, keep: Tuple[str, str] = None) -> None:
+        # 从最久未使用的开始淘汰, 跳过正在使用的和刚放入的条目
+        for key in list(self._entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if key in self._active or key == keep:
+                continue
+            del self._entries[key]
+            self._total_bytes -= self._sizes.pop(key)
+            self.evictions += 1
@@ -0,0 +1,395 @@
+import inspect
+import os
+from copy import deepcopy
+from typing import List, Optional
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from torch import nn
+
+from AR.models.utils import apply_repetition_penalty, is_cancelled, sample
+from module.models_onnx import SynthesizerTrn as SynthesizerTrnOnnx
+from TTS_infer_pack.PromptCache import sha256_file_memo
+
+ort.set_default_logger_severity(3)
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+### torch>=2.9 默认使用 dynamo 导出, 不支持这里的 dynamic_axes 写法, 固定使用 TorchScript 导出
+EXPORT_KWARGS = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+
+class T2SPrefillExport(nn.Module):
+    """
+    T2S 首步: 文本 + 参考音频 token 一次性过 transformer。
+    输出最后一个位置的 logits 与每层的 k/v ([n_layer, 1, src_len, D]), 采样放在图外, 与 torch 推理共用随机数。
+    """
+
+    def __init__(self, t2s):
+        super().__init__()
+        self.t2s = t2s
+
+    def forward(self, x, bert_feature, prompts):
+        t2s = self.t2s
+        x = t2s.ar_text_embedding(x) + t2s.bert_proj(bert_feature.transpose(1, 2))
+        x = t2s.ar_text_position(x)
+        y_pos = t2s.ar_audio_position(t2s.ar_audio_embedding(prompts))
+        xy_pos = torch.concat([x, y_pos], dim=1)
+
+        ### 用 ones_like 构造mask, 导出时长度保持动态
+        x_ones = torch.ones_like(x[0, :, 0])
+        y_ones = torch.ones_like(y_pos[0, :, 0])
+        xx = torch.zeros_like(torch.outer(x_ones, x_ones)).bool()
+        xy = torch.ones_like(torch.outer(x_ones, y_ones)).bool()
+        yx = torch.zeros_like(torch.outer(y_ones, x_ones)).bool()
+        yy = torch.triu(torch.ones_like(torch.outer(y_ones, y_ones)), diagonal=1).bool()
+        attn_mask = torch.concat([torch.concat([xx, xy], dim=1), torch.concat([yx, yy], dim=1)], dim=0)
+        attn_mask = attn_mask.unsqueeze(0).unsqueeze(0)
+
+        xy_dec, k_cache, v_cache = t2s.t2s_transformer.process_prompt(xy_pos, attn_mask, None, False)
+        logits = t2s.ar_predict_layer(xy_dec[:, -1])
+        return logits, torch.stack(k_cache), torch.stack(v_cache)
+
+
+class T2SStepExport(nn.Module):
+    """
+    T2S 单步解码: 输入上一步采样的 token 及其位置, 返回 logits 和增长一位的 k/v。
+    """
+
+    def __init__(self, t2s):
+        super().__init__()
+        self.t2s = t2s
+
+    def forward(self, token, position, k, v):
+        t2s = self.t2s
+        y_emb = t2s.ar_audio_embedding(token)
+        pe = t2s.ar_audio_position.pe[:, position]
+        xy_pos = y_emb * t2s.ar_audio_position.x_scale + t2s.ar_audio_position.alpha * pe
+        k_cache = list(k.unbind(0))
+        v_cache = list(v.unbind(0))
+        xy_dec, k_cache, v_cache = t2s.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache, None, False)
+        logits = t2s.ar_predict_layer(xy_dec[:, -1])
+        return logits, torch.stack(k_cache), torch.stack(v_cache)
+
+
+class VitsDecodeExport(nn.Module):
+    """
+    SynthesizerTrn.decode (speed=1) 的导出版本。
+    说话人条件 ge 与 flow 的噪声都作为输入, ge 由 TTS 缓存, 噪声在图外用 torch 生成。
+    """
+
+    def __init__(self, vq_model: SynthesizerTrnOnnx, noise_scale: float = 0.5):
+        super().__init__()
+        self.vq_model = vq_model
+        self.noise_scale = noise_scale
+
+    def forward(self, codes, text, ge, noise):
+        vq_model = self.vq_model
+        quantized = vq_model.quantizer.decode(codes)
+        if vq_model.semantic_frame_rate == "25hz":
+            dquantized = torch.cat([quantized, quantized]).permute(1, 2, 0)
+            quantized = dquantized.contiguous().view(1, vq_model.ssl_dim, -1)
+        ge_ = vq_model.ge_to512(ge.transpose(2, 1)).transpose(2, 1) if vq_model.is_v2pro else ge
+        x, m_p, logs_p, y_mask = vq_model.enc_p(quantized, text, ge_)
+        z_p = m_p + noise * torch.exp(logs_p) * self.noise_scale
+        z = vq_model.flow(z_p, y_mask, g=ge, reverse=True)
+        return vq_model.dec(z * y_mask, g=ge)
+
+
+class OnnxEngine:
+    """
+    使用 ONNX Runtime 运行 T2S 与 VITS。
+
+    第一次加载某个权重文件时从已加载的 torch 模型导出 ONNX 图, 以权重文件的 sha256 为目录名缓存在 cache_dir 下。
+    load_t2s / load_vits 返回的会话由 TTS 保存在模型池的条目中, 再次激活同一权重时用 use_t2s / use_vits 直接切换。
+    T2S 每步的 k/v 通过 I/O binding 留在 ORT 中, 直接作为下一步的输入; 只有 logits 回到 torch 中采样,
+    因此相同随机种子下采样结果与 torch 推理一致。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        device: str = "cpu",
+        intra_op_num_threads: int = 0,
+        inter_op_num_threads: int = 0,
+        graph_optimization_level: str = "all",
+    ):
+        assert graph_optimization_level in GRAPH_OPTIMIZATION_LEVELS, (
+            f"Invalid graph optimization level: {graph_optimization_level}"
+        )
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.device_type = "cuda" if "cuda" in str(device) else "cpu"
+        if self.device_type == "cuda" and "CUDAExecutionProvider" in ort.get_available_providers():
+            self.providers = ["CUDAExecutionProvider", "CPUExecutionProvider"]
+        else:
+            self.device_type = "cpu"
+            self.providers = ["CPUExecutionProvider"]
+
+        self.sess_options = ort.SessionOptions()
+        self.sess_options.intra_op_num_threads = int(intra_op_num_threads)
+        self.sess_options.inter_op_num_threads = int(inter_op_num_threads)
+        self.sess_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization_level]
+        self.sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+
+        self.t2s_prefill: ort.InferenceSession = None
+        self.t2s_step: ort.InferenceSession = None
+        self.vits_decoder: ort.InferenceSession = None
+        self.EOS: int = None
+        self.inter_channels: int = None
+
+    def _session(self, path: str) -> ort.InferenceSession:
+        return ort.InferenceSession(path, sess_options=self.sess_options, providers=self.providers)
+
+    def _export_dir(self, weights_path: str) -> str:
+        path = os.path.join(self.cache_dir, sha256_file_memo(weights_path))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def load_t2s(self, weights_path: str, t2s_model) -> dict:
+        """
+        t2s_model: 已加载权重的 AR.models.t2s_model.Text2SemanticDecoder
+        """
+        export_dir = self._export_dir(weights_path)
+        prefill_path = os.path.join(export_dir, "t2s_prefill.onnx")
+        step_path = os.path.join(export_dir, "t2s_step.onnx")
+        if not (os.path.exists(prefill_path) and os.path.exists(step_path)):
+            print(f"Exporting T2S ONNX graphs to {export_dir}")
+            self.export_t2s(t2s_model, prefill_path, step_path)
+        return {
+            "t2s_prefill": self._session(prefill_path),
+            "t2s_step": self._session(step_path),
+            "EOS": t2s_model.EOS,
+            "nbytes": os.path.getsize(prefill_path) + os.path.getsize(step_path),
+        }
+
+    def use_t2s(self, sessions: dict):
+        self.t2s_prefill = sessions["t2s_prefill"]
+        self.t2s_step = sessions["t2s_step"]
+        self.EOS = sessions["EOS"]
+
+    def load_vits(self, weights_path: str, state_dict: dict, hps: dict) -> dict:
+        """
+        state_dict/hps: SoVITS 权重文件中的 weight 与 config, 仅支持 v1/v2/v2Pro 系列 (不含 vocoder)。
+        """
+        export_dir = self._export_dir(weights_path)
+        vits_path = os.path.join(export_dir, "vits_decode.onnx")
+        if not os.path.exists(vits_path):
+            print(f"Exporting VITS ONNX graph to {export_dir}")
+            self.export_vits(state_dict, hps, vits_path)
+        return {
+            "vits_decoder": self._session(vits_path),
+            "inter_channels": hps["model"]["inter_channels"],
+            "nbytes": os.path.getsize(vits_path),
+        }
+
+    def use_vits(self, sessions: dict):
+        self.vits_decoder = sessions["vits_decoder"]
+        self.inter_channels = sessions["inter_channels"]
+
+    def unload_vits(self):
+        self.vits_decoder = None
+
+    @torch.no_grad()
+    def export_t2s(self, t2s_model, prefill_path: str, step_path: str):
+        ### 在副本上导出, 不改变正在服务的 torch 模型的设备和精度
+        t2s_model = deepcopy(t2s_model).float().cpu().eval()
+        x = torch.randint(0, t2s_model.phoneme_vocab_size, (1, 20))
+        bert_feature = torch.zeros((1, 1024, 20))
+        prompts = torch.randint(0, t2s_model.EOS, (1, 30))
+        prefill = T2SPrefillExport(t2s_model)
+        torch.onnx.export(
+            prefill,
+            (x, bert_feature, prompts),
+            prefill_path,
+            input_names=["x", "bert_feature", "prompts"],
+            output_names=["logits", "k", "v"],
+            dynamic_axes={
+                "x": {1: "x_length"},
+                "bert_feature": {2: "x_length"},
+                "prompts": {1: "prompts_length"},
+                "k": {2: "kv_length"},
+                "v": {2: "kv_length"},
+            },
+            opset_version=17,
+            **EXPORT_KWARGS,
+        )
+        _, k, v = prefill(x, bert_feature, prompts)
+        torch.onnx.export(
+            T2SStepExport(t2s_model),
+            (prompts[:, -1:], torch.LongTensor([30]), k, v),
+            step_path,
+            input_names=["token", "position", "ik", "iv"],
+            output_names=["logits", "k", "v"],
+            dynamic_axes={
+                "ik": {2: "kv_length"},
+                "iv": {2: "kv_length"},
+                "k": {2: "next_kv_length"},
+                "v": {2: "next_kv_length"},
+            },
+            opset_version=17,
+            **EXPORT_KWARGS,
+        )
+
+    @torch.no_grad()
+    def export_vits(self, state_dict: dict, hps: dict, vits_path: str):
+        vq_model = SynthesizerTrnOnnx(
+            hps["data"]["filter_length"] // 2 + 1,
+            hps["train"]["segment_size"] // hps["data"]["hop_length"],
+            n_speakers=hps["data"]["n_speakers"],
+            **hps["model"],
+        )
+        vq_model.load_state_dict(state_dict, strict=False)
+        vq_model.dec.remove_weight_norm()
+        vq_model = vq_model.float().eval()
+        codes = torch.randint(0, 1024, (1, 1, 40))
+        text = torch.randint(0, 100, (1, 30))
+        ge = torch.randn((1, vq_model.gin_channels, 1))
+        noise = torch.randn((1, vq_model.inter_channels, 80))
+        torch.onnx.export(
+            VitsDecodeExport(vq_model),
+            (codes, text, ge, noise),
+            vits_path,
+            input_names=["codes", "text", "ge", "noise"],
+            output_names=["audio"],
+            dynamic_axes={
+                "codes": {2: "codes_length"},
+                "text": {1: "text_length"},
+                "noise": {2: "feature_length"},
+                "audio": {2: "audio_length"},
+            },
+            opset_version=17,
+            **EXPORT_KWARGS,
+        )
+
+    def _run_t2s(self, session: ort.InferenceSession, inputs: dict, kv_inputs: dict):
+        binding = session.io_binding()
+        for name, value in inputs.items():
+            binding.bind_cpu_input(name, value)
+        for name, value in kv_inputs.items():
+            binding.bind_ortvalue_input(name, value)
+        binding.bind_output("logits", "cpu")
+        binding.bind_output("k", self.device_type)
+        binding.bind_output("v", self.device_type)
+        session.run_with_iobinding(binding)
+        logits, k, v = binding.get_outputs()
+        return torch.from_numpy(logits.numpy()), k, v
+
+    @torch.no_grad()
+    def infer_panel(
+        self,
+        x: List[torch.LongTensor],  #####全部文本token
+        x_lens: torch.LongTensor,
+        prompts: torch.LongTensor,  ####参考音频token
+        bert_feature: List[torch.Tensor],
+        top_k: int = -100,
+        top_p: int = 100,
+        early_stop_num: int = -1,
+        temperature: float = 1.0,
+        repetition_penalty: float = 1.35,
+        **kwargs,
+    ):
+        """
+        与 Text2SemanticDecoder.infer_panel_naive_batched 相同的输入输出, 逐句解码。
+        """
+        y_list = []
+        idx_list = []
+        for i in range(len(x)):
+            y, idx = self.infer_one(
+                x[i],
+                prompts[i] if prompts is not None else None,
+                bert_feature[i],
+                top_k=top_k,
+                top_p=top_p,
+                early_stop_num=early_stop_num,
+                temperature=temperature,
+                repetition_penalty=repetition_penalty,
+                cancel_event=kwargs.get("cancel_event", None),
+            )
+            y_list.append(y.to(x[i].device))
+            idx_list.append(idx)
+        return y_list, idx_list
+
+    def infer_one(
+        self,
+        x: torch.LongTensor,
+        prompts: Optional[torch.LongTensor],
+        bert_feature: Optional[torch.Tensor],
+        top_k: int = -100,
+        top_p: int = 100,
+        early_stop_num: int = -1,
+        temperature: float = 1.0,
+        repetition_penalty: float = 1.35,
+        cancel_event=None,
+    ):
+        x = x.cpu().long().unsqueeze(0)
+        if prompts is None:
+            prompts = torch.zeros((1, 0), dtype=torch.long)
+        else:
+            prompts = prompts.cpu().long().unsqueeze(0)
+        if bert_feature is None:
+            ### 非中文文本的bert特征全为0, 与 embed_text 中只加偏置等价
+            bert_feature = torch.zeros((1, 1024, x.shape[1]), dtype=torch.float32)
+        else:
+            bert_feature = bert_feature.cpu().float().unsqueeze(0)
+        y_len = prompts.shape[1]
+
+        seen = torch.zeros((1, self.EOS + 1), dtype=torch.bool)
+        seen.scatter_(1, prompts, True)
+        tokens = []
+        for idx in range(1500):
+            if idx == 0:
+                logits, k, v = self._run_t2s(
+                    self.t2s_prefill,
+                    {"x": x.numpy(), "bert_feature": bert_feature.numpy(), "prompts": prompts.numpy()},
+                    {},
+                )
+            else:
+                logits, k, v = self._run_t2s(
+                    self.t2s_step,
+                    {"token": tokens[-1].long().numpy(), "position": np.array([y_len + idx - 1], dtype=np.int64)},
+                    {"ik": k, "iv": v},
+                )
+            if idx < 11:  ###至少预测出10个token不然不给停止（0.4s）
+                logits = logits[:, :-1]
+            logits = apply_repetition_penalty(logits, seen, repetition_penalty)
+            samples = sample(logits, None, top_k=top_k, top_p=top_p, temperature=temperature)[0]
+            tokens.append(samples)
+            seen.scatter_(1, samples.long(), True)
+
+            stop = early_stop_num != -1 and idx + 1 > early_stop_num
+            if torch.argmax(logits, dim=-1)[0] == self.EOS or samples[0, 0] == self.EOS:
+                stop = True
+                tokens.pop()
+            if stop or idx == 1499 or is_cancelled(cancel_event):
+                break
+
+        y = torch.concat([prompts] + [token.long() for token in tokens], dim=1)
+        if y.shape[1] == 0:
+            y = torch.zeros((1, 1), dtype=torch.long)
+            print("bad zero prediction")
+        return y[0], (0 if y_len == 0 else idx)
+
+    @torch.no_grad()
+    def decode(self, codes: torch.Tensor, text: torch.Tensor, ge: torch.Tensor) -> torch.Tensor:
+        """
+        codes: [1, 1, T] 语义token, text: [1, L] 音素, ge: [1, gin_channels, 1]
+        返回 [1, 1, audio_length] 的音频, 与 SynthesizerTrn.decode(speed=1) 对齐。
+        """
+        noise = torch.randn((1, self.inter_channels, codes.shape[-1] * 2), dtype=torch.float32, device=ge.device)
+        (audio,) = self.vits_decoder.run(
+            None,
+            {
+                "codes": codes.cpu().long().numpy(),
+                "text": text.cpu().long().numpy(),
+                "ge": ge.cpu().float().numpy(),
+                "noise": noise.cpu().numpy(),
+            },
+        )
+        return torch.from_numpy(audio).to(ge.device)
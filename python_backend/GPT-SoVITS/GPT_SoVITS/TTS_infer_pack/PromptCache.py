@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Union
+
+import numpy as np
+import torch
+
+try:
+    from safetensors import safe_open
+    from safetensors.torch import save_file as _st_save_file
+except ImportError:
+    safe_open = None
+    _st_save_file = None
+
+
+def sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# 最多记忆的文件数, 超出后淘汰最久未使用的
+FILE_DIGESTS_MAX = 1024
+_file_digests: "OrderedDict[tuple, str]" = OrderedDict()
+_file_digests_lock = threading.Lock()
+
+
+def sha256_file_memo(path: str) -> str:
+    # 以 (路径, 大小, 修改时间) 记忆文件哈希, 文件未变化时不重新读盘
+    stat = os.stat(path)
+    sig = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_digests_lock:
+        digest = _file_digests.get(sig, None)
+        if digest is not None:
+            _file_digests.move_to_end(sig)
+            return digest
+    digest = sha256_file(path)
+    with _file_digests_lock:
+        _file_digests[sig] = digest
+        while len(_file_digests) > FILE_DIGESTS_MAX:
+            _file_digests.popitem(last=False)
+    return digest
+
+
+def sha256_text(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def entry_nbytes(entry: dict) -> int:
+    size = 0
+    for value in entry.values():
+        if isinstance(value, torch.Tensor):
+            size += value.numel() * value.element_size()
+        elif isinstance(value, (list, tuple)):
+            size += 8 * len(value)
+        elif isinstance(value, str):
+            size += len(value.encode("utf-8"))
+    return size
+
+
+class PromptCache:
+    """
+    参考音频/参考文本特征的 LRU 缓存, 以内容哈希为 key。
+
+    每个条目是一个扁平的 dict, 值可以是 torch.Tensor / None / int / str / list[int]。
+    内存中按字节预算 (max_bytes) 做 LRU 淘汰; 设置了 cache_dir 时条目会同时写入磁盘
+    (有 safetensors 时用 .safetensors, 否则用 .npy 目录), 内存未命中时从磁盘加载, 重启后仍然有效。
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, cache_dir: Optional[str] = None):
+        self.max_bytes = int(max_bytes)
+        self.cache_dir = cache_dir
+        if cache_dir not in [None, ""]:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def hash_audio(self, audio: Union[str, bytes]) -> str:
+        # audio 为路径或上传的音频文件内容, 内容直接在内存中计算哈希
+        if isinstance(audio, bytes):
+            return hashlib.sha256(audio).hexdigest()
+        return sha256_file_memo(audio)
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, entry)
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self._insert(key, entry)
+        self._save_to_disk(key, entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups > 0 else 0.0,
+            }
+
+    def _insert(self, key: str, entry: dict) -> None:
+        if key in self._entries:
+            self._total_bytes -= self._sizes.pop(key)
+            del self._entries[key]
+        size = entry_nbytes(entry)
+        self._entries[key] = entry
+        self._sizes[key] = size
+        self._total_bytes += size
+        # 至少保留刚插入的条目, 即使它本身超过了预算
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            old_key, _ = self._entries.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(old_key)
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if self.cache_dir in [None, ""]:
+            return None
+        suffix = ".safetensors" if _st_save_file is not None else ""
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _save_to_disk(self, key: str, entry: dict) -> None:
+        path = self._disk_path(key)
+        if path is None or os.path.exists(path):
+            return
+        tensors, meta = {}, {}
+        for name, value in entry.items():
+            if isinstance(value, torch.Tensor):
+                tensors[name] = value.detach().cpu().contiguous()
+            else:
+                meta[name] = value
+        # 多个进程 (prefork worker) 共享 cache_dir, 先写到各自唯一的临时文件/目录, 写完后再原子地改名发布,
+        # 其他进程只会看到完整的条目
+        tmp_path = None
+        try:
+            if _st_save_file is not None:
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=key, suffix=".tmp")
+                os.close(fd)
+                _st_save_file(tensors, tmp_path, metadata={"meta": json.dumps(meta, ensure_ascii=False)})
+                os.replace(tmp_path, path)
+                tmp_path = None
+            else:
+                tmp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix=key, suffix=".tmp")
+                for name, tensor in tensors.items():
+                    if tensor.dtype == torch.bfloat16:
+                        tensor = tensor.float()
+                    np.save(os.path.join(tmp_path, name + ".npy"), tensor.numpy())
+                with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+                    json.dump(meta, f, ensure_ascii=False)
+                try:
+                    os.rename(tmp_path, path)
+                    tmp_path = None
+                except OSError:
+                    # 目录非空时无法覆盖: 其他进程已经写入了同一条目, 丢弃自己的临时目录即可
+                    if not os.path.exists(path):
+                        raise
+        except Exception as e:
+            print(f"PromptCache: failed to write {path}: {e}")
+        finally:
+            if tmp_path is not None:
+                if os.path.isdir(tmp_path):
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                elif os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _load_from_disk(self, key: str) -> Optional[dict]:
+        path = self._disk_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            if safe_open is not None:
+                with safe_open(path, framework="pt", device="cpu") as f:
+                    entry = json.loads((f.metadata() or {}).get("meta", "{}"))
+                    for name in f.keys():
+                        entry[name] = f.get_tensor(name)
+            else:
+                meta_path = os.path.join(path, "meta.json")
+                if not os.path.exists(meta_path):
+                    return None
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                for name in os.listdir(path):
+                    if name.endswith(".npy"):
+                        entry[name[:-4]] = torch.from_numpy(np.load(os.path.join(path, name)))
+        except Exception as e:
+            print(f"PromptCache: failed to read {path}: {e}")
+            return None
+        return entry
@@ -1,11 +1,14 @@
 import gc
 import math
 import os
+import queue
 import random
 import sys
+import threading
 import time
 import traceback
 from copy import deepcopy
+from io import BytesIO
 
 import torchaudio
 from tqdm import tqdm
@@ -18,6 +21,7 @@ from typing import List, Tuple, Union
 import ffmpeg
 import librosa
 import numpy as np
+import soundfile as sf
 import torch
 import torch.nn.functional as F
 import yaml
@@ -27,12 +31,17 @@ from feature_extractor.cnhubert import CNHubert
 from module.mel_processing import mel_spectrogram_torch, spectrogram_torch
 from module.models import SynthesizerTrn, SynthesizerTrnV3, Generator
 from peft import LoraConfig, get_peft_model
-from process_ckpt import get_sovits_version_from_path_fast, load_sovits_new
+from process_ckpt import get_sovits_version_from_path_fast, is_safetensors, load_safetensors_ckpt, load_sovits_new
 from transformers import AutoModelForMaskedLM, AutoTokenizer
 
 from tools.audio_sr import AP_BWE
 from tools.i18n.i18n import I18nAuto, scan_language_list
 from TTS_infer_pack.text_segmentation_method import splits
+from TTS_infer_pack.PromptCache import PromptCache, sha256_text
+from TTS_infer_pack.ModelPool import ModelPool
+from TTS_infer_pack.OnnxEngine import OnnxEngine
+from TTS_infer_pack.TorchScriptEngine import TorchScriptEngine
+from TTS_infer_pack.quantization import quantize_bert_, quantize_t2s_, quantize_vits_enc_p_
 from TTS_infer_pack.TextPreprocessor import TextPreprocessor
 from sv import SV
 
@@ -114,6 +123,23 @@ def speed_change(input_audio: np.ndarray, speed: float, sr: int):
     return processed_audio
 
 
+def decode_audio_bytes(data: bytes, sr: int) -> Tuple[np.ndarray, int]:
+    """
+    在内存中解码上传的参考音频文件内容, 返回 (channels, samples) 的 float32 数组与采样率。
+    soundfile 支持的格式 (wav/flac/ogg/mp3) 保持原采样率; 其余格式 (m4a/webm 等) 由 ffmpeg 通过管道解码为 sr 的单声道。
+    """
+    try:
+        audio, audio_sr = sf.read(BytesIO(data), dtype="float32", always_2d=True)
+        return audio.T, audio_sr
+    except Exception:
+        out, _ = (
+            ffmpeg.input("pipe:")
+            .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=sr)
+            .run(input=data, capture_stdout=True, capture_stderr=True)
+        )
+        return np.frombuffer(out, np.float32)[None], sr
+
+
 class DictToAttrRecursive(dict):
     def __init__(self, input_dict):
         super().__init__(input_dict)
@@ -214,6 +240,53 @@ def set_seed(seed: int):
     return seed
 
 
+def prefetch(iterable, maxsize: int = 1):
+    """
+    在后台线程中迭代 iterable, 结果经有界队列按原顺序产出, 后台线程的异常在消费方重新抛出。
+    消费方结束 (break / close / 异常) 时通知后台线程停止, 并等待其退出。
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            # 梯度开关是线程局部的, 后台线程需要单独关闭
+            with torch.no_grad():
+                for item in iterable:
+                    if not put((item, None)):
+                        return
+            put((done, None))
+        except BaseException as e:
+            put((None, e))
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
 class TTS_Config:
     default_configs = {
         "v1": {
@@ -328,6 +401,12 @@ class TTS_Config:
             print(f"Warning: Half precision is not supported on CPU, set is_half to False.")
             self.is_half = False
 
+        # int8 动态量化 (仅 CPU): T2S、BERT 和 VITS 文本编码器的线性层权重量化为 int8
+        self.int8: bool = self.configs.get("int8", False)
+        if self.int8 and str(self.device) != "cpu":
+            print("Warning: int8 quantization is only supported on CPU, set int8 to False.")
+            self.int8 = False
+
         version = self.configs.get("version", None)
         self.version = version
         assert self.version in ["v1", "v2", "v3", "v4", "v2Pro", "v2ProPlus"], "Invalid version!"
@@ -339,6 +418,28 @@ class TTS_Config:
 
         self.use_vocoder: bool = False
 
+        # 参考音频/参考文本特征缓存: 内存字节预算 (MB) 与落盘目录 (留空则只缓存在内存中)
+        self.prompt_cache_max_mb: int = self.configs.get("prompt_cache_max_mb", 512)
+        self.prompt_cache_dir: str = self.configs.get("prompt_cache_dir", "")
+
+        # 常驻模型池的内存预算 (MB): 切换过的 GPT/SoVITS 模型留在内存中, 再次使用时无需重新加载; 0 表示只保留正在使用的模型
+        # 默认值可以在正在使用的一组 v2 模型 (fp32 约 0.6GB) 之外再留下两三组, 请求级临时切换权重后切回时不需要重新加载
+        self.model_pool_max_mb: int = self.configs.get("model_pool_max_mb", 2048)
+
+        # 推理引擎: torch / onnxruntime / torchscript。首次加载权重时导出 ONNX 图 / TorchScript 模块并按权重哈希缓存
+        self.engine: str = self.configs.get("engine", "torch")
+        assert self.engine in ["torch", "onnxruntime", "torchscript"], "Invalid engine!"
+        self.onnx_cache_dir: str = self.configs.get("onnx_cache_dir", "GPT_SoVITS/pretrained_models/onnx_cache")
+        self.torchscript_cache_dir: str = self.configs.get(
+            "torchscript_cache_dir", "GPT_SoVITS/pretrained_models/torchscript_cache"
+        )
+        self.ort_intra_op_threads: int = self.configs.get("ort_intra_op_threads", 0)
+        self.ort_inter_op_threads: int = self.configs.get("ort_inter_op_threads", 0)
+        self.ort_graph_optimization: str = self.configs.get("ort_graph_optimization", "all")
+        if self.int8 and self.engine != "torch":
+            print("Warning: int8 quantization is only supported by the torch engine, set int8 to False.")
+            self.int8 = False
+
         if (self.t2s_weights_path in [None, ""]) or (not os.path.exists(self.t2s_weights_path)):
             self.t2s_weights_path = self.default_configs[version]["t2s_weights_path"]
             print(f"fall back to default t2s_weights_path: {self.t2s_weights_path}")
@@ -362,6 +463,7 @@ class TTS_Config:
         self.hop_length: int = 640
         self.win_length: int = 2048
         self.n_speakers: int = 300
+        self.upsample_rates: list = [10, 8, 2, 2, 2]
 
     def _load_configs(self, configs_path: str) -> dict:
         if os.path.exists(configs_path):
@@ -388,11 +490,21 @@ class TTS_Config:
         self.config = {
             "device": str(self.device),
             "is_half": self.is_half,
+            "int8": self.int8,
             "version": self.version,
             "t2s_weights_path": self.t2s_weights_path,
             "vits_weights_path": self.vits_weights_path,
             "bert_base_path": self.bert_base_path,
             "cnhuhbert_base_path": self.cnhuhbert_base_path,
+            "prompt_cache_max_mb": self.prompt_cache_max_mb,
+            "prompt_cache_dir": self.prompt_cache_dir,
+            "model_pool_max_mb": self.model_pool_max_mb,
+            "engine": self.engine,
+            "onnx_cache_dir": self.onnx_cache_dir,
+            "torchscript_cache_dir": self.torchscript_cache_dir,
+            "ort_intra_op_threads": self.ort_intra_op_threads,
+            "ort_inter_op_threads": self.ort_inter_op_threads,
+            "ort_graph_optimization": self.ort_graph_optimization,
         }
         return self.config
 
@@ -425,8 +537,11 @@ class TTS:
         else:
             self.configs: TTS_Config = TTS_Config(configs)
 
-        self.t2s_model: Text2SemanticLightningModule = None
-        self.vits_model: Union[SynthesizerTrn, SynthesizerTrnV3] = None
+        self._t2s_model: Text2SemanticLightningModule = None
+        self._vits_model: Union[SynthesizerTrn, SynthesizerTrnV3] = None
+        # 当前激活的模型池条目; TorchScript 引擎命中已导出的模块时条目中的 "model" 为 None, 回退路径用到时再构建
+        self._t2s_entry: dict = None
+        self._vits_entry: dict = None
         self.bert_tokenizer: AutoTokenizer = None
         self.bert_model: AutoModelForMaskedLM = None
         self.cnhuhbert_model: CNHubert = None
@@ -434,6 +549,8 @@ class TTS:
         self.sr_model: AP_BWE = None
         self.sv_model = None
         self.sr_model_not_exist: bool = False
+        self.onnx_engine: OnnxEngine = None
+        self.torchscript_engine: TorchScriptEngine = None
 
         self.vocoder_configs: dict = {
             "sr": None,
@@ -443,12 +560,6 @@ class TTS:
             "overlapped_len": None,
         }
 
-        self._init_models()
-
-        self.text_preprocessor: TextPreprocessor = TextPreprocessor(
-            self.bert_model, self.bert_tokenizer, self.configs.device
-        )
-
         self.prompt_cache: dict = {
             "ref_audio_path": None,
             "prompt_semantic": None,
@@ -459,14 +570,74 @@ class TTS:
             "bert_features": None,
             "norm_text": None,
             "aux_ref_audio_paths": [],
+            "sv_emb": [],
+            # 说话人条件向量 ge, 参考音频或 SoVITS 权重变化时置 None, 下次推理时重新计算
+            "ge": None,
         }
 
-        self.stop_flag: bool = False
+        self.model_pool: ModelPool = ModelPool(max_bytes=int(self.configs.model_pool_max_mb) * 1024 * 1024)
+
+        self._init_models()
+
+        self.text_preprocessor: TextPreprocessor = TextPreprocessor(
+            self.bert_model, self.bert_tokenizer, self.configs.device
+        )
+
+        # 以内容哈希为 key 的参考特征 LRU 缓存, 切换说话人时无需重新跑 HuBERT / 频谱 / SV / BERT
+        self.prompt_feature_cache: PromptCache = PromptCache(
+            max_bytes=int(self.configs.prompt_cache_max_mb) * 1024 * 1024,
+            cache_dir=self.configs.prompt_cache_dir,
+        )
+
+        # 正在推理的请求各自的取消事件, stop() 会将其全部置位
+        self.running_cancel_events: set = set()
         self.precision: torch.dtype = torch.float16 if self.configs.is_half else torch.float32
 
+    @property
+    def t2s_model(self) -> Text2SemanticLightningModule:
+        if self._t2s_model is None and self._t2s_entry is not None and self._t2s_entry["model"] is None:
+            self._build_lazy_t2s()
+        return self._t2s_model
+
+    @t2s_model.setter
+    def t2s_model(self, model: Text2SemanticLightningModule):
+        self._t2s_model = model
+
+    @t2s_model.deleter
+    def t2s_model(self):
+        self._t2s_model = None
+
+    @property
+    def vits_model(self) -> Union[SynthesizerTrn, SynthesizerTrnV3]:
+        if self._vits_model is None and self._vits_entry is not None and self._vits_entry["model"] is None:
+            self._build_lazy_vits()
+        return self._vits_model
+
+    @vits_model.setter
+    def vits_model(self, model: Union[SynthesizerTrn, SynthesizerTrnV3]):
+        self._vits_model = model
+
+    @vits_model.deleter
+    def vits_model(self):
+        self._vits_model = None
+
     def _init_models(
         self,
     ):
+        if self.configs.engine == "onnxruntime":
+            self.onnx_engine = OnnxEngine(
+                self.configs.onnx_cache_dir,
+                device=str(self.configs.device),
+                intra_op_num_threads=self.configs.ort_intra_op_threads,
+                inter_op_num_threads=self.configs.ort_inter_op_threads,
+                graph_optimization_level=self.configs.ort_graph_optimization,
+            )
+        elif self.configs.engine == "torchscript":
+            self.torchscript_engine = TorchScriptEngine(
+                self.configs.torchscript_cache_dir,
+                device=self.configs.device,
+                is_half=self.configs.is_half and str(self.configs.device) != "cpu",
+            )
         self.init_t2s_weights(self.configs.t2s_weights_path)
         self.init_vits_weights(self.configs.vits_weights_path)
         self.init_bert_weights(self.configs.bert_base_path)
@@ -489,12 +660,43 @@ class TTS:
         self.bert_model = self.bert_model.to(self.configs.device)
         if self.configs.is_half and str(self.configs.device) != "cpu":
             self.bert_model = self.bert_model.half()
+        if self.configs.int8:
+            quantize_bert_(self.bert_model)
 
-    def init_vits_weights(self, weights_path: str):
+    def init_vits_weights(self, weights_path: str, save: bool = True):
         self.configs.vits_weights_path = weights_path
+        entry = self.model_pool.get(("vits", weights_path))
+        if entry is None:
+            entry = self._load_vits(weights_path)
+            self.model_pool.put(("vits", weights_path), entry)
+        self._activate_vits(weights_path, entry)
+        if save:
+            self.configs.save_configs()
+
+    def _load_vits(self, weights_path: str) -> dict:
+        if self.torchscript_engine is not None:
+            modules = self.torchscript_engine.cached_vits(weights_path)
+            if modules is not None:
+                ### 已导出过 TorchScript 模块, 不构建 torch 模型, 回退路径用到时再构建
+                return {**modules["meta"], "model": None, "engine": modules}
+        entry = self._build_vits(weights_path)
+        ### 推理引擎的会话与模型一起放进模型池, 再次激活时不重新哈希权重和创建会话
+        if self.onnx_engine is not None and not entry["use_vocoder"]:
+            entry["engine"] = self.onnx_engine.load_vits(weights_path, entry["model"].state_dict(), entry["hps"])
+        if self.torchscript_engine is not None and not entry["use_vocoder"]:
+            meta = {k: v for k, v in entry.items() if k not in ["model", "hps"]}
+            entry["engine"] = self.torchscript_engine.load_vits(weights_path, entry["model_version"], meta)
+        return entry
+
+    def _build_lazy_vits(self):
+        # 按实际占用重新计入模型池
+        entry = self._vits_entry
+        entry["model"] = self._build_vits(self.configs.vits_weights_path)["model"]
+        self._vits_model = entry["model"]
+        self.model_pool.put(("vits", self.configs.vits_weights_path), entry)
+
+    def _build_vits(self, weights_path: str) -> dict:
         version, model_version, if_lora_v3 = get_sovits_version_from_path_fast(weights_path)
-        if "Pro" in model_version:
-            self.init_sv_model()
         path_sovits = self.configs.default_configs[model_version]["vits_weights_path"]
 
         if if_lora_v3 == True and os.path.exists(path_sovits) == False:
@@ -521,43 +723,42 @@ class TTS:
         else:
             hps["model"]["version"] = model_version
 
-        self.configs.filter_length = hps["data"]["filter_length"]
-        self.configs.segment_size = hps["train"]["segment_size"]
-        self.configs.sampling_rate = hps["data"]["sampling_rate"]
-        self.configs.hop_length = hps["data"]["hop_length"]
-        self.configs.win_length = hps["data"]["win_length"]
-        self.configs.n_speakers = hps["data"]["n_speakers"]
-        self.configs.semantic_frame_rate = hps["model"]["semantic_frame_rate"]
+        entry = {
+            "model_version": model_version,
+            "hps": hps,
+            "filter_length": hps["data"]["filter_length"],
+            "segment_size": hps["train"]["segment_size"],
+            "sampling_rate": hps["data"]["sampling_rate"],
+            "hop_length": hps["data"]["hop_length"],
+            "win_length": hps["data"]["win_length"],
+            "n_speakers": hps["data"]["n_speakers"],
+            "upsample_rates": hps["model"].get("upsample_rates", None),
+            "semantic_frame_rate": hps["model"]["semantic_frame_rate"],
+            "use_vocoder": model_version in v3v4set,
+        }
         kwargs = hps["model"]
         # print(f"self.configs.sampling_rate:{self.configs.sampling_rate}")
 
-        self.configs.update_version(model_version)
-
         # print(f"model_version:{model_version}")
         # print(f'hps["model"]["version"]:{hps["model"]["version"]}')
         if model_version not in v3v4set:
             vits_model = SynthesizerTrn(
-                self.configs.filter_length // 2 + 1,
-                self.configs.segment_size // self.configs.hop_length,
-                n_speakers=self.configs.n_speakers,
+                entry["filter_length"] // 2 + 1,
+                entry["segment_size"] // entry["hop_length"],
+                n_speakers=entry["n_speakers"],
                 **kwargs,
             )
-            self.configs.use_vocoder = False
         else:
             kwargs["version"] = model_version
             vits_model = SynthesizerTrnV3(
-                self.configs.filter_length // 2 + 1,
-                self.configs.segment_size // self.configs.hop_length,
-                n_speakers=self.configs.n_speakers,
+                entry["filter_length"] // 2 + 1,
+                entry["segment_size"] // entry["hop_length"],
+                n_speakers=entry["n_speakers"],
                 **kwargs,
             )
-            self.configs.use_vocoder = True
-            self.init_vocoder(model_version)
             if "pretrained" not in weights_path and hasattr(vits_model, "enc_q"):
                 del vits_model.enc_q
 
-        self.is_v2pro = model_version in {"v2Pro", "v2ProPlus"}
-
         if if_lora_v3 == False:
             print(
                 f"Loading VITS weights from {weights_path}. {vits_model.load_state_dict(dict_s2['weight'], strict=False)}"
@@ -583,34 +784,142 @@ class TTS:
         vits_model = vits_model.to(self.configs.device)
         vits_model = vits_model.eval()
 
-        self.vits_model = vits_model
         if self.configs.is_half and str(self.configs.device) != "cpu":
-            self.vits_model = self.vits_model.half()
+            vits_model = vits_model.half()
+        if self.configs.int8:
+            quantize_vits_enc_p_(vits_model)
+        entry["model"] = vits_model
+        return entry
+
+    def _activate_vits(self, weights_path: str, entry: dict):
+        model_version = entry["model_version"]
+        if "Pro" in model_version:
+            self.init_sv_model()
 
-        self.configs.save_configs()
+        self.configs.filter_length = entry["filter_length"]
+        self.configs.segment_size = entry["segment_size"]
+        self.configs.sampling_rate = entry["sampling_rate"]
+        self.configs.hop_length = entry["hop_length"]
+        self.configs.win_length = entry["win_length"]
+        self.configs.n_speakers = entry["n_speakers"]
+        self.configs.upsample_rates = entry["upsample_rates"]
+        self.configs.semantic_frame_rate = entry["semantic_frame_rate"]
+        self.configs.update_version(model_version)
+        self.configs.use_vocoder = entry["use_vocoder"]
+        if self.configs.use_vocoder:
+            self.init_vocoder(model_version)
 
+        self.is_v2pro = model_version in {"v2Pro", "v2ProPlus"}
 
+        if self.onnx_engine is not None:
+            if self.configs.use_vocoder:
+                ### v3/v4 的 CFM + vocoder 仍使用 torch
+                self.onnx_engine.unload_vits()
+            else:
+                self.onnx_engine.use_vits(entry["engine"])
 
-    def init_t2s_weights(self, weights_path: str):
-        print(f"Loading Text2Semantic weights from {weights_path}")
+        if self.torchscript_engine is not None:
+            if self.configs.use_vocoder:
+                self.torchscript_engine.unload_vits()
+            else:
+                self.torchscript_engine.use_vits(entry["engine"])
+
+        self._vits_entry = entry
+        self.vits_model = entry["model"]
+        self.model_pool.set_active([("t2s", self.configs.t2s_weights_path), ("vits", weights_path)])
+        # prompt_semantic 和参考频谱都依赖 SoVITS 权重, 下次推理时重新取 (命中参考特征缓存时不重新计算)
+        self.prompt_cache["ref_audio_path"] = None
+        self.prompt_cache["refer_spec"] = self.prompt_cache["refer_spec"][:1]
+        self.prompt_cache["sv_emb"] = self.prompt_cache["sv_emb"][:1]
+        self.prompt_cache["aux_ref_audio_paths"] = []
+        self.prompt_cache["ge"] = None
+
+    def init_t2s_weights(self, weights_path: str, save: bool = True):
         self.configs.t2s_weights_path = weights_path
-        self.configs.save_configs()
-        self.configs.hz = 50
-        dict_s1 = torch.load(weights_path, map_location=self.configs.device, weights_only=False)
+        if save:
+            self.configs.save_configs()
+        entry = self.model_pool.get(("t2s", weights_path))
+        if entry is None:
+            entry = self._load_t2s(weights_path)
+            self.model_pool.put(("t2s", weights_path), entry)
+        self._activate_t2s(weights_path, entry)
+
+    def _load_t2s(self, weights_path: str) -> dict:
+        if self.torchscript_engine is not None:
+            modules = self.torchscript_engine.cached_t2s(weights_path)
+            if modules is not None:
+                ### 已导出过 TorchScript 模块, 不构建 torch 模型, 回退路径用到时再构建
+                return {**modules["meta"], "model": None, "mute_emb_sim_matrix": None, "engine": modules}
+        t2s_model, max_sec, sim_matrix = self._build_t2s(weights_path)
+        entry = {"model": t2s_model, "max_sec": max_sec, "mute_emb_sim_matrix": sim_matrix}
+        if self.onnx_engine is not None:
+            entry["engine"] = self.onnx_engine.load_t2s(weights_path, t2s_model.model)
+        if self.torchscript_engine is not None:
+            entry["engine"] = self.torchscript_engine.load_t2s(weights_path, t2s_model, {"max_sec": max_sec})
+        return entry
+
+    def _build_lazy_t2s(self):
+        # 按实际占用重新计入模型池; 流式推理用到的静音相似度矩阵也在这里补上
+        entry = self._t2s_entry
+        entry["model"], _, entry["mute_emb_sim_matrix"] = self._build_t2s(self.configs.t2s_weights_path)
+        self.configs.mute_emb_sim_matrix = entry["mute_emb_sim_matrix"]
+        self._t2s_model = entry["model"]
+        self.model_pool.put(("t2s", self.configs.t2s_weights_path), entry)
+
+    def _build_t2s(self, weights_path: str) -> tuple:
+        print(f"Loading Text2Semantic weights from {weights_path}")
+        if is_safetensors(weights_path):
+            dict_s1 = load_safetensors_ckpt(weights_path)
+        else:
+            dict_s1 = torch.load(weights_path, map_location=self.configs.device, weights_only=False)
         config = dict_s1["config"]
-        self.configs.max_sec = config["data"]["max_sec"]
         t2s_model = Text2SemanticLightningModule(config, "****", is_train=False)
         t2s_model.load_state_dict(dict_s1["weight"])
         t2s_model = t2s_model.to(self.configs.device)
         t2s_model = t2s_model.eval()
-        self.t2s_model = t2s_model
         if self.configs.is_half and str(self.configs.device) != "cpu":
-            self.t2s_model = self.t2s_model.half()
+            t2s_model = t2s_model.half()
 
         codebook = t2s_model.model.ar_audio_embedding.weight.clone()
         mute_emb = codebook[self.configs.mute_tokens[self.configs.version]].unsqueeze(0)
         sim_matrix = F.cosine_similarity(mute_emb.float(), codebook.float(), dim=-1)
-        self.configs.mute_emb_sim_matrix = sim_matrix
+
+        if self.configs.int8:
+            quantize_t2s_(t2s_model.model)
+        return t2s_model, config["data"]["max_sec"], sim_matrix
+
+    def _activate_t2s(self, weights_path: str, entry: dict):
+        self.configs.hz = 50
+        self.configs.max_sec = entry["max_sec"]
+        self.configs.mute_emb_sim_matrix = entry["mute_emb_sim_matrix"]
+        self._t2s_entry = entry
+        self.t2s_model = entry["model"]
+
+        if self.onnx_engine is not None:
+            self.onnx_engine.use_t2s(entry["engine"])
+        if self.torchscript_engine is not None:
+            self.torchscript_engine.use_t2s(entry["engine"], lambda: self.t2s_model.model)
+        self.model_pool.set_active([("t2s", weights_path), ("vits", self.configs.vits_weights_path)])
+
+    def use_weights(self, t2s_weights_path: str = None, vits_weights_path: str = None) -> tuple:
+        """
+        To switch the GPT/SoVITS weights in use without saving them to the config file.
+            Models kept in the model pool are switched without reloading.
+        Args:
+            t2s_weights_path: str, the GPT weights to use, None means unchanged.
+            vits_weights_path: str, the SoVITS weights to use, None means unchanged.
+        Returns:
+            tuple, the (t2s_weights_path, vits_weights_path) in use before switching.
+        """
+        previous = (self.configs.t2s_weights_path, self.configs.vits_weights_path)
+        if vits_weights_path not in [None, ""] and vits_weights_path != self.configs.vits_weights_path:
+            self.init_vits_weights(vits_weights_path, save=False)
+        if t2s_weights_path not in [None, ""] and t2s_weights_path != self.configs.t2s_weights_path:
+            self.init_t2s_weights(t2s_weights_path, save=False)
+        return previous
+
+    def get_model_pool_stats(self) -> dict:
+        return self.model_pool.stats()
 
     def init_vocoder(self, version: str):
         if version == "v3":
@@ -701,13 +1010,15 @@ class TTS:
 
         self.configs.is_half = enable
         self.precision = torch.float16 if enable else torch.float32
+        # 池中未使用的模型不跟着转换精度, 直接丢弃
+        self.model_pool.clear()
         if save:
             self.configs.save_configs()
         if enable:
-            if self.t2s_model is not None:
-                self.t2s_model = self.t2s_model.half()
-            if self.vits_model is not None:
-                self.vits_model = self.vits_model.half()
+            if self._t2s_model is not None:
+                self._t2s_model = self._t2s_model.half()
+            if self._vits_model is not None:
+                self._vits_model = self._vits_model.half()
             if self.bert_model is not None:
                 self.bert_model = self.bert_model.half()
             if self.cnhuhbert_model is not None:
@@ -715,10 +1026,10 @@ class TTS:
             if self.vocoder is not None:
                 self.vocoder = self.vocoder.half()
         else:
-            if self.t2s_model is not None:
-                self.t2s_model = self.t2s_model.float()
-            if self.vits_model is not None:
-                self.vits_model = self.vits_model.float()
+            if self._t2s_model is not None:
+                self._t2s_model = self._t2s_model.float()
+            if self._vits_model is not None:
+                self._vits_model = self._vits_model.float()
             if self.bert_model is not None:
                 self.bert_model = self.bert_model.float()
             if self.cnhuhbert_model is not None:
@@ -732,13 +1043,17 @@ class TTS:
         Args:
             device: torch.device, the device to use for all models.
         """
+        if self.configs.int8 and str(device) != "cpu":
+            print("int8 quantized models can only run on CPU.")
+            return
         self.configs.device = device
+        self.model_pool.clear()
         if save:
             self.configs.save_configs()
-        if self.t2s_model is not None:
-            self.t2s_model = self.t2s_model.to(device)
-        if self.vits_model is not None:
-            self.vits_model = self.vits_model.to(device)
+        if self._t2s_model is not None:
+            self._t2s_model = self._t2s_model.to(device)
+        if self._vits_model is not None:
+            self._vits_model = self._vits_model.to(device)
         if self.bert_model is not None:
             self.bert_model = self.bert_model.to(device)
         if self.cnhuhbert_model is not None:
@@ -748,32 +1063,109 @@ class TTS:
         if self.sr_model is not None:
             self.sr_model = self.sr_model.to(device)
 
-    def set_ref_audio(self, ref_audio_path: str):
+    def share_memory(self):
+        """
+        To move the weights of all loaded models into shared memory (CPU only),
+            so that processes forked afterwards map the same pages instead of each holding a copy.
+        The weights must not be modified after forking; the per-process state (prompt caches, etc.) is not shared.
+        """
+        assert str(self.configs.device) == "cpu", "Shared memory weights are only supported on CPU."
+        models = [
+            self._t2s_model,
+            self._vits_model,
+            self.bert_model,
+            self.cnhuhbert_model,
+            self.vocoder,
+            self.sr_model.model if self.sr_model is not None else None,
+            self.sv_model.embedding_model if self.sv_model is not None else None,
+        ]
+        for model in models:
+            if model is not None:
+                model.share_memory()
+
+    def set_ref_audio(self, ref_audio_path: str, ref_audio_bytes: bytes = None):
         """
         To set the reference audio for the TTS model,
             including the prompt_semantic and refer_spepc.
         Args:
             ref_audio_path: str, the path of the reference audio.
+            ref_audio_bytes: bytes, the content of the reference audio file,
+                used instead of reading ref_audio_path when given.
         """
-        self._set_prompt_semantic(ref_audio_path)
-        self._set_ref_spec(ref_audio_path)
+        ref_audio = ref_audio_bytes if ref_audio_bytes is not None else ref_audio_path
+        self._set_prompt_semantic(ref_audio)
+        self._set_ref_spec(ref_audio)
         self._set_ref_audio_path(ref_audio_path)
 
     def _set_ref_audio_path(self, ref_audio_path):
         self.prompt_cache["ref_audio_path"] = ref_audio_path
 
+    def get_prompt_cache_stats(self) -> dict:
+        return self.prompt_feature_cache.stats()
+
+    def _lookup_prompt_feature_cache(self, key: str, compute_fn) -> dict:
+        entry = self.prompt_feature_cache.get(key)
+        if entry is None:
+            entry = compute_fn()
+            self.prompt_feature_cache.put(key, entry)
+        return {k: v.to(self.configs.device) if isinstance(v, torch.Tensor) else v for k, v in entry.items()}
+
     def _set_ref_spec(self, ref_audio_path):
-        spec_audio = self._get_ref_spec(ref_audio_path)
+        entry = self._get_ref_spec(ref_audio_path)
+        spec_audio = (entry["spec"], entry["audio"])
         if self.prompt_cache["refer_spec"] in [[], None]:
             self.prompt_cache["refer_spec"] = [spec_audio]
+            self.prompt_cache["sv_emb"] = [entry["sv_emb"]]
         else:
             self.prompt_cache["refer_spec"][0] = spec_audio
+            self.prompt_cache["sv_emb"][0] = entry["sv_emb"]
+        self.prompt_cache["ge"] = None
+        self.prompt_cache["raw_audio"] = entry["raw_audio"]
+        self.prompt_cache["raw_sr"] = entry["raw_sr"]
+
+    def _get_prompt_ge(self, refer_audio_spec: List[torch.Tensor], sv_emb: List[torch.Tensor]) -> torch.Tensor:
+        # 每组参考音频只跑一次 ref_enc / sv_emb 投影, 之后每个 batch、每个流式 chunk 直接复用
+        if self.prompt_cache["ge"] is None:
+            self.prompt_cache["ge"] = self.vits_model.get_ge(refer_audio_spec, sv_emb)
+        return self.prompt_cache["ge"]
+
+    def _script_decodes(self, refer_audio_spec: List[torch.Tensor], speed: float) -> bool:
+        # TorchScript 的 VITS 在图内由参考频谱计算 ge, 只支持 speed=1 与单条参考音频; 此时不需要 torch 模型和 ge
+        return (
+            self.torchscript_engine is not None
+            and self.torchscript_engine.vits is not None
+            and speed == 1.0
+            and len(refer_audio_spec) == 1
+        )
+
+    def _vits_decode(self, codes, text, refer_audio_spec, speed: float, sv_emb, ge) -> torch.Tensor:
+        # onnxruntime 引擎只导出了 speed=1 的 VITS, 其余情况使用 torch
+        if self.onnx_engine is not None and self.onnx_engine.vits_decoder is not None and speed == 1.0:
+            if ge is None:
+                ge = self.vits_model.get_ge(refer_audio_spec, sv_emb)
+            return self.onnx_engine.decode(codes, text, ge).to(self.precision)
+        if self._script_decodes(refer_audio_spec, speed):
+            return self.torchscript_engine.decode(
+                codes, text, refer_audio_spec[0], sv_emb[0] if sv_emb is not None else None
+            )
+        return self.vits_model.decode(codes, text, refer_audio_spec, speed=speed, sv_emb=sv_emb, ge=ge)
+
+    def _get_ref_spec(self, ref_audio_path: Union[str, bytes]) -> dict:
+        key = sha256_text(
+            "ref_spec",
+            self.prompt_feature_cache.hash_audio(ref_audio_path),
+            self.configs.vits_weights_path,
+            self.configs.is_half,
+        )
+        return self._lookup_prompt_feature_cache(key, lambda: self._extract_ref_spec(ref_audio_path))
 
-    def _get_ref_spec(self, ref_audio_path):
-        raw_audio, raw_sr = torchaudio.load(ref_audio_path)
+    def _extract_ref_spec(self, ref_audio_path: Union[str, bytes]) -> dict:
+        if isinstance(ref_audio_path, bytes):
+            raw_audio, raw_sr = decode_audio_bytes(ref_audio_path, self.configs.sampling_rate)
+            raw_audio = torch.from_numpy(raw_audio)
+        else:
+            raw_audio, raw_sr = torchaudio.load(ref_audio_path)
         raw_audio = raw_audio.to(self.configs.device).float()
-        self.prompt_cache["raw_audio"] = raw_audio
-        self.prompt_cache["raw_sr"] = raw_sr
 
         if raw_sr != self.configs.sampling_rate:
             audio = raw_audio.to(self.configs.device)
@@ -798,21 +1190,50 @@ class TTS:
         )
         if self.configs.is_half:
             spec = spec.half()
+        sv_emb = None
         if self.is_v2pro == True:
             audio = resample(audio, self.configs.sampling_rate, 16000, self.configs.device)
             if self.configs.is_half:
                 audio = audio.half()
+            sv_emb = self.sv_model.compute_embedding3(audio)
         else:
             audio = None
-        return spec, audio
+        return {
+            "spec": spec,
+            "audio": audio,
+            "sv_emb": sv_emb,
+            # 原始音频只有 v3/v4 的 vocoder 合成会用到
+            "raw_audio": raw_audio if self.configs.use_vocoder else None,
+            "raw_sr": raw_sr,
+        }
+
+    def _set_prompt_semantic(self, ref_wav_path: Union[str, bytes]):
+        self.prompt_cache["prompt_semantic"] = self._get_prompt_semantic(ref_wav_path)
 
-    def _set_prompt_semantic(self, ref_wav_path: str):
+    def _get_prompt_semantic(self, ref_wav_path: Union[str, bytes]) -> torch.Tensor:
+        key = sha256_text(
+            "prompt_semantic",
+            self.prompt_feature_cache.hash_audio(ref_wav_path),
+            self.configs.vits_weights_path,
+            self.configs.cnhuhbert_base_path,
+            self.configs.is_half,
+        )
+        entry = self._lookup_prompt_feature_cache(
+            key, lambda: {"prompt_semantic": self._extract_prompt_semantic(ref_wav_path)}
+        )
+        return entry["prompt_semantic"]
+
+    def _extract_prompt_semantic(self, ref_wav_path: Union[str, bytes]) -> torch.Tensor:
         zero_wav = np.zeros(
             int(self.configs.sampling_rate * 0.3),
             dtype=np.float16 if self.configs.is_half else np.float32,
         )
         with torch.no_grad():
-            wav16k, sr = librosa.load(ref_wav_path, sr=16000)
+            if isinstance(ref_wav_path, bytes):
+                wav, sr = decode_audio_bytes(ref_wav_path, 16000)
+                wav16k = librosa.resample(wav.mean(0), orig_sr=sr, target_sr=16000)
+            else:
+                wav16k, sr = librosa.load(ref_wav_path, sr=16000)
             if wav16k.shape[0] > 160000 or wav16k.shape[0] < 48000:
                 raise OSError(i18n("参考音频在3~10秒范围外，请更换！"))
             wav16k = torch.from_numpy(wav16k)
@@ -830,7 +1251,137 @@ class TTS:
             codes = self.vits_model.extract_latent(hubert_feature)
 
             prompt_semantic = codes[0, 0].to(self.configs.device)
-            self.prompt_cache["prompt_semantic"] = prompt_semantic
+        return prompt_semantic
+
+    def _get_prompt_text_features(self, prompt_text: str, prompt_lang: str) -> dict:
+        key = sha256_text("prompt_text", prompt_text, prompt_lang, self.configs.version, self.configs.bert_base_path)
+
+        def compute():
+            phones, bert_features, norm_text = self.text_preprocessor.segment_and_extract_feature_for_text(
+                prompt_text, prompt_lang, self.configs.version
+            )
+            return {"phones": phones, "bert_features": bert_features, "norm_text": norm_text}
+
+        return self._lookup_prompt_feature_cache(key, compute)
+
+    def get_voice(
+        self,
+        ref_audio_path: str,
+        prompt_text: str,
+        prompt_lang: str,
+        aux_ref_audio_paths: list = None,
+        ref_audio_bytes: bytes = None,
+    ) -> dict:
+        """
+        Build a standalone voice context for synthesize_batch,
+            without touching self.prompt_cache.
+            ge and the reference features come from the current SoVITS model,
+            so call it under the same lock as use_weights.
+        Args:
+            ref_audio_path: str, the path of the reference audio.
+            prompt_text: str, the prompt text of the reference audio.
+            prompt_lang: str, the language of the prompt text.
+            aux_ref_audio_paths: list, auxiliary reference audio paths for tone fusion.
+            ref_audio_bytes: bytes, the content of the reference audio file, used instead of ref_audio_path.
+        Returns:
+            dict with prompt_semantic, refer_spec, sv_emb, ge, phones and bert_features.
+        """
+        ref_audio = ref_audio_bytes if ref_audio_bytes else ref_audio_path
+        if not ref_audio_bytes and not os.path.exists(ref_audio_path):
+            raise ValueError(f"{ref_audio_path} not exists")
+        refer_spec, sv_emb = [], []
+        for path in [ref_audio] + list(aux_ref_audio_paths or []):
+            if path in [None, ""] or (not isinstance(path, bytes) and not os.path.exists(path)):
+                continue
+            entry = self._get_ref_spec(path)
+            refer_spec.append(entry["spec"].to(dtype=self.precision, device=self.configs.device))
+            sv_emb.append(entry["sv_emb"])
+
+        prompt_text = prompt_text.strip("\n")
+        if prompt_text[-1] not in splits:
+            prompt_text += "。" if prompt_lang != "en" else "."
+        text_features = self._get_prompt_text_features(prompt_text, prompt_lang)
+        sv_emb = sv_emb if self.is_v2pro else None
+        return {
+            "prompt_semantic": self._get_prompt_semantic(ref_audio),
+            "refer_spec": refer_spec,
+            "sv_emb": sv_emb,
+            "ge": None
+            if self.configs.use_vocoder or self._script_decodes(refer_spec, 1.0)
+            else self.vits_model.get_ge(refer_spec, sv_emb),
+            "phones": text_features["phones"],
+            "bert_features": text_features["bert_features"],
+        }
+
+    def synthesize_batch(
+        self,
+        items: List[dict],
+        top_k: int = 15,
+        top_p: float = 1,
+        temperature: float = 1,
+        repetition_penalty: float = 1.35,
+    ) -> List[torch.Tensor]:
+        """
+        Synthesize sentences that may belong to different voices in one T2S batch.
+        Args:
+            items: list of dict, each with "voice" (from get_voice), "phones", "bert_features"
+                and optionally "speed_factor".
+        Returns:
+            list of 1-D audio tensors at self.configs.sampling_rate, in the order of items.
+        """
+        if self.configs.use_vocoder:
+            raise RuntimeError("synthesize_batch does not support SoVITS V3/V4 models")
+
+        device = self.configs.device
+        all_phones_list, all_bert_features_list, prompt_list = [], [], []
+        for item in items:
+            voice = item["voice"]
+            all_phones_list.append(torch.LongTensor(voice["phones"] + item["phones"]).to(device))
+            all_bert_features_list.append(
+                self.concat_bert_features(
+                    voice["phones"], voice["bert_features"], item["phones"], item["bert_features"], self.precision, device
+                )
+            )
+            prompt_list.append(voice["prompt_semantic"].to(device))
+        all_phones_len = torch.LongTensor([item.shape[-1] for item in all_phones_list]).to(device)
+        prompt_lens = torch.LongTensor([item.shape[-1] for item in prompt_list]).to(device)
+
+        # 不同音色的 prompt 长度不同, 左侧 padding 到相同长度;
+        # 用每行自己的第一个 token 填充, 保证重复惩罚(只看 token 是否出现过)不受 padding 影响
+        max_prompt_len = int(prompt_lens.max())
+        prompts = torch.stack(
+            [F.pad(item, (max_prompt_len - item.shape[-1], 0), value=int(item[0])) for item in prompt_list]
+        )
+
+        with torch.no_grad():
+            pred_semantic_list, idx_list = self.t2s_model.model.infer_panel_batch_infer(
+                all_phones_list,
+                all_phones_len,
+                prompts,
+                all_bert_features_list,
+                top_k=top_k,
+                top_p=top_p,
+                temperature=temperature,
+                early_stop_num=self.configs.hz * self.configs.max_sec,
+                max_len=int(all_phones_len.max()),
+                repetition_penalty=repetition_penalty,
+                prompt_lens=prompt_lens,
+            )
+
+            audio_fragments = []
+            for item, pred_semantic, idx in zip(items, pred_semantic_list, idx_list):
+                voice = item["voice"]
+                phones = torch.LongTensor(item["phones"]).unsqueeze(0).to(device)
+                audio_fragment = self._vits_decode(
+                    pred_semantic[-idx:].unsqueeze(0).unsqueeze(0),
+                    phones,
+                    voice["refer_spec"],
+                    speed=item.get("speed_factor", 1.0),
+                    sv_emb=voice["sv_emb"],
+                    ge=voice["ge"],
+                ).detach()[0, 0, :]
+                audio_fragments.append(audio_fragment)
+        return audio_fragments
 
     def batch_sequences(self, sequences: List[torch.Tensor], axis: int = 0, pad_value: int = 0, max_length: int = None):
         seq = sequences[0]
@@ -853,6 +1404,30 @@ class TTS:
         batch = torch.stack(padded_sequences)
         return batch
 
+    @staticmethod
+    def concat_bert_features(
+        prompt_phones: list,
+        prompt_bert_features: torch.Tensor,
+        phones: list,
+        bert_features: torch.Tensor,
+        precision: torch.dtype,
+        device: torch.device,
+    ) -> torch.Tensor:
+        """
+        bert_features 为 None 表示全为0 (非中文文本), 两段都为 None 时结果仍为 None,
+        只有与中文特征拼接时才补出全零部分。
+        """
+        if prompt_bert_features is None and bert_features is None:
+            return None
+        if prompt_bert_features is None:
+            prompt_bert_features = torch.zeros((1024, len(prompt_phones)), dtype=precision, device=device)
+        if bert_features is None:
+            bert_features = torch.zeros((1024, len(phones)), dtype=precision, device=device)
+        return torch.cat(
+            [prompt_bert_features.to(dtype=precision, device=device), bert_features.to(dtype=precision, device=device)],
+            1,
+        )
+
     def to_batch(
         self,
         data: list,
@@ -911,19 +1486,29 @@ class TTS:
             all_phones_max_len = 0
             for item in item_list:
                 if prompt_data is not None:
-                    all_bert_features = torch.cat([prompt_data["bert_features"], item["bert_features"]], 1).to(
-                        dtype=precision, device=device
+                    all_bert_features = self.concat_bert_features(
+                        prompt_data["phones"],
+                        prompt_data["bert_features"],
+                        item["phones"],
+                        item["bert_features"],
+                        precision,
+                        device,
                     )
                     all_phones = torch.LongTensor(prompt_data["phones"] + item["phones"]).to(device)
                     phones = torch.LongTensor(item["phones"]).to(device)
                     # norm_text = prompt_data["norm_text"]+item["norm_text"]
                 else:
-                    all_bert_features = item["bert_features"].to(dtype=precision, device=device)
+                    all_bert_features = (
+                        item["bert_features"].to(dtype=precision, device=device)
+                        if item["bert_features"] is not None
+                        else None
+                    )
                     phones = torch.LongTensor(item["phones"]).to(device)
                     all_phones = phones
                     # norm_text = item["norm_text"]
 
-                all_bert_max_len = max(all_bert_max_len, all_bert_features.shape[-1])
+                if all_bert_features is not None:
+                    all_bert_max_len = max(all_bert_max_len, all_bert_features.shape[-1])
                 all_phones_max_len = max(all_phones_max_len, all_phones.shape[-1])
 
                 phones_list.append(phones)
@@ -990,9 +1575,11 @@ class TTS:
         self,
     ):
         """
-        Stop the inference process.
+        Stop all running inference requests.
+        To stop a single request, set the "cancel_event" passed to run() instead.
         """
-        self.stop_flag = True
+        for cancel_event in list(self.running_cancel_events):
+            cancel_event.set()
 
     @torch.no_grad()
     def run(self, inputs: dict):
@@ -1003,8 +1590,10 @@ class TTS:
             inputs (dict):
                 {
                     "text": "",                   # str.(required) text to be synthesized
+                    "text_stream": None,          # Iterable[str].(optional) text arriving piece by piece (e.g. from IncrementalSegmenter), used instead of text. each piece is split and synthesized as soon as it arrives, return_fragment is enabled if streaming_mode is off.
                     "text_lang: "",               # str.(required) language of the text to be synthesized
                     "ref_audio_path": "",         # str.(required) reference audio path
+                    "ref_audio_bytes": None,      # bytes.(optional) reference audio file content, used instead of ref_audio_path without touching the disk. identified by its sha256.
                     "aux_ref_audio_paths": [],    # list.(optional) auxiliary reference audio paths for multi-speaker tone fusion
                     "prompt_text": "",            # str.(optional) prompt text for the reference audio
                     "prompt_lang": "",            # str.(required) language of the prompt text for the reference audio
@@ -1026,16 +1615,21 @@ class TTS:
                     "streaming_mode": False,      # bool. return audio chunk by chunk. (Medium quality, Slow response speed)
                     "overlap_length": 2,          # int. overlap length of semantic tokens for streaming mode.
                     "min_chunk_length": 16,        # int. The minimum chunk length of semantic tokens for streaming mode. (affects audio chunk size)
+                    "streaming_left_context": 100,  # int. number of previous semantic tokens re-encoded for each streaming chunk, <=0 means the whole prefix.
                     "fixed_length_chunk": False,  # bool. When turned on, it can achieve faster streaming response, but with lower quality. (lower quality, faster response speed)
+                    "pipeline_infer": True,       # bool. run the text front-end ahead on a worker thread and overlap T2S of the next batch with VITS of the current one. (the overlap is disabled when a seed is given)
+                    "cancel_event": None,         # threading.Event.(optional) set it to cancel this request, checked between decoding steps and between chunks.
                 }
         returns:
             Tuple[int, np.ndarray]: sampling rate and audio data.
         """
         ########## variables initialization ###########
-        self.stop_flag: bool = False
+        cancel_event: threading.Event = inputs.get("cancel_event", None) or threading.Event()
         text: str = inputs.get("text", "")
+        text_stream = inputs.get("text_stream", None)
         text_lang: str = inputs.get("text_lang", "")
         ref_audio_path: str = inputs.get("ref_audio_path", "")
+        ref_audio_bytes: bytes = inputs.get("ref_audio_bytes", None)
         aux_ref_audio_paths: list = inputs.get("aux_ref_audio_paths", [])
         prompt_text: str = inputs.get("prompt_text", "")
         prompt_lang: str = inputs.get("prompt_lang", "")
@@ -1059,31 +1653,47 @@ class TTS:
         streaming_mode = inputs.get("streaming_mode", False)
         overlap_length = inputs.get("overlap_length", 2)
         min_chunk_length = inputs.get("min_chunk_length", 16)
+        streaming_left_context = inputs.get("streaming_left_context", 100)
         fixed_length_chunk = inputs.get("fixed_length_chunk", False)
+        pipeline_infer = inputs.get("pipeline_infer", True)
+        if text_stream is not None and not (return_fragment or streaming_mode):
+            ### 增量输入的文本无法整体切分与分桶, 自动切换为分段返回模式
+            return_fragment = True
         chunk_split_thershold = 0.0 # 该值代表语义token与mute token的余弦相似度阈值，若大于该阈值，则视为可切分点。
 
+        ### 按模式选择本次请求的解码函数, 不修改共享的 t2s 模型
         if parallel_infer and not streaming_mode:
             print(i18n("并行推理模式已开启"))
-            self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_batch_infer
+            infer_panel_name = "infer_panel_batch_infer"
         elif not parallel_infer and streaming_mode and not self.configs.use_vocoder:
             print(i18n("流式推理模式已开启"))
-            self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_naive
+            infer_panel_name = "infer_panel_naive"
         elif streaming_mode and self.configs.use_vocoder:
             print(i18n("SoVits V3/4模型不支持流式推理模式，已自动回退到分段返回模式"))
             streaming_mode = False
             return_fragment = True
             if parallel_infer:
-                self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_batch_infer
+                infer_panel_name = "infer_panel_batch_infer"
             else:
-                self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_naive_batched
-            # self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_naive
+                infer_panel_name = "infer_panel_naive_batched"
         elif parallel_infer and streaming_mode:
             print(i18n("不支持同时开启并行推理和流式推理模式，已自动关闭并行推理模式"))
             parallel_infer = False
-            self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_naive
+            infer_panel_name = "infer_panel_naive"
         else:
             print(i18n("朴素推理模式已开启"))
-            self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_naive_batched
+            infer_panel_name = "infer_panel_naive_batched"
+
+        if self.onnx_engine is not None and not streaming_mode:
+            ### onnxruntime 逐句解码; 流式推理仍使用 torch 的 infer_panel_naive
+            print(i18n("使用 ONNX Runtime 推理"))
+            infer_panel = self.onnx_engine.infer_panel
+        elif self.torchscript_engine is not None and not streaming_mode:
+            print(i18n("使用 TorchScript 推理"))
+            infer_panel = self.torchscript_engine.infer_panel
+        else:
+            ### TorchScript 引擎未构建 torch 模型时, 只有走到这里才加载
+            infer_panel = getattr(self.t2s_model.model, infer_panel_name)
 
         if return_fragment and streaming_mode:
             print(i18n("流式推理模式不支持分段返回，已自动关闭分段返回"))
@@ -1120,6 +1730,9 @@ class TTS:
         if no_prompt_text and self.configs.use_vocoder:
             raise NO_PROMPT_ERROR("prompt_text cannot be empty when using SoVITS_V3")
 
+        if ref_audio_bytes:
+            # 上传的参考音频不落盘, 以内容哈希作为标识, 内容相同时直接复用已提取的参考特征
+            ref_audio_path = "sha256:" + self.prompt_feature_cache.hash_audio(ref_audio_bytes)
         if ref_audio_path in [None, ""] and (
             (self.prompt_cache["prompt_semantic"] is None) or (self.prompt_cache["refer_spec"] in [None, []])
         ):
@@ -1133,37 +1746,39 @@ class TTS:
             ref_audio_path != self.prompt_cache["ref_audio_path"]
             or (self.is_v2pro and self.prompt_cache["refer_spec"][0][1] is None)
         ):
-            if not os.path.exists(ref_audio_path):
+            if not ref_audio_bytes and not os.path.exists(ref_audio_path):
                 raise ValueError(f"{ref_audio_path} not exists")
-            self.set_ref_audio(ref_audio_path)
+            self.set_ref_audio(ref_audio_path, ref_audio_bytes or None)
 
         aux_ref_audio_paths = aux_ref_audio_paths if aux_ref_audio_paths is not None else []
         paths = set(aux_ref_audio_paths) & set(self.prompt_cache["aux_ref_audio_paths"])
         if not (len(list(paths)) == len(aux_ref_audio_paths) == len(self.prompt_cache["aux_ref_audio_paths"])):
             self.prompt_cache["aux_ref_audio_paths"] = aux_ref_audio_paths
             self.prompt_cache["refer_spec"] = [self.prompt_cache["refer_spec"][0]]
+            self.prompt_cache["sv_emb"] = [self.prompt_cache["sv_emb"][0]]
+            self.prompt_cache["ge"] = None
             for path in aux_ref_audio_paths:
                 if path in [None, ""]:
                     continue
                 if not os.path.exists(path):
                     print(i18n("音频文件不存在，跳过："), path)
                     continue
-                self.prompt_cache["refer_spec"].append(self._get_ref_spec(path))
+                entry = self._get_ref_spec(path)
+                self.prompt_cache["refer_spec"].append((entry["spec"], entry["audio"]))
+                self.prompt_cache["sv_emb"].append(entry["sv_emb"])
 
         if not no_prompt_text:
             prompt_text = prompt_text.strip("\n")
             if prompt_text[-1] not in splits:
                 prompt_text += "。" if prompt_lang != "en" else "."
             print(i18n("实际输入的参考文本:"), prompt_text)
-            if self.prompt_cache["prompt_text"] != prompt_text:
-                phones, bert_features, norm_text = self.text_preprocessor.segment_and_extract_feature_for_text(
-                    prompt_text, prompt_lang, self.configs.version
-                )
+            if self.prompt_cache["prompt_text"] != prompt_text or self.prompt_cache["prompt_lang"] != prompt_lang:
+                entry = self._get_prompt_text_features(prompt_text, prompt_lang)
                 self.prompt_cache["prompt_text"] = prompt_text
                 self.prompt_cache["prompt_lang"] = prompt_lang
-                self.prompt_cache["phones"] = phones
-                self.prompt_cache["bert_features"] = bert_features
-                self.prompt_cache["norm_text"] = norm_text
+                self.prompt_cache["phones"] = entry["phones"]
+                self.prompt_cache["bert_features"] = entry["bert_features"]
+                self.prompt_cache["norm_text"] = entry["norm_text"]
 
         ###### text preprocessing ########
         t1 = time.perf_counter()
@@ -1186,12 +1801,21 @@ class TTS:
             )
         else:
             print(f"############ {i18n('切分文本')} ############")
-            texts = self.text_preprocessor.pre_seg_text(text, text_lang, text_split_method)
-            data = []
-            for i in range(len(texts)):
-                if i % batch_size == 0:
-                    data.append([])
-                data[-1].append(texts[i])
+            if text_stream is not None:
+                ### 增量输入: 每收到一段已结束的文本就切句, 每句单独成批, 不等待后续文本
+                def iter_stream_texts():
+                    for piece in text_stream:
+                        for text in self.text_preprocessor.pre_seg_text(piece, text_lang, text_split_method):
+                            yield [text]
+
+                data = iter_stream_texts()
+            else:
+                texts = self.text_preprocessor.pre_seg_text(text, text_lang, text_split_method)
+                data = []
+                for i in range(len(texts)):
+                    if i % batch_size == 0:
+                        data.append([])
+                    data[-1].append(texts[i])
 
             def make_batch(batch_texts):
                 batch_data = []
@@ -1222,6 +1846,8 @@ class TTS:
                 return batch[0]
 
         t2 = time.perf_counter()
+        self.running_cancel_events.add(cancel_event)
+        stages = None
         try:
             print("############ 推理 ############")
             ###### inference ######
@@ -1230,12 +1856,60 @@ class TTS:
             audio = []
             is_first_package = True
             output_sr = self.configs.sampling_rate if not self.configs.use_vocoder else self.vocoder_configs["sr"]
-            for item in data:
-                t3 = time.perf_counter()
-                if return_fragment or streaming_mode:
-                    item = make_batch(item)
-                    if item is None:
-                        continue
+
+            def get_prompt(batch_size: int):
+                if no_prompt_text:
+                    return None
+                return self.prompt_cache["prompt_semantic"].expand(batch_size, -1).to(self.configs.device)
+
+            def frontend():
+                for item in data:
+                    if cancel_event.is_set():
+                        return
+                    if return_fragment or streaming_mode:
+                        item = make_batch(item)
+                        if item is None:
+                            continue
+                    yield item
+
+            def t2s_stage(items):
+                ### 非流式时在这里预测语义token; 流式时在合成阶段边预测边解码
+                for item in items:
+                    if cancel_event.is_set():
+                        return
+                    t3 = time.perf_counter()
+                    t2s_result = None
+                    if not streaming_mode:
+                        print(f"############ {i18n('预测语义Token')} ############")
+                        t2s_result = infer_panel(
+                            item["all_phones"],
+                            item["all_phones_len"],
+                            get_prompt(len(item["all_phones"])),
+                            item["all_bert_features"],
+                            # prompt_phone_len=ph_offset,
+                            top_k=top_k,
+                            top_p=top_p,
+                            temperature=temperature,
+                            early_stop_num=self.configs.hz * self.configs.max_sec,
+                            max_len=item["max_len"],
+                            repetition_penalty=repetition_penalty,
+                            cancel_event=cancel_event,
+                        )
+                    yield item, t2s_result, time.perf_counter() - t3
+
+            ### 前端 (G2P/BERT) 在后台线程提前处理下一批; 非流式时 T2S 也在后台线程上处理下一批, 与当前批的 VITS 重叠。
+            ### T2S 与 VITS 共用随机数生成器, 重叠时取随机数的顺序不固定, 指定了 seed 时不重叠以保证结果可复现。
+            stages = frontend()
+            if pipeline_infer and (return_fragment or streaming_mode):
+                stages = prefetch(stages, maxsize=2)
+            stages = t2s_stage(stages)
+            if pipeline_infer and not streaming_mode and int(seed) == -1:
+                stages = prefetch(stages, maxsize=1)
+
+            for item, t2s_result, t2s_time in stages:
+                if cancel_event.is_set():
+                    break
+                t3 = time.perf_counter() - t2s_time
 
                 batch_phones: List[torch.LongTensor] = item["phones"]
                 # batch_phones:torch.LongTensor = item["phones"]
@@ -1247,39 +1921,26 @@ class TTS:
                 max_len = item["max_len"]
 
                 print(i18n("前端处理后的文本(每句):"), norm_text)
-                if no_prompt_text:
-                    prompt = None
-                else:
-                    prompt = (
-                        self.prompt_cache["prompt_semantic"].expand(len(all_phoneme_ids), -1).to(self.configs.device)
-                    )
+                prompt = get_prompt(len(all_phoneme_ids))
 
                 refer_audio_spec = []
                 
                 sv_emb = [] if self.is_v2pro else None
-                for spec, audio_tensor in self.prompt_cache["refer_spec"]:
+                for i, (spec, audio_tensor) in enumerate(self.prompt_cache["refer_spec"]):
                     spec = spec.to(dtype=self.precision, device=self.configs.device)
                     refer_audio_spec.append(spec)
                     if self.is_v2pro:
-                        sv_emb.append(self.sv_model.compute_embedding3(audio_tensor))
+                        sv_emb.append(self.prompt_cache["sv_emb"][i])
+                ge = None
+                if not self.configs.use_vocoder and (streaming_mode or not self._script_decodes(refer_audio_spec, speed_factor)):
+                    ge = self._get_prompt_ge(refer_audio_spec, sv_emb)
 
                 if not streaming_mode:
-                    print(f"############ {i18n('预测语义Token')} ############")
-                    pred_semantic_list, idx_list = self.t2s_model.model.infer_panel(
-                        all_phoneme_ids,
-                        all_phoneme_lens,
-                        prompt,
-                        all_bert_features,
-                        # prompt_phone_len=ph_offset,
-                        top_k=top_k,
-                        top_p=top_p,
-                        temperature=temperature,
-                        early_stop_num=self.configs.hz * self.configs.max_sec,
-                        max_len=max_len,
-                        repetition_penalty=repetition_penalty,
-                    )
+                    pred_semantic_list, idx_list = t2s_result
                     t4 = time.perf_counter()
                     t_34 += t4 - t3
+                    if cancel_event.is_set():
+                        continue
 
 
                     batch_audio_fragment = []
@@ -1302,7 +1963,7 @@ class TTS:
                             print(f"{i18n('并行合成中')}...")
                             # ## vits并行推理 method 2
                             pred_semantic_list = [item[-idx:] for item, idx in zip(pred_semantic_list, idx_list)]
-                            upsample_rate = math.prod(self.vits_model.upsample_rates)
+                            upsample_rate = math.prod(self.configs.upsample_rates)
                             audio_frag_idx = [
                                 pred_semantic_list[i].shape[0] * 2 * upsample_rate
                                 for i in range(0, len(pred_semantic_list))
@@ -1313,8 +1974,8 @@ class TTS:
                             )
                             _batch_phones = torch.cat(batch_phones).unsqueeze(0).to(self.configs.device)
 
-                            _batch_audio_fragment = self.vits_model.decode(
-                                    all_pred_semantic, _batch_phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb
+                            _batch_audio_fragment = self._vits_decode(
+                                    all_pred_semantic, _batch_phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb, ge=ge
                                 ).detach()[0, 0, :]
 
                             audio_frag_end_idx.insert(0, 0)
@@ -1325,12 +1986,14 @@ class TTS:
                         else:
                             # ## vits串行推理
                             for i, idx in enumerate(tqdm(idx_list)):
+                                if cancel_event.is_set():
+                                    break
                                 phones = batch_phones[i].unsqueeze(0).to(self.configs.device)
                                 _pred_semantic = (
                                     pred_semantic_list[i][-idx:].unsqueeze(0).unsqueeze(0)
                                 )  # .unsqueeze(0)#mq要多unsqueeze一次
-                                audio_fragment = self.vits_model.decode(
-                                        _pred_semantic, phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb
+                                audio_fragment = self._vits_decode(
+                                        _pred_semantic, phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb, ge=ge
                                     ).detach()[0, 0, :]
                                 batch_audio_fragment.append(audio_fragment)  ###试试重建不带上prompt部分
                     else:
@@ -1342,6 +2005,8 @@ class TTS:
                             batch_audio_fragment.extend(audio_fragments)
                         else:
                             for i, idx in enumerate(tqdm(idx_list)):
+                                if cancel_event.is_set():
+                                    break
                                 phones = batch_phones[i].unsqueeze(0).to(self.configs.device)
                                 _pred_semantic = (
                                     pred_semantic_list[i][-idx:].unsqueeze(0).unsqueeze(0)
@@ -1356,11 +2021,11 @@ class TTS:
                     #     item.to(dtype=self.precision, device=self.configs.device)
                     #     for item in self.prompt_cache["refer_spec"]
                     # ]
-                    semantic_token_generator =self.t2s_model.model.infer_panel(
+                    semantic_token_generator = infer_panel(
                         all_phoneme_ids[0].unsqueeze(0),
                         all_phoneme_lens,
                         prompt,
-                        all_bert_features[0].unsqueeze(0),
+                        all_bert_features[0].unsqueeze(0) if all_bert_features[0] is not None else None,
                         top_k=top_k,
                         top_p=top_p,
                         temperature=temperature,
@@ -1371,6 +2036,7 @@ class TTS:
                         chunk_length=min_chunk_length,
                         mute_emb_sim_matrix=self.configs.mute_emb_sim_matrix if not fixed_length_chunk else None,
                         chunk_split_thershold=chunk_split_thershold,
+                        cancel_event=cancel_event,
                     )
                     t4 = time.perf_counter()
                     t_34 += t4 - t3
@@ -1395,6 +2061,8 @@ class TTS:
                     overlap_len = overlap_length
                     overlap_size = math.ceil(overlap_length*upsample_rate)
                     for semantic_tokens, is_final in semantic_token_generator:
+                        if cancel_event.is_set():
+                            break
                         if semantic_tokens is None and last_audio_chunk is not None:
                             yield self.audio_postprocess(
                                     [[last_audio_chunk[-overlap_size:]]],
@@ -1419,6 +2087,12 @@ class TTS:
                         else:
                             overlap_len = overlap_length
 
+                        if streaming_left_context > 0:
+                            # 只重新编码有限长度的左侧上下文, 每个chunk的解码耗时不再随已生成的长度增长
+                            context_len = max(streaming_left_context, overlap_len) + semantic_tokens.shape[-1]
+                            _semantic_tokens = _semantic_tokens[..., -context_len:]
+                            previous_tokens = [_semantic_tokens]
+
 
                         if not self.configs.use_vocoder:
                             token_padding_length = 0
@@ -1433,6 +2107,7 @@ class TTS:
                                                     phones, refer_audio_spec, 
                                                     speed=speed_factor,
                                                     sv_emb=sv_emb,
+                                                    ge=ge,
                                                     result_length=semantic_tokens.shape[-1]+overlap_len if not is_first_chunk else None,
                                                     overlap_frames=last_latent[:,:,-overlap_len*(2 if self.vits_model.semantic_frame_rate == "25hz" else 1):] \
                                                     if last_latent is not None else None,
@@ -1474,9 +2149,13 @@ class TTS:
                             print(f"first_package_delay: {time.perf_counter()-t0:.3f}")
                             is_first_package = False
 
+                    if cancel_event.is_set():
+                        continue
 
                     yield output_sr, np.zeros(int(output_sr*fragment_interval), dtype=np.int16)
 
+                if cancel_event.is_set():
+                    continue
                 t5 = time.perf_counter()
                 t_45 += t5 - t4
                 if return_fragment:
@@ -1494,9 +2173,12 @@ class TTS:
                 else:
                     audio.append(batch_audio_fragment)
 
-                if self.stop_flag:
+            if cancel_event.is_set():
+                print("############ 推理已取消 ############")
+                ### 流式/分段返回时直接结束, 非流式仍返回一段静音
+                if not (return_fragment or streaming_mode):
                     yield output_sr, np.zeros(int(output_sr), dtype=np.int16)
-                    return
+                return
 
             if not (return_fragment or streaming_mode):
                 print("%.3f\t%.3f\t%.3f\t%.3f" % (t1 - t0, t2 - t1, t_34, t_45))
@@ -1515,6 +2197,10 @@ class TTS:
 
         except Exception as e:
             traceback.print_exc()
+            # 先停止流水线中的后台线程, 再重置模型
+            cancel_event.set()
+            if stages is not None:
+                stages.close()
             # 必须返回一个空音频, 否则会导致显存不释放。
             yield 16000, np.zeros(int(16000), dtype=np.int16)
             # 重置模型, 否则会导致显存释放不完全。
@@ -1522,10 +2208,16 @@ class TTS:
             del self.vits_model
             self.t2s_model = None
             self.vits_model = None
-            self.init_t2s_weights(self.configs.t2s_weights_path)
-            self.init_vits_weights(self.configs.vits_weights_path)
+            self.model_pool.clear()
+            self.init_t2s_weights(self.configs.t2s_weights_path, save=False)
+            self.init_vits_weights(self.configs.vits_weights_path, save=False)
             raise e
         finally:
+            # 调用方提前关闭生成器时, 后台线程可能正在解码下一批; 先置位取消事件让其在下一步退出, 否则 close 要等整批解码完成
+            cancel_event.set()
+            if stages is not None:
+                stages.close()
+            self.running_cancel_events.discard(cancel_event)
             self.empty_cache()
 
     def empty_cache(self):
@@ -50,10 +50,17 @@ def merge_short_text_in_array(texts: str, threshold: int) -> list:
 
 
 class TextPreprocessor:
-    def __init__(self, bert_model: AutoModelForMaskedLM, tokenizer: AutoTokenizer, device: torch.device):
+    def __init__(
+        self,
+        bert_model: AutoModelForMaskedLM,
+        tokenizer: AutoTokenizer,
+        device: torch.device,
+        bert_batch_size: int = 16,
+    ):
         self.bert_model = bert_model
         self.tokenizer = tokenizer
         self.device = device
+        self.bert_batch_size = bert_batch_size
         self.bert_lock = threading.RLock()
 
     def preprocess(self, text: str, lang: str, text_split_method: str, version: str = "v2") -> List[Dict]:
@@ -62,8 +69,7 @@ class TextPreprocessor:
         texts = self.pre_seg_text(text, lang, text_split_method)
         result = []
         print(f"############ {i18n('提取文本Bert特征')} ############")
-        for text in tqdm(texts):
-            phones, bert_features, norm_text = self.segment_and_extract_feature_for_text(text, lang, version)
+        for phones, bert_features, norm_text in self.extract_features_batch(texts, lang, version):
             if phones is None or norm_text == "":
                 continue
             res = {
@@ -120,88 +126,141 @@ class TextPreprocessor:
         return self.get_phones_and_bert(text, language, version)
 
     def get_phones_and_bert(self, text: str, language: str, version: str, final: bool = False):
+        return self.extract_features_batch([text], language, version, final=final)[0]
+
+    def extract_features_batch(
+        self, texts: List[str], language: str, version: str, final: bool = False
+    ) -> List[Tuple[list, torch.Tensor, str]]:
+        """
+        先对所有句子做文本清洗/G2P, 再把其中全部中文片段拼成batch, 一次前向提取Bert特征。
+        texts 可以来自同一个请求切分出的多个句子, 也可以来自多个请求。
+        """
         with self.bert_lock:
-            text = re.sub(r' {2,}', ' ', text)
-            textlist = []
-            langlist = []
-            if language == "all_zh":
-                for tmp in LangSegmenter.getTexts(text,"zh"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_yue":
-                for tmp in LangSegmenter.getTexts(text,"zh"):
-                    if tmp["lang"] == "zh":
-                        tmp["lang"] = "yue"
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_ja":
-                for tmp in LangSegmenter.getTexts(text,"ja"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_ko":
-                for tmp in LangSegmenter.getTexts(text,"ko"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "en":
-                langlist.append("en")
-                textlist.append(text)
-            elif language == "auto":
-                for tmp in LangSegmenter.getTexts(text):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "auto_yue":
-                for tmp in LangSegmenter.getTexts(text):
-                    if tmp["lang"] == "zh":
-                        tmp["lang"] = "yue"
+            segments_list = [self.clean_segments(text, language, version, final) for text in tqdm(texts)]
+
+            zh_segments = [
+                segment for segments in segments_list for segment in segments if segment["lang"] == "zh"
+            ]
+            zh_features = self.get_bert_feature_batch(
+                [segment["norm_text"] for segment in zh_segments],
+                [segment["word2ph"] for segment in zh_segments],
+            )
+            for segment, feature in zip(zh_segments, zh_features):
+                segment["bert"] = feature.to(self.device)
+
+            results = []
+            for segments in segments_list:
+                if all(segment["lang"] != "zh" for segment in segments):
+                    # 整句都没有中文时bert特征全为0, 用 None 表示, 由 T2S 模型直接加上 bert_proj 的偏置
+                    bert = None
+                else:
+                    bert_list = []
+                    for segment in segments:
+                        if segment["lang"] != "zh":
+                            segment["bert"] = self.get_bert_inf(
+                                segment["phones"], segment["word2ph"], segment["norm_text"], segment["lang"]
+                            )
+                        bert_list.append(segment["bert"])
+                    bert = torch.cat(bert_list, dim=1)
+                phones = sum([segment["phones"] for segment in segments], [])
+                norm_text = "".join([segment["norm_text"] for segment in segments])
+                results.append((phones, bert, norm_text))
+            return results
+
+    def clean_segments(self, text: str, language: str, version: str, final: bool = False) -> List[Dict]:
+        text = re.sub(r' {2,}', ' ', text)
+        textlist, langlist = self.split_languages(text, language)
+        segments = []
+        for i in range(len(textlist)):
+            lang = langlist[i]
+            phones, word2ph, norm_text = self.clean_text_inf(textlist[i], lang, version)
+            segments.append(
+                {
+                    "phones": phones,
+                    "word2ph": word2ph,
+                    "norm_text": norm_text,
+                    "lang": lang.replace("all_", ""),
+                }
+            )
+
+        if not final and sum([len(segment["phones"]) for segment in segments]) < 6:
+            return self.clean_segments("." + text, language, version, final=True)
+        return segments
+
+    def split_languages(self, text: str, language: str) -> Tuple[List[str], List[str]]:
+        textlist = []
+        langlist = []
+        if language == "all_zh":
+            for tmp in LangSegmenter.getTexts(text,"zh"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_yue":
+            for tmp in LangSegmenter.getTexts(text,"zh"):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ja":
+            for tmp in LangSegmenter.getTexts(text,"ja"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ko":
+            for tmp in LangSegmenter.getTexts(text,"ko"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "en":
+            langlist.append("en")
+            textlist.append(text)
+        elif language == "auto":
+            for tmp in LangSegmenter.getTexts(text):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "auto_yue":
+            for tmp in LangSegmenter.getTexts(text):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        else:
+            for tmp in LangSegmenter.getTexts(text):
+                if langlist:
+                    if (tmp["lang"] == "en" and langlist[-1] == "en") or (tmp["lang"] != "en" and langlist[-1] != "en"):
+                        textlist[-1] += tmp["text"]
+                        continue
+                if tmp["lang"] == "en":
                     langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            else:
-                for tmp in LangSegmenter.getTexts(text):
-                    if langlist:
-                        if (tmp["lang"] == "en" and langlist[-1] == "en") or (tmp["lang"] != "en" and langlist[-1] != "en"):
-                            textlist[-1] += tmp["text"]
-                            continue
-                    if tmp["lang"] == "en":
-                        langlist.append(tmp["lang"])
-                    else:
-                        # 因无法区别中日韩文汉字,以用户输入为准
-                        langlist.append(language)
-                    textlist.append(tmp["text"])
-            # print(textlist)
-            # print(langlist)
-            phones_list = []
-            bert_list = []
-            norm_text_list = []
-            for i in range(len(textlist)):
-                lang = langlist[i]
-                phones, word2ph, norm_text = self.clean_text_inf(textlist[i], lang, version)
-                bert = self.get_bert_inf(phones, word2ph, norm_text, lang)
-                phones_list.append(phones)
-                norm_text_list.append(norm_text)
-                bert_list.append(bert)
-            bert = torch.cat(bert_list, dim=1)
-            phones = sum(phones_list, [])
-            norm_text = "".join(norm_text_list)
-
-            if not final and len(phones) < 6:
-                return self.get_phones_and_bert("." + text, language, version, final=True)
-
-            return phones, bert, norm_text
+                else:
+                    # 因无法区别中日韩文汉字,以用户输入为准
+                    langlist.append(language)
+                textlist.append(tmp["text"])
+        # print(textlist)
+        # print(langlist)
+        return textlist, langlist
 
     def get_bert_feature(self, text: str, word2ph: list) -> torch.Tensor:
-        with torch.no_grad():
-            inputs = self.tokenizer(text, return_tensors="pt")
-            for i in inputs:
-                inputs[i] = inputs[i].to(self.device)
-            res = self.bert_model(**inputs, output_hidden_states=True)
-            res = torch.cat(res["hidden_states"][-3:-2], -1)[0].cpu()[1:-1]
-        assert len(word2ph) == len(text)
-        phone_level_feature = []
-        for i in range(len(word2ph)):
-            repeat_feature = res[i].repeat(word2ph[i], 1)
-            phone_level_feature.append(repeat_feature)
-        phone_level_feature = torch.cat(phone_level_feature, dim=0)
-        return phone_level_feature.T
+        return self.get_bert_feature_batch([text], [word2ph])[0]
+
+    def get_bert_feature_batch(self, texts: List[str], word2phs: List[list]) -> List[torch.Tensor]:
+        features = [None] * len(texts)
+        # 按长度排序后分批, 减少padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.bert_batch_size):
+            index = order[start : start + self.bert_batch_size]
+            with torch.no_grad():
+                inputs = self.tokenizer([texts[i] for i in index], return_tensors="pt", padding=True)
+                for i in inputs:
+                    inputs[i] = inputs[i].to(self.device)
+                res = self.bert_model(**inputs, output_hidden_states=True)
+                res = torch.cat(res["hidden_states"][-3:-2], -1).cpu()
+                token_lens = inputs["attention_mask"].sum(-1).tolist()
+            for b, i in enumerate(index):
+                word2ph = word2phs[i]
+                assert len(word2ph) == len(texts[i])
+                # 去掉 [CLS]/[SEP], 每个字的特征按 word2ph 一次性展开到音素级
+                hidden = res[b, 1 : token_lens[b] - 1][: len(word2ph)]
+                phone_level_feature = torch.repeat_interleave(hidden, torch.LongTensor(word2ph), dim=0)
+                features[i] = phone_level_feature.T
+        return features
 
     def clean_text_inf(self, text: str, language: str, version: str = "v2"):
         language = language.replace("all_", "")
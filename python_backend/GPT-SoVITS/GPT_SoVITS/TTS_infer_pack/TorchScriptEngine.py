@@ -0,0 +1,208 @@
+import json
+import os
+from copy import deepcopy
+from typing import Callable, List, Optional
+
+import torch
+from torch import nn
+
+from AR.models.utils import is_cancelled
+from TTS_infer_pack.PromptCache import sha256_file_memo
+
+
+class VitsDecodeScript(nn.Module):
+    """
+    export_torch_script.VitsModel 中 SynthesizerTrn (models_onnx) 的 speed=1 解码。
+    直接输入 TTS 已缓存的参考音频频谱, 不再在图内计算 stft。
+    """
+
+    def __init__(self, vq_model: nn.Module):
+        super().__init__()
+        self.vq_model = vq_model
+
+    def forward(self, codes, text, refer, sv_emb):
+        return self.vq_model(codes, text, refer, noise_scale=0.5, speed=1, sv_emb=sv_emb)
+
+
+class TorchScriptEngine:
+    """
+    使用 export_torch_script 导出的 TorchScript 模块运行 T2S 与 VITS。
+
+    第一次加载某个权重文件时导出 T2SModel (script) 与 VITS 解码 (trace), 以权重文件的 sha256 为目录名缓存在 cache_dir 下,
+    同时写入激活该权重所需的配置 (meta), 之后 cached_t2s / cached_vits 直接 torch.jit.load, 不需要 torch 模型。
+    加载后 freeze 并 optimize_for_inference; 返回的模块由 TTS 保存在模型池的条目中, 再次激活时用 use_t2s / use_vits 直接切换。
+    T2SModel 只支持带参考文本的单句解码, 无参考文本时回退到 t2s_fallback() 返回的 torch 模型。
+    """
+
+    def __init__(self, cache_dir: str, device: torch.device, is_half: bool = False):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.device = torch.device(device)
+        self.is_half = is_half
+
+        self.t2s: torch.jit.ScriptModule = None
+        self.t2s_fallback: Callable = None
+        self.vits: torch.jit.ScriptModule = None
+
+    def _export_dir(self, weights_path: str) -> str:
+        path = os.path.join(self.cache_dir, sha256_file_memo(weights_path))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _load(self, path: str) -> torch.jit.ScriptModule:
+        module = torch.jit.load(path, map_location=self.device).eval()
+        if self.is_half:
+            module = module.half()
+        return torch.jit.optimize_for_inference(torch.jit.freeze(module))
+
+    def _cached(self, weights_path: str, name: str) -> Optional[dict]:
+        export_dir = self._export_dir(weights_path)
+        path = os.path.join(export_dir, f"{name}.pt")
+        meta_path = os.path.join(export_dir, f"{name}.json")
+        if not (os.path.exists(path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return {name: self._load(path), "meta": meta, "nbytes": os.path.getsize(path)}
+
+    def _save_meta(self, weights_path: str, name: str, meta: dict):
+        with open(os.path.join(self._export_dir(weights_path), f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def cached_t2s(self, weights_path: str) -> Optional[dict]:
+        """
+        已导出过的权重直接加载 T2S 模块与 meta, 否则返回 None
+        """
+        return self._cached(weights_path, "t2s")
+
+    def load_t2s(self, weights_path: str, t2s_model, meta: dict) -> dict:
+        """
+        t2s_model: 已加载权重的 Text2SemanticLightningModule
+        meta: 激活该权重时需要恢复的配置, 与模块一起缓存
+        """
+        path = os.path.join(self._export_dir(weights_path), "t2s.pt")
+        if not os.path.exists(path):
+            print(f"Exporting T2S TorchScript module to {path}")
+            self.export_t2s(t2s_model, path)
+        self._save_meta(weights_path, "t2s", meta)
+        return {"t2s": self._load(path), "meta": meta, "nbytes": os.path.getsize(path)}
+
+    def use_t2s(self, modules: dict, fallback: Callable):
+        """
+        fallback: 返回 Text2SemanticDecoder 的函数, 只在需要回退到 torch 推理时调用
+        """
+        self.t2s = modules["t2s"]
+        self.t2s_fallback = fallback
+
+    def cached_vits(self, weights_path: str) -> Optional[dict]:
+        """
+        已导出过的权重直接加载 VITS 解码模块与 meta, 否则返回 None
+        """
+        return self._cached(weights_path, "vits_decode")
+
+    def load_vits(self, weights_path: str, version: str, meta: dict) -> dict:
+        path = os.path.join(self._export_dir(weights_path), "vits_decode.pt")
+        if not os.path.exists(path):
+            print(f"Exporting VITS TorchScript module to {path}")
+            self.export_vits(weights_path, version, path)
+        self._save_meta(weights_path, "vits_decode", meta)
+        return {"vits_decode": self._load(path), "meta": meta, "nbytes": os.path.getsize(path)}
+
+    def use_vits(self, modules: dict):
+        self.vits = modules["vits_decode"]
+
+    def unload_vits(self):
+        self.vits = None
+
+    @torch.no_grad()
+    def export_t2s(self, t2s_model, path: str):
+        from export_torch_script import T2SModel
+
+        ### 在副本上导出, 不改变正在服务的 torch 模型的设备和精度
+        raw_t2s = deepcopy(t2s_model).float().cpu().eval()
+        torch.jit.script(T2SModel(raw_t2s).eval()).save(path)
+
+    @torch.no_grad()
+    def export_vits(self, weights_path: str, version: str, path: str):
+        from export_torch_script import VitsModel
+
+        vits = VitsModel(weights_path, version=version, is_half=False, device="cpu")
+        codes = torch.randint(0, 1024, (1, 1, 40))
+        text = torch.randint(0, 100, (1, 30))
+        refer = torch.randn((1, vits.hps.data.filter_length // 2 + 1, 100))
+        sv_emb = torch.randn((1, 20480))
+        ### 解码中有 randn_like, 不做 trace 检查
+        traced = torch.jit.trace(
+            VitsDecodeScript(vits.vq_model).eval(), (codes, text, refer, sv_emb), check_trace=False
+        )
+        traced.save(path)
+
+    @torch.no_grad()
+    def infer_panel(
+        self,
+        x: List[torch.LongTensor],  #####全部文本token
+        x_lens: torch.LongTensor,
+        prompts: torch.LongTensor,  ####参考音频token
+        bert_feature: List[torch.Tensor],
+        top_k: int = -100,
+        top_p: int = 100,
+        early_stop_num: int = -1,
+        temperature: float = 1.0,
+        repetition_penalty: float = 1.35,
+        **kwargs,
+    ):
+        """
+        与 Text2SemanticDecoder.infer_panel_naive_batched 相同的输入输出, 逐句解码。
+        early_stop_num 由导出时的 max_sec 决定; 图内的解码循环无法中断, 取消只在句与句之间生效。
+        """
+        if prompts is None:
+            return self.t2s_fallback().infer_panel_naive_batched(
+                x,
+                x_lens,
+                prompts,
+                bert_feature,
+                top_k=top_k,
+                top_p=top_p,
+                early_stop_num=early_stop_num,
+                temperature=temperature,
+                repetition_penalty=repetition_penalty,
+                **kwargs,
+            )
+
+        y_list = []
+        idx_list = []
+        for i in range(len(x)):
+            if is_cancelled(kwargs.get("cancel_event", None)):
+                y_list.append(x[i][:0])
+                idx_list.append(0)
+                continue
+            bert = bert_feature[i]
+            if bert is None:
+                bert = torch.zeros((1024, x[i].shape[0]), dtype=torch.float32, device=x[i].device)
+            ### T2SModel 分别输入参考文本与目标文本, 这里已经拼接好, 目标文本部分传空
+            pred_semantic = self.t2s(
+                prompts[i].unsqueeze(0),
+                x[i].unsqueeze(0),
+                x[i][:0].unsqueeze(0),
+                bert.T,
+                bert.T[:0],
+                torch.LongTensor([top_k]),
+                float(top_p),
+                float(temperature),
+                float(repetition_penalty),
+            )
+            y_list.append(pred_semantic[0, 0])
+            idx_list.append(pred_semantic.shape[-1])
+        return y_list, idx_list
+
+    @torch.no_grad()
+    def decode(
+        self, codes: torch.Tensor, text: torch.Tensor, refer: torch.Tensor, sv_emb: Optional[torch.Tensor]
+    ) -> torch.Tensor:
+        """
+        codes: [1, 1, T] 语义token, text: [1, L] 音素, refer: [1, n_fft // 2 + 1, T_ref] 参考音频频谱
+        返回 [1, 1, audio_length] 的音频。
+        """
+        if sv_emb is None:
+            sv_emb = torch.zeros((1, 20480), dtype=refer.dtype, device=refer.device)
+        return self.vits(codes, text, refer, sv_emb)
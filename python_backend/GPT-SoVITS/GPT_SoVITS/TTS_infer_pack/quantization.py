@@ -0,0 +1,128 @@
+"""
+CPU 上的 int8 动态量化: 权重预先量化为 int8, 激活在每次矩阵乘前按张量动态量化, 输出仍为 float32。
+只量化线性层 (以及等价于线性层的 kernel_size=1 Conv1d), 其余算子保持 float32。
+"""
+
+import torch
+import torch.nn.functional as F
+from torch import nn
+from torch.ao.quantization import quantize_dynamic
+
+from AR.models.t2s_model import T2SBlock, T2SMLP, T2STransformer, Text2SemanticDecoder
+
+
+class DynamicInt8Linear(nn.Module):
+    """
+    与 nn.Linear 用法一致的 int8 动态量化线性层, 另外保留 float32 的 bias 属性 (embed_text 会直接用到)
+    """
+
+    def __init__(self, weight: torch.Tensor, bias: torch.Tensor = None):
+        super().__init__()
+        linear = nn.Linear(weight.shape[1], weight.shape[0], bias=bias is not None)
+        with torch.no_grad():
+            linear.weight.copy_(weight.float())
+            if bias is not None:
+                linear.bias.copy_(bias.float())
+        self.linear = quantize_dynamic(nn.Sequential(linear), {nn.Linear}, dtype=torch.qint8)[0]
+        self.register_buffer("bias", None if bias is None else bias.detach().float().clone())
+
+    def forward(self, x):
+        return self.linear(x)
+
+
+class T2SMLPInt8(T2SMLP):
+    def __init__(self, mlp: T2SMLP):
+        self.linear1 = DynamicInt8Linear(mlp.w1, mlp.b1)
+        self.linear2 = DynamicInt8Linear(mlp.w2, mlp.b2)
+
+    def forward(self, x):
+        return self.linear2(F.relu(self.linear1(x)))
+
+
+class T2SBlockInt8(T2SBlock):
+    def __init__(self, block: T2SBlock):
+        super().__init__(
+            block.num_heads,
+            block.hidden_dim,
+            T2SMLPInt8(block.mlp),
+            None,
+            None,
+            None,
+            None,
+            block.norm_w1,
+            block.norm_b1,
+            block.norm_eps1,
+            block.norm_w2,
+            block.norm_b2,
+            block.norm_eps2,
+        )
+        self.qkv_linear = DynamicInt8Linear(block.qkv_w, block.qkv_b)
+        self.out_linear = DynamicInt8Linear(block.out_w, block.out_b)
+
+    def qkv(self, x: torch.Tensor):
+        return self.qkv_linear(x)
+
+    def out(self, x: torch.Tensor):
+        return self.out_linear(x)
+
+
+class PointwiseConv1dInt8(nn.Module):
+    """
+    kernel_size=1 的 Conv1d 就是对每一帧做线性变换, 输入输出为 [B, C, T]
+    """
+
+    def __init__(self, conv: nn.Conv1d):
+        super().__init__()
+        self.linear = DynamicInt8Linear(conv.weight.squeeze(-1), conv.bias)
+
+    def forward(self, x):
+        return self.linear(x.transpose(1, 2)).transpose(1, 2)
+
+
+def _is_pointwise_conv1d(module: nn.Module) -> bool:
+    return (
+        isinstance(module, nn.Conv1d)
+        and module.kernel_size == (1,)
+        and module.stride == (1,)
+        and module.dilation == (1,)
+        and module.groups == 1
+    )
+
+
+def _replace_pointwise_conv1d(module: nn.Module):
+    for name, child in module.named_children():
+        if _is_pointwise_conv1d(child):
+            setattr(module, name, PointwiseConv1dInt8(child))
+        else:
+            _replace_pointwise_conv1d(child)
+
+
+@torch.no_grad()
+def quantize_t2s_(model: Text2SemanticDecoder) -> Text2SemanticDecoder:
+    """
+    量化推理用的 t2s_transformer 中每个 block 的 qkv/out/mlp 线性层, 以及 bert_proj 和 ar_predict_layer。
+    训练和旧的 infer 使用的 nn.TransformerEncoder (model.h) 与 t2s_transformer 共享 float32 权重,
+    量化后将其删除以释放这部分内存, 模型此后只能用于 infer_panel_* 推理。
+    """
+    blocks = [T2SBlockInt8(block) for block in model.t2s_transformer.blocks]
+    model.t2s_transformer = T2STransformer(model.num_layers, blocks)
+    model.bert_proj = DynamicInt8Linear(model.bert_proj.weight, model.bert_proj.bias)
+    model.ar_predict_layer = DynamicInt8Linear(model.ar_predict_layer.weight, None)
+    del model.h
+    return model
+
+
+@torch.no_grad()
+def quantize_bert_(bert_model: nn.Module) -> nn.Module:
+    return quantize_dynamic(bert_model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+@torch.no_grad()
+def quantize_vits_enc_p_(vits_model: nn.Module) -> nn.Module:
+    """
+    只量化文本编码器 enc_p: 注意力的 q/k/v/o 和各投影层都是 kernel_size=1 的 Conv1d, 以及 MRTE 中的线性层。
+    FFN 的 kernel_size>1 卷积和声码器部分保持 float32。
+    """
+    _replace_pointwise_conv1d(vits_model.enc_p)
+    quantize_dynamic(vits_model.enc_p, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return vits_model
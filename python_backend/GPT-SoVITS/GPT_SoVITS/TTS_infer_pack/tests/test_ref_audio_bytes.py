@@ -0,0 +1,46 @@
+import os
+import sys
+
+# 与 api_v2.py 相同, 项目根目录与 GPT_SoVITS 都需要在 sys.path 中
+gpt_sovits_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(os.path.dirname(gpt_sovits_dir))
+sys.path.append(gpt_sovits_dir)
+
+import librosa
+import numpy as np
+import soundfile as sf
+from TTS_infer_pack.PromptCache import PromptCache
+from TTS_infer_pack.TTS import decode_audio_bytes
+
+
+def write_ref_audio(tmp_path, sr=44100, channels=2):
+    t = np.arange(int(sr * 4)) / sr
+    audio = np.stack([0.3 * np.sin(2 * np.pi * 220 * (i + 1) * t) for i in range(channels)], axis=1)
+    path = str(tmp_path / "ref.wav")
+    sf.write(path, audio.astype(np.float32), sr, subtype="FLOAT")
+    return path
+
+
+def test_decode_audio_bytes_matches_file_loaders(tmp_path):
+    path = write_ref_audio(tmp_path)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    # 与读取文件时相同: 保持原采样率与声道, (channels, samples)
+    audio, sr = decode_audio_bytes(data, 32000)
+    ref_audio, ref_sr = sf.read(path, dtype="float32", always_2d=True)
+    assert sr == ref_sr
+    np.testing.assert_array_equal(audio, ref_audio.T)
+
+    # 与 _extract_prompt_semantic 读取文件时的 librosa.load(path, sr=16000) 一致
+    wav16k = librosa.resample(audio.mean(0), orig_sr=sr, target_sr=16000)
+    ref_wav16k, _ = librosa.load(path, sr=16000)
+    np.testing.assert_allclose(wav16k, ref_wav16k, atol=1e-5)
+
+
+def test_hash_audio_bytes_matches_file_hash(tmp_path):
+    path = write_ref_audio(tmp_path)
+    with open(path, "rb") as f:
+        data = f.read()
+    cache = PromptCache()
+    assert cache.hash_audio(data) == cache.hash_audio(path)
@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+# 与 api_v2.py 相同, 项目根目录与 GPT_SoVITS 都需要在 sys.path 中
+gpt_sovits_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(os.path.dirname(gpt_sovits_dir))
+sys.path.append(gpt_sovits_dir)
+
+import torch
+from AR.models.utils import is_cancelled
+from TTS_infer_pack.TTS import TTS
+
+# 假的 T2S 每句解码 STEPS 步, 每步 STEP_SECONDS 秒, 与真实解码一样每步检查 cancel_event
+STEPS = 300
+STEP_SECONDS = 0.01
+
+
+class SlowT2S:
+    def __init__(self):
+        self.started = []
+
+    def infer_panel_naive_batched(self, x, x_lens, prompts, bert_feature, cancel_event=None, **kwargs):
+        self.started.append(time.perf_counter())
+        for _ in range(STEPS):
+            if is_cancelled(cancel_event):
+                break
+            time.sleep(STEP_SECONDS)
+        return [torch.zeros(10, dtype=torch.long) for _ in x], [10 for _ in x]
+
+
+class FakeTextPreprocessor:
+    def pre_seg_text(self, text, lang, text_split_method, version=None):
+        return [sentence + "." for sentence in text.split(".") if sentence]
+
+    def segment_and_extract_feature_for_text(self, text, language, version):
+        return [1] * len(text), None, text
+
+
+def build_tts() -> TTS:
+    """
+    不加载任何权重的 TTS: 参考音频与文本前端都是现成的, 只替换 T2S 与 VITS, 用来测试 run 的流水线本身
+    """
+    tts = TTS.__new__(TTS)
+    tts.configs = SimpleNamespace(
+        languages=["en"],
+        use_vocoder=False,
+        device=torch.device("cpu"),
+        sampling_rate=32000,
+        version="v2",
+        hz=50,
+        max_sec=10,
+        upsample_rates=[10, 8, 2, 2, 2],
+    )
+    tts._t2s_model = SimpleNamespace(model=SlowT2S())
+    tts._t2s_entry = None
+    tts._vits_model = None
+    tts._vits_entry = None
+    tts.onnx_engine = None
+    tts.torchscript_engine = None
+    tts.is_v2pro = False
+    tts.precision = torch.float32
+    tts.sr_model = None
+    tts.running_cancel_events = set()
+    tts.prompt_cache = {
+        "ref_audio_path": None,
+        "prompt_semantic": torch.zeros(10, dtype=torch.long),
+        "refer_spec": [(torch.zeros(1, 1025, 10), None)],
+        "sv_emb": [None],
+        "aux_ref_audio_paths": [],
+        "ge": None,
+    }
+    tts.text_preprocessor = FakeTextPreprocessor()
+    # 整个进程的 gc.collect 与流水线无关, 且耗时随已导入的模块变化, 不计入关闭耗时
+    tts.empty_cache = lambda: None
+    tts._get_prompt_ge = lambda refer_audio_spec, sv_emb: None
+    tts._vits_decode = lambda codes, text, refer_audio_spec, speed, sv_emb, ge: torch.zeros(
+        1, 1, codes.shape[-1] * 2 * 640
+    )
+    return tts
+
+
+def test_close_pipelined_run_returns_promptly():
+    tts = build_tts()
+    t2s = tts._t2s_model.model
+    cancel_event = threading.Event()
+    generator = tts.run(
+        {
+            "text": "one. two. three. four.",
+            "text_lang": "en",
+            "ref_audio_path": None,
+            "prompt_text": "",
+            "text_split_method": "cut4",
+            "return_fragment": True,
+            "parallel_infer": False,
+            "pipeline_infer": True,
+            "seed": -1,
+            "cancel_event": cancel_event,
+        }
+    )
+    sr, audio = next(generator)
+    assert sr == 32000 and len(audio) > 0
+
+    # 第一段返回后, 后台线程已经开始解码下一句
+    deadline = time.perf_counter() + 5
+    while len(t2s.started) < 2 and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert len(t2s.started) >= 2
+
+    t0 = time.perf_counter()
+    generator.close()
+    elapsed = time.perf_counter() - t0
+    assert elapsed < STEPS * STEP_SECONDS / 4, f"close() waited {elapsed:.2f}s for the background T2S step"
+    assert cancel_event.is_set()
+    assert tts.running_cancel_events == set()
@@ -86,6 +86,57 @@ def split(todo_text):
     return todo_texts
 
 
+class IncrementalSegmenter:
+    """
+    增量切句: 文本逐段输入 (如 LLM 逐 token 输出), 由注册的切分方法判断句子是否已结束,
+    已结束的部分立即返回, 未结束的部分留在缓冲区等待后续文本。
+
+    标点后的位置是否为切分点, 以在该标点后接上下一个字符与一段探测文本时,
+    切分方法是否从这里断开来判断, 因此 cut1 (凑四句) / cut2 (凑50字) 的分组规则同样生效,
+    cut0 (不切) 则一直缓冲到 flush()。标点需等到后面出现非标点字符才判断,
+    避免把 "3.14" 或 "..." 从中间切开。
+    """
+
+    probe_unit = "x" * 64
+    probe = (probe_unit + "。") * 8
+
+    def __init__(self, method_name: str):
+        self.method = get_method(method_name)
+        self.buffer = ""
+        self.checked = 0
+
+    def is_boundary(self, head: str, next_char: str) -> bool:
+        # 在 head 后接上真实的下一个字符与探测文本, 看切分方法是否恰好从下一个字符处断开
+        items = self.method(head + next_char + self.probe).split("\n")
+        for item in items:
+            if self.probe_unit in item:
+                return item.strip().startswith((next_char + self.probe_unit).strip())
+        return False
+
+    def feed(self, delta: str) -> list:
+        self.buffer += delta
+        texts = []
+        while True:
+            cut = None
+            for i in range(len(self.buffer) - 2, self.checked - 1, -1):
+                if self.buffer[i] not in splits or self.buffer[i + 1] in splits:
+                    continue
+                if self.is_boundary(self.buffer[: i + 1], self.buffer[i + 1]):
+                    cut = i + 1
+                    break
+            if cut is None:
+                # 末尾的字符要等到下一段文本才能判断
+                self.checked = max(len(self.buffer) - 1, 0)
+                return texts
+            texts.append(self.buffer[:cut])
+            self.buffer = self.buffer[cut:]
+            self.checked = 0
+
+    def flush(self) -> list:
+        text, self.buffer, self.checked = self.buffer, "", 0
+        return [text] if text.strip() else []
+
+
 # 不切
 @register_method("cut0")
 def cut0(inp):
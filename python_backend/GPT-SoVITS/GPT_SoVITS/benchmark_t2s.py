@@ -0,0 +1,198 @@
+"""
+T2S 解码微基准 (CPU/GPU 均可, 不需要预训练权重)
+
+` python GPT_SoVITS/benchmark_t2s.py --tokens 200 500 1000 `
+` python GPT_SoVITS/benchmark_t2s.py --batch_sizes 4 8 16 `
+
+默认对比逐 token torch.cat 增长的 KV cache (decode_next_token) 与预分配的定长 KV cache (decode_next_token_static),
+输出不同生成长度下的 tokens/sec。使用随机初始化的 Text2SemanticDecoder, 强制解码固定步数, 不受 EOS 影响。
+
+指定 --batch_sizes 时, 对比同一段多句文本的逐句解码 (infer_panel_naive_batched) 与拼batch解码 (infer_panel_batch_infer),
+句子长度随机, 每句生成长度由随机权重下的 EOS 决定, 最多 --tokens[0] 个, 输出总耗时和生成 tokens/sec。
+
+指定 --compare_loops 时, 对比每步同步判断EOS的 infer_panel_naive 与延迟判断EOS的 infer_panel_deferred,
+固定随机种子, 同时检查两者生成的 token 是否一致。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+now_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(now_dir)
+
+import torch
+from torch.nn import functional as F
+
+from AR.models.t2s_model import Text2SemanticDecoder
+
+
+def build_model(n_layer: int, device: str) -> Text2SemanticDecoder:
+    config = {
+        "model": {
+            "hidden_dim": 512,
+            "embedding_dim": 512,
+            "head": 16,
+            "n_layer": n_layer,
+            "vocab_size": 1025,
+            "phoneme_vocab_size": 732,
+            "dropout": 0,
+            "EOS": 1024,
+        }
+    }
+    return Text2SemanticDecoder(config).eval().to(device)
+
+
+def make_prompt(model: Text2SemanticDecoder, x_len: int, y_len: int, device: str):
+    x = torch.randint(0, model.phoneme_vocab_size, (1, x_len), device=device)
+    bert = torch.randn(1, 1024, x_len, device=device)
+    y = torch.randint(0, model.EOS, (1, y_len), device=device)
+
+    x = model.ar_text_embedding(x)
+    x = x + model.bert_proj(bert.transpose(1, 2))
+    x = model.ar_text_position(x)
+    y_pos = model.ar_audio_position(model.ar_audio_embedding(y))
+    xy_pos = torch.concat([x, y_pos], dim=1)
+
+    src_len = x_len + y_len
+    x_attn_mask = F.pad(torch.zeros((x_len, x_len), dtype=torch.bool), (0, y_len), value=True)
+    y_attn_mask = F.pad(torch.triu(torch.ones(y_len, y_len, dtype=torch.bool), diagonal=1), (x_len, 0), value=False)
+    xy_attn_mask = (
+        torch.concat([x_attn_mask, y_attn_mask], dim=0)
+        .view(1, 1, src_len, src_len)
+        .expand(1, model.num_head, -1, -1)
+        .to(device)
+    )
+    return xy_pos, xy_attn_mask
+
+
+def decode_cat(model: Text2SemanticDecoder, xy_pos, xy_attn_mask, n_tokens: int):
+    xy_dec, k_cache, v_cache = model.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+    for _ in range(n_tokens):
+        xy_dec, k_cache, v_cache = model.t2s_transformer.decode_next_token(xy_dec[:, -1:], k_cache, v_cache)
+
+
+def decode_static(model: Text2SemanticDecoder, xy_pos, xy_attn_mask, n_tokens: int):
+    capacity = xy_pos.shape[1] + n_tokens
+    xy_dec, kv_cache = model.t2s_transformer.process_prompt_static(xy_pos, xy_attn_mask, capacity, None)
+    for _ in range(n_tokens):
+        xy_dec = model.t2s_transformer.decode_next_token_static(xy_dec[:, -1:], kv_cache)
+
+
+def make_sentences(model: Text2SemanticDecoder, n: int, y_len: int, device: str):
+    x_lens = torch.randint(10, 80, (n,))
+    x = [torch.randint(0, model.phoneme_vocab_size, (int(l),), device=device) for l in x_lens]
+    bert = [torch.randn(1024, int(l), device=device) for l in x_lens]
+    prompts = torch.randint(0, model.EOS, (1, y_len), device=device).expand(n, -1)
+    return x, x_lens.to(device), prompts, bert
+
+
+def decode_batches(model: Text2SemanticDecoder, fn, sentences, batch_size: int, max_tokens: int):
+    x, x_lens, prompts, bert = sentences
+    n_tokens = 0
+    for i in range(0, len(x), batch_size):
+        batch_lens = x_lens[i : i + batch_size]
+        _, idx_list = fn(
+            x[i : i + batch_size],
+            batch_lens,
+            prompts[i : i + batch_size],
+            bert[i : i + batch_size],
+            top_k=15,
+            early_stop_num=max_tokens,
+            max_len=int(batch_lens.max()),
+        )
+        n_tokens += sum(idx_list)
+    return n_tokens
+
+
+def bench_batch(model: Text2SemanticDecoder, args):
+    max_tokens = args.tokens[0]
+    methods = {"serial": model.infer_panel_naive_batched, "batched": model.infer_panel_batch_infer}
+    print(f"{'batch':>6} {'method':>8} {'seconds':>8} {'tokens':>7} {'tokens/s':>9}")
+    with torch.no_grad():
+        for batch_size in args.batch_sizes:
+            sentences = make_sentences(model, batch_size * args.n_batches, args.y_len, args.device)
+            for name, fn in methods.items():
+                torch.manual_seed(0)
+                sync(args.device)
+                t0 = time.perf_counter()
+                n_tokens = decode_batches(model, fn, sentences, batch_size, max_tokens)
+                sync(args.device)
+                cost = time.perf_counter() - t0
+                print(f"{batch_size:>6} {name:>8} {cost:>8.2f} {n_tokens:>7} {n_tokens / cost:>9.1f}")
+
+
+def bench_loops(model: Text2SemanticDecoder, args):
+    x, x_lens, prompts, bert = make_sentences(model, 1, args.y_len, args.device)
+    x, bert = x[0].unsqueeze(0), bert[0].unsqueeze(0)
+    methods = {
+        "naive": lambda: next(model.infer_panel_naive(x, x_lens, prompts, bert, top_k=15, early_stop_num=max_tokens)),
+        "deferred": lambda: model.infer_panel_deferred(
+            x, x_lens, prompts, bert, top_k=15, early_stop_num=max_tokens, check_interval=args.check_interval
+        ),
+    }
+    print(f"{'tokens':>8} {'method':>10} {'tokens/s':>10} {'same':>6}")
+    with torch.no_grad():
+        for max_tokens in args.tokens:
+            outputs = {}
+            for name, fn in methods.items():
+                torch.manual_seed(0)
+                sync(args.device)
+                t0 = time.perf_counter()
+                y, idx = fn()
+                sync(args.device)
+                cost = time.perf_counter() - t0
+                outputs[name] = y
+                same = torch.equal(y, outputs["naive"])
+                print(f"{max_tokens:>8} {name:>10} {(idx + 1) / cost:>10.1f} {str(same):>6}")
+
+
+def sync(device: str):
+    if "cuda" in device:
+        torch.cuda.synchronize()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="T2S KV cache benchmark")
+    parser.add_argument("--tokens", type=int, nargs="+", default=[200, 500, 1000])
+    parser.add_argument("--x_len", type=int, default=60, help="phoneme length (prompt text + target text)")
+    parser.add_argument("--y_len", type=int, default=150, help="prompt semantic length")
+    parser.add_argument("--n_layer", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--batch_sizes", type=int, nargs="*", default=[], help="compare serial and batched decoding")
+    parser.add_argument("--n_batches", type=int, default=2, help="number of batches per batch size")
+    parser.add_argument("--compare_loops", action="store_true", help="compare per-step and deferred EOS checks")
+    parser.add_argument("--check_interval", type=int, default=16)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = build_model(args.n_layer, args.device)
+    if args.batch_sizes:
+        bench_batch(model, args)
+        return
+    if args.compare_loops:
+        bench_loops(model, args)
+        return
+    methods = {"torch.cat": decode_cat, "static": decode_static}
+
+    print(f"{'tokens':>8} {'method':>10} {'tokens/s':>10}")
+    with torch.no_grad():
+        xy_pos, xy_attn_mask = make_prompt(model, args.x_len, args.y_len, args.device)
+        for fn in methods.values():
+            fn(model, xy_pos, xy_attn_mask, 10)  # warmup
+        for n_tokens in args.tokens:
+            for name, fn in methods.items():
+                best = float("inf")
+                for _ in range(args.repeat):
+                    sync(args.device)
+                    t0 = time.perf_counter()
+                    fn(model, xy_pos, xy_attn_mask, n_tokens)
+                    sync(args.device)
+                    best = min(best, time.perf_counter() - t0)
+                print(f"{n_tokens:>8} {name:>10} {n_tokens / best:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+VITS 流式解码微基准 (CPU/GPU 均可, 不需要预训练权重)
+
+` python GPT_SoVITS/benchmark_vits_streaming.py --seconds 60 --chunk 25 --left_context 100 `
+
+模拟 TTS.run 流式模式下的逐 chunk 解码: 对比每个 chunk 都重新编码全部已生成 token (full prefix)
+与只重新编码有限左侧上下文 (bounded), 输出每个 chunk 的解码耗时随位置的变化,
+结果写入 csv, 安装了 matplotlib 时同时保存折线图。
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+now_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(now_dir)
+sys.path.append(os.path.dirname(now_dir))
+
+import torch
+
+from module.models import SynthesizerTrn
+
+
+def build_model(device: str) -> SynthesizerTrn:
+    with open(os.path.join(now_dir, "configs", "s2.json"), "r") as f:
+        hps = json.load(f)
+    kwargs = dict(hps["model"])
+    kwargs["version"] = "v2"
+    model = SynthesizerTrn(
+        hps["data"]["filter_length"] // 2 + 1,
+        hps["train"]["segment_size"] // hps["data"]["hop_length"],
+        n_speakers=hps["data"]["n_speakers"],
+        **kwargs,
+    )
+    return model.eval().to(device)
+
+
+def stream_decode(model, tokens, phones, refer, chunk: int, overlap: int, left_context: int, device: str):
+    times = []
+    previous_tokens = []
+    last_latent = None
+    for pos in range(0, tokens.shape[-1], chunk):
+        semantic_tokens = tokens[:, pos : pos + chunk]
+        previous_tokens.append(semantic_tokens)
+        _semantic_tokens = torch.cat(previous_tokens, dim=-1)
+        if left_context > 0:
+            _semantic_tokens = _semantic_tokens[..., -(max(left_context, overlap) + semantic_tokens.shape[-1]) :]
+            previous_tokens = [_semantic_tokens]
+        sync(device)
+        t0 = time.perf_counter()
+        audio, latent, _ = model.decode_streaming(
+            _semantic_tokens.unsqueeze(0),
+            phones,
+            [refer],
+            result_length=semantic_tokens.shape[-1] + overlap if last_latent is not None else None,
+            overlap_frames=last_latent[:, :, -overlap * 2 :] if last_latent is not None else None,
+        )
+        sync(device)
+        times.append((pos, time.perf_counter() - t0))
+        last_latent = latent
+    return times
+
+
+def sync(device: str):
+    if "cuda" in device:
+        torch.cuda.synchronize()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VITS streaming decode benchmark")
+    parser.add_argument("--seconds", type=float, default=60, help="utterance length, 25 semantic tokens per second")
+    parser.add_argument("--chunk", type=int, default=25, help="semantic tokens per chunk")
+    parser.add_argument("--overlap", type=int, default=2)
+    parser.add_argument("--left_context", type=int, default=100)
+    parser.add_argument("--phones", type=int, default=400)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--output", type=str, default="vits_streaming_benchmark")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = build_model(args.device)
+    n_tokens = int(args.seconds * 25)
+    tokens = torch.randint(0, 1024, (1, n_tokens), device=args.device)
+    phones = torch.randint(0, 300, (1, args.phones), device=args.device)
+    refer = torch.randn(1, 1025, 300, device=args.device)
+
+    results = {}
+    with torch.no_grad():
+        stream_decode(model, tokens[:, : args.chunk * 2], phones, refer, args.chunk, args.overlap, 0, args.device)
+        for name, left_context in [("full_prefix", 0), ("bounded", args.left_context)]:
+            results[name] = stream_decode(
+                model, tokens, phones, refer, args.chunk, args.overlap, left_context, args.device
+            )
+
+    with open(args.output + ".csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["position_sec"] + list(results.keys()))
+        for rows in zip(*results.values()):
+            writer.writerow([f"{rows[0][0] / 25:.2f}"] + [f"{t:.4f}" for _, t in rows])
+
+    print(f"{'method':>12} {'first':>8} {'last':>8} {'total':>8}  (seconds per chunk / total)")
+    for name, times in results.items():
+        ts = [t for _, t in times]
+        print(f"{name:>12} {ts[0]:>8.3f} {ts[-1]:>8.3f} {sum(ts):>8.2f}")
+
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print(f"matplotlib not installed, results saved to {args.output}.csv")
+        return
+    for name, times in results.items():
+        plt.plot([pos / 25 for pos, _ in times], [t for _, t in times], label=name)
+    plt.xlabel("position (s)")
+    plt.ylabel("chunk decode time (s)")
+    plt.legend()
+    plt.savefig(args.output + ".png")
+    print(f"results saved to {args.output}.csv / {args.output}.png")
+
+
+if __name__ == "__main__":
+    main()
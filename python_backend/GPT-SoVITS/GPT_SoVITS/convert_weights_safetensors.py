@@ -0,0 +1,35 @@
+"""
+把 GPT (.ckpt) / SoVITS (.pth) 权重转换成 safetensors (同目录同名 .safetensors)
+
+` python GPT_SoVITS/convert_weights_safetensors.py GPT_weights_v2/xxx.ckpt SoVITS_weights_v2/xxx.pth --dtype float32 `
+
+转换后的文件可以直接作为 t2s_weights_path / vits_weights_path 使用, 版本信息写在文件元数据里,
+加载时 mmap 映射, 不经过 pickle。--dtype 与推理精度一致时 (CPU 为 float32, 半精度 GPU 为 float16) 加载时不再需要类型转换。
+"""
+
+import argparse
+import os
+import sys
+
+now_dir = os.getcwd()
+sys.path.append(now_dir)
+sys.path.append(os.path.join(now_dir, "GPT_SoVITS"))
+
+import torch
+
+from process_ckpt import convert_to_safetensors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="convert GPT-SoVITS weights to safetensors")
+    parser.add_argument("paths", type=str, nargs="+")
+    parser.add_argument("--dtype", type=str, default="", choices=["", "float32", "float16"], help="default: keep")
+    args = parser.parse_args()
+
+    dtype = getattr(torch, args.dtype) if args.dtype else None
+    for path in args.paths:
+        print(f"{path} -> {convert_to_safetensors(path, dtype=dtype)}")
+
+
+if __name__ == "__main__":
+    main()
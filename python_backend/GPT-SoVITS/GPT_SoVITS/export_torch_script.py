@@ -3,7 +3,6 @@
 import argparse
 from io import BytesIO
 from typing import Optional
-from my_utils import load_audio
 import torch
 import torchaudio
 
@@ -16,8 +15,6 @@ from feature_extractor import cnhubert
 from AR.models.t2s_lightning_module import Text2SemanticLightningModule
 from module.models_onnx import SynthesizerTrn
 
-from inference_webui import get_phones_and_bert
-
 from sv import SV
 import kaldi as Kaldi
 
@@ -71,7 +68,7 @@ def logits_to_probs(
     previous_tokens: Optional[torch.Tensor] = None,
     temperature: float = 1.0,
     top_k: Optional[int] = None,
-    top_p: Optional[int] = None,
+    top_p: Optional[float] = None,
     repetition_penalty: float = 1.0,
 ):
     # if previous_tokens is not None:
@@ -116,7 +113,7 @@ def sample(
     previous_tokens,
     temperature: float = 1.0,
     top_k: Optional[int] = None,
-    top_p: Optional[int] = None,
+    top_p: Optional[float] = None,
     repetition_penalty: float = 1.35,
 ):
     probs = logits_to_probs(
@@ -448,6 +445,9 @@ class T2SModel(nn.Module):
         ref_bert: torch.Tensor,
         text_bert: torch.Tensor,
         top_k: LongTensor,
+        top_p: float = 1.0,
+        temperature: float = 1.0,
+        repetition_penalty: float = 1.35,
     ):
         bert = torch.cat([ref_bert.T, text_bert.T], 1)
         all_phoneme_ids = torch.cat([ref_seq, text_seq], 1)
@@ -504,7 +504,9 @@ class T2SModel(nn.Module):
 
         logits = self.ar_predict_layer(xy_dec[:, -1])
         logits = logits[:, :-1]
-        samples = sample(logits, y, top_k=top_k, top_p=1, repetition_penalty=1.35, temperature=1.0)[0]
+        samples = sample(
+            logits, y, top_k=top_k, top_p=top_p, repetition_penalty=repetition_penalty, temperature=temperature
+        )[0]
         y = torch.concat([y, samples], dim=1)
         y_emb = self.ar_audio_embedding(y[:, -1:])
         xy_pos = y_emb * self.ar_audio_position.x_scale + self.ar_audio_position.alpha * self.ar_audio_position.pe[
@@ -522,7 +524,9 @@ class T2SModel(nn.Module):
             if idx < 11:  ###至少预测出10个token不然不给停止（0.4s）
                 logits = logits[:, :-1]
 
-            samples = sample(logits, y, top_k=top_k, top_p=1, repetition_penalty=1.35, temperature=1.0)[0]
+            samples = sample(
+            logits, y, top_k=top_k, top_p=top_p, repetition_penalty=repetition_penalty, temperature=temperature
+        )[0]
 
             y = torch.concat([y, samples], dim=1)
 
@@ -634,6 +638,9 @@ def export_bert(output_path):
 
 
 def export(gpt_path, vits_path, ref_audio_path, ref_text, output_path, export_bert_and_ssl=False, device="cpu"):
+    from inference_webui import get_phones_and_bert
+    from my_utils import load_audio
+
     if not os.path.exists(output_path):
         os.makedirs(output_path)
         print(f"目录已创建: {output_path}")
@@ -717,6 +724,9 @@ def export_prov2(
     device="cpu",
     is_half=True,
 ):
+    from inference_webui import get_phones_and_bert
+    from my_utils import load_audio
+
     if sv_cn_model == None:
         init_sv_cn(device, is_half)
 
@@ -924,6 +934,9 @@ class GPT_SoVITS_V2Pro(nn.Module):
 
 
 def test():
+    from inference_webui import get_phones_and_bert
+    from my_utils import load_audio
+
     parser = argparse.ArgumentParser(description="GPT-SoVITS Command Line Tool")
     parser.add_argument("--gpt_model", required=True, help="Path to the GPT model file")
     parser.add_argument("--sovits_model", required=True, help="Path to the SoVITS model file")
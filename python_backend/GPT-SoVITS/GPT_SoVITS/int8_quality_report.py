@@ -0,0 +1,210 @@
+"""
+int8 动态量化与 float32 的质量对比 (CPU, 需要预训练权重和一段参考音频)
+
+` python GPT_SoVITS/int8_quality_report.py -c GPT_SoVITS/configs/tts_infer.yaml --ref_audio ref.wav --prompt_text "参考音频的文本" `
+
+同一配置分别以 int8=False 和 int8=True 构建 TTS, 对一组固定文本 (或 --texts_file 中每行一句) 输出:
+  - 梅尔倒谱距离 (MCD, dB): 相同随机种子合成的两段音频, 25 阶 MFCC 去掉 c0 后按 DTW 对齐计算;
+  - 语义 token 一致率: 以 float32 模型生成的 token 序列为输入做 teacher forcing, 两个模型每个位置 argmax 相同的比例;
+  - 两者的合成耗时, 以及构建模型前后进程常驻内存 (RSS) 的增量。
+任何一项超出 --max_mcd / --min_agreement 时以非零状态退出, 可作为量化改动的回归检查。
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+now_dir = os.getcwd()
+sys.path.append(now_dir)
+sys.path.append(os.path.join(now_dir, "GPT_SoVITS"))
+
+import librosa
+import numpy as np
+import psutil
+import torch
+import torch.nn.functional as F
+
+from TTS_infer_pack.TTS import TTS, TTS_Config
+
+TEXTS = [
+    ("先帝创业未半而中道崩殂，今天下三分，益州疲弊，此诚危急存亡之秋也。", "zh"),
+    ("今天天气不错，我们一起去公园散步吧。", "zh"),
+    ("The quick brown fox jumps over the lazy dog.", "en"),
+    ("Please remember to bring your umbrella, it might rain this afternoon.", "en"),
+    ("这个版本的推理速度比上一个版本快了一倍。", "zh"),
+]
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+def build_tts(args, int8: bool):
+    config = TTS_Config(args.tts_config)
+    config.device = torch.device("cpu")
+    config.is_half = False
+    config.int8 = int8
+    # 加载权重时会回写配置文件, 写到临时目录, 不改动用户的配置
+    config.configs_path = os.path.join(tempfile.mkdtemp(), "tts_infer.yaml")
+    rss0 = rss_mb()
+    tts = TTS(config)
+    return tts, rss_mb() - rss0
+
+
+def synthesize(tts: TTS, text: str, text_lang: str, args):
+    inputs = {
+        "text": text,
+        "text_lang": text_lang,
+        "ref_audio_path": args.ref_audio,
+        "prompt_text": args.prompt_text,
+        "prompt_lang": args.prompt_lang,
+        "text_split_method": "cut0",
+        "batch_size": 1,
+        "parallel_infer": False,
+        "split_bucket": False,
+        "seed": args.seed,
+    }
+    t0 = time.perf_counter()
+    sr, audio = tts.run(inputs).__next__()
+    return sr, audio.astype(np.float32) / 32768, time.perf_counter() - t0
+
+
+def t2s_inputs(tts: TTS, text: str, text_lang: str):
+    """
+    与 TTS.run 中相同的方式拼接参考文本和目标文本的音素与 BERT 特征, 需要先调用过 run 以填充 prompt_cache
+    """
+    phones, bert_features, _ = tts.text_preprocessor.segment_and_extract_feature_for_text(
+        text, text_lang, tts.configs.version
+    )
+    all_bert_features = tts.concat_bert_features(
+        tts.prompt_cache["phones"],
+        tts.prompt_cache["bert_features"],
+        phones,
+        bert_features,
+        torch.float32,
+        tts.configs.device,
+    )
+    x = torch.LongTensor(tts.prompt_cache["phones"] + phones).unsqueeze(0)
+    bert = None if all_bert_features is None else all_bert_features.unsqueeze(0)
+    prompt = tts.prompt_cache["prompt_semantic"].unsqueeze(0)
+    return x, bert, prompt
+
+
+@torch.no_grad()
+def teacher_forced_argmax(tts: TTS, x, bert, prompt, semantic):
+    """
+    参考音频 token 与生成的 token 拼接后一次前向, 返回生成部分每个位置预测的 argmax
+    """
+    model = tts.t2s_model.model
+    x = model.ar_text_position(model.embed_text(x, bert))
+    y = torch.concat([prompt, semantic], dim=1)
+    y_pos = model.ar_audio_position(model.ar_audio_embedding(y))
+    xy_pos = torch.concat([x, y_pos], dim=1)
+
+    x_len, y_len = x.shape[1], y.shape[1]
+    x_attn_mask = F.pad(torch.zeros((x_len, x_len), dtype=torch.bool), (0, y_len), value=True)
+    y_attn_mask = F.pad(torch.triu(torch.ones(y_len, y_len, dtype=torch.bool), diagonal=1), (x_len, 0), value=False)
+    xy_attn_mask = torch.concat([x_attn_mask, y_attn_mask], dim=0)[None, None].expand(1, model.num_head, -1, -1)
+
+    xy_dec, _, _ = model.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+    logits = model.ar_predict_layer(xy_dec[:, x_len + prompt.shape[1] - 1 : -1])
+    return logits.argmax(dim=-1)
+
+
+def token_agreement(tts_ref: TTS, tts_q: TTS, text: str, text_lang: str, args) -> float:
+    x, bert, prompt = t2s_inputs(tts_ref, text, text_lang)
+    torch.manual_seed(args.seed)
+    y, idx = tts_ref.t2s_model.model.infer_panel_deferred(
+        x,
+        None,
+        prompt,
+        bert,
+        top_k=args.top_k,
+        early_stop_num=tts_ref.configs.hz * tts_ref.configs.max_sec,
+    )
+    semantic = y[:, -idx:]
+    pred_ref = teacher_forced_argmax(tts_ref, x, bert, prompt, semantic)
+    x_q, bert_q, prompt_q = t2s_inputs(tts_q, text, text_lang)
+    pred_q = teacher_forced_argmax(tts_q, x_q, bert_q, prompt_q, semantic)
+    return (pred_ref == pred_q).float().mean().item()
+
+
+def mel_cepstral_distance(ref: np.ndarray, out: np.ndarray, sr: int) -> float:
+    """
+    librosa 的 MFCC 由 dB 刻度的对数梅尔谱做 DCT 得到, 已含 10/ln10 系数, MCD = mean(sqrt(2 * sum(diff^2)))
+    """
+    c_ref = librosa.feature.mfcc(y=ref, sr=sr, n_mfcc=25, n_mels=80)[1:]
+    c_out = librosa.feature.mfcc(y=out, sr=sr, n_mfcc=25, n_mels=80)[1:]
+    _, wp = librosa.sequence.dtw(X=c_ref, Y=c_out, metric="euclidean")
+    diff = c_ref[:, wp[:, 0]] - c_out[:, wp[:, 1]]
+    return float(np.mean(np.sqrt(2 * np.sum(diff**2, axis=0))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="int8 / float32 quality report")
+    parser.add_argument("-c", "--tts_config", type=str, default="GPT_SoVITS/configs/tts_infer.yaml")
+    parser.add_argument("--ref_audio", type=str, required=True)
+    parser.add_argument("--prompt_text", type=str, required=True)
+    parser.add_argument("--prompt_lang", type=str, default="zh")
+    parser.add_argument("--texts_file", type=str, default="", help="one 'lang|text' per line, overrides the built-in set")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--top_k", type=int, default=15)
+    parser.add_argument("--max_mcd", type=float, default=6.0)
+    parser.add_argument("--min_agreement", type=float, default=0.9)
+    parser.add_argument("--report", type=str, default="", help="write the report as json")
+    args = parser.parse_args()
+
+    texts = TEXTS
+    if args.texts_file:
+        with open(args.texts_file, "r", encoding="utf-8") as f:
+            texts = [line.strip().split("|", 1)[::-1] for line in f if line.strip()]
+
+    tts_ref, mem_ref = build_tts(args, int8=False)
+    tts_q, mem_q = build_tts(args, int8=True)
+
+    rows = []
+    for text, text_lang in texts:
+        synthesize(tts_ref, text, text_lang, args)  # warmup, 同时填充参考音频缓存
+        synthesize(tts_q, text, text_lang, args)
+        sr, ref, t_ref = synthesize(tts_ref, text, text_lang, args)
+        _, out, t_q = synthesize(tts_q, text, text_lang, args)
+        rows.append(
+            {
+                "text": text,
+                "mcd": mel_cepstral_distance(ref, out, sr),
+                "token_agreement": token_agreement(tts_ref, tts_q, text, text_lang, args),
+                "fp32_time": t_ref,
+                "int8_time": t_q,
+            }
+        )
+
+    print(f"{'MCD(dB)':>8} {'agree':>7} {'fp32(s)':>8} {'int8(s)':>8}  text")
+    for row in rows:
+        print(
+            f"{row['mcd']:8.2f} {row['token_agreement']:7.3f} {row['fp32_time']:8.2f} {row['int8_time']:8.2f}  {row['text']}"
+        )
+    mcd = float(np.mean([row["mcd"] for row in rows]))
+    agreement = float(np.mean([row["token_agreement"] for row in rows]))
+    print(f"mean MCD: {mcd:.2f} dB, mean token agreement: {agreement:.3f}")
+    print(f"model RSS: fp32 {mem_ref:.0f} MB, int8 {mem_q:.0f} MB")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(
+                {"rows": rows, "mcd": mcd, "token_agreement": agreement, "rss_mb": {"fp32": mem_ref, "int8": mem_q}},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+    if mcd > args.max_mcd or agreement < args.min_agreement:
+        print(f"FAILED: MCD must be <= {args.max_mcd} dB and token agreement >= {args.min_agreement}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
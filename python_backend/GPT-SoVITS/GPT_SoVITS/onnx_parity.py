@@ -0,0 +1,80 @@
+"""
+torch 与 onnxruntime 推理引擎的一致性检查 (需要预训练权重和一段参考音频)
+
+` python GPT_SoVITS/onnx_parity.py -c GPT_SoVITS/configs/tts_infer.yaml --ref_audio ref.wav --prompt_text "参考音频的文本" `
+
+同一配置分别以 engine=torch 和 engine=onnxruntime 构建 TTS, 用相同的随机种子合成同一段文本。
+比较两者的音频长度、最大绝对误差和信噪比, 并给出各自的合成耗时。
+采样在两个引擎中都由 torch 完成, 语义 token 一致时音频只差浮点误差, 长度不一致说明 T2S 的 logits 已经分叉。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+now_dir = os.getcwd()
+sys.path.append(now_dir)
+sys.path.append(os.path.join(now_dir, "GPT_SoVITS"))
+
+import numpy as np
+
+from TTS_infer_pack.TTS import TTS, TTS_Config
+
+
+def synthesize(engine: str, args) -> tuple:
+    config = TTS_Config(args.tts_config)
+    config.engine = engine
+    # 加载权重时会回写配置文件, 写到临时目录, 不改动用户的配置
+    config.configs_path = os.path.join(tempfile.mkdtemp(), "tts_infer.yaml")
+    tts = TTS(config)
+    inputs = {
+        "text": args.text,
+        "text_lang": args.text_lang,
+        "ref_audio_path": args.ref_audio,
+        "prompt_text": args.prompt_text,
+        "prompt_lang": args.prompt_lang,
+        "text_split_method": "cut5",
+        "batch_size": 1,
+        "parallel_infer": False,
+        "split_bucket": False,
+        "seed": args.seed,
+    }
+    tts.run(inputs).__next__()  # warmup, 同时填充参考音频缓存
+    t0 = time.perf_counter()
+    sr, audio = tts.run(inputs).__next__()
+    return sr, audio.astype(np.float32) / 32768, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="torch / onnxruntime parity check")
+    parser.add_argument("-c", "--tts_config", type=str, default="GPT_SoVITS/configs/tts_infer.yaml")
+    parser.add_argument("--ref_audio", type=str, required=True)
+    parser.add_argument("--prompt_text", type=str, required=True)
+    parser.add_argument("--prompt_lang", type=str, default="zh")
+    parser.add_argument("--text", type=str, default="先帝创业未半而中道崩殂，今天下三分，益州疲弊，此诚危急存亡之秋也。")
+    parser.add_argument("--text_lang", type=str, default="zh")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--min_snr_db", type=float, default=30.0)
+    args = parser.parse_args()
+
+    sr, ref, t_torch = synthesize("torch", args)
+    _, out, t_ort = synthesize("onnxruntime", args)
+
+    print(f"torch: {ref.shape[0] / sr:.2f}s audio in {t_torch:.2f}s")
+    print(f"onnxruntime: {out.shape[0] / sr:.2f}s audio in {t_ort:.2f}s")
+    if ref.shape != out.shape:
+        print(f"FAILED: length mismatch {ref.shape[0]} vs {out.shape[0]}")
+        sys.exit(1)
+    err = np.abs(ref - out)
+    snr = 10 * np.log10(np.sum(ref**2) / max(np.sum((ref - out) ** 2), 1e-12))
+    print(f"max abs error: {err.max():.5f}, SNR: {snr:.1f} dB")
+    if snr < args.min_snr_db:
+        print(f"FAILED: SNR below {args.min_snr_db} dB")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -98,6 +98,10 @@ def get_hash_from_file(sovits_path):
 
 
 def get_sovits_version_from_path_fast(sovits_path):
+    ###0-safetensors, by metadata
+    if is_safetensors(sovits_path):
+        meta = read_safetensors_metadata(sovits_path)
+        return [meta["version"], meta["model_version"], meta["if_lora"] == "1"]
     ###1-if it is pretrained sovits models, by hash
     hash = get_hash_from_file(sovits_path)
     if hash in hash_pretrained_dict:
@@ -127,6 +131,8 @@ def get_sovits_version_from_path_fast(sovits_path):
 
 
 def load_sovits_new(sovits_path):
+    if is_safetensors(sovits_path):
+        return load_safetensors_ckpt(sovits_path)
     f = open(sovits_path, "rb")
     meta = f.read(2)
     if meta != b"PK":
@@ -136,3 +142,79 @@ def load_sovits_new(sovits_path):
         bio.seek(0)
         return torch.load(bio, map_location="cpu", weights_only=False)
     return torch.load(sovits_path, map_location="cpu", weights_only=False)
+
+
+"""
+safetensors 格式的 GPT/SoVITS 权重:
+    张量为原权重文件中 "weight" 的内容, 其余字段存放在 __metadata__ 中 (值均为字符串):
+    format: "gpt-sovits", kind: "t2s"/"vits", config: json, info, lora_rank,
+    以及 SoVITS 的 version/model_version/if_lora (与 get_sovits_version_from_path_fast 的返回值相同)。
+    加载时由 safetensors 的 safe_open mmap 读取, 不经过 pickle。
+"""
+import json
+
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+
+def is_safetensors(path):
+    return str(path).endswith(".safetensors")
+
+
+def read_safetensors_metadata(path):
+    with safe_open(path, framework="pt", device="cpu") as f:
+        return f.metadata() or {}
+
+
+def _to_plain(obj):
+    ###HParams 等配置对象转成可以 json 序列化的 dict
+    if isinstance(obj, dict) or hasattr(obj, "items"):
+        return {k: _to_plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_plain(v) for v in obj]
+    return obj
+
+
+def load_safetensors_ckpt(path):
+    """
+    返回与 torch.load 原权重文件相同结构的 dict: weight/config/info (/lora_rank)。
+    safe_open 通过 mmap 读取张量, 不经过 pickle。
+    """
+    weight = OrderedDict()
+    with safe_open(path, framework="pt", device="cpu") as f:
+        meta = f.metadata() or {}
+        for name in f.keys():
+            weight[name] = f.get_tensor(name)
+    dict_s = {"weight": weight, "config": json.loads(meta["config"]), "info": meta.get("info", "")}
+    if meta.get("lora_rank", "") != "":
+        dict_s["lora_rank"] = int(meta["lora_rank"])
+    return dict_s
+
+
+def convert_to_safetensors(src_path, dst_path=None, kind=None, dtype=None):
+    """
+    把 GPT (.ckpt) 或 SoVITS (.pth) 权重转换成 safetensors, 返回输出路径。
+    kind: "t2s"/"vits", 不指定时按扩展名判断 (.ckpt 为 GPT);
+    dtype: 转换张量的精度 (如 torch.float32), 与推理精度一致时加载不再需要类型转换。
+    """
+    if kind is None:
+        kind = "t2s" if src_path.endswith(".ckpt") else "vits"
+    if dst_path is None:
+        dst_path = os.path.splitext(src_path)[0] + ".safetensors"
+    meta = {"format": "gpt-sovits", "kind": kind}
+    if kind == "t2s":
+        dict_s = torch.load(src_path, map_location="cpu", weights_only=False)
+    else:
+        version, model_version, if_lora = get_sovits_version_from_path_fast(src_path)
+        meta.update({"version": version, "model_version": model_version, "if_lora": "1" if if_lora else "0"})
+        dict_s = load_sovits_new(src_path)
+    meta["config"] = json.dumps(_to_plain(dict_s["config"]), ensure_ascii=False)
+    meta["info"] = str(dict_s.get("info", ""))
+    meta["lora_rank"] = str(dict_s.get("lora_rank", ""))
+    weight = {}
+    for key, value in dict_s["weight"].items():
+        if dtype is not None and value.is_floating_point():
+            value = value.to(dtype)
+        weight[key] = value.contiguous()
+    save_file(weight, dst_path, metadata=meta)
+    return dst_path
@@ -1,8 +1,11 @@
 from text import cleaned_text_to_sequence
+import atexit
 import os
+import sys
 
 from text import symbols as symbols_v1
 from text import symbols2 as symbols_v2
+from text.g2p_cache import G2PCache
 
 special = [
     # ("%", "zh", "SP"),
@@ -10,10 +13,60 @@ special = [
     ("^", "zh", "SP3"),
 ]
 
+# 句子级缓存: (text, language, version) -> (phones, word2ph, norm_text)
+# 设置环境变量 g2p_cache_dir 后, 启动时从磁盘加载, 退出时保存
+G2P_CACHE_DIR = os.environ.get("g2p_cache_dir", "")
+SENTENCE_CACHE_PATH = os.path.join(G2P_CACHE_DIR, "sentence_cache.pickle") if G2P_CACHE_DIR else ""
+sentence_cache = G2PCache(maxsize=int(os.environ.get("g2p_sentence_cache_size", 10000)))
+if SENTENCE_CACHE_PATH:
+    sentence_cache.load(SENTENCE_CACHE_PATH)
+
+_language_modules = {}
+
+
+def get_language_module(module_name):
+    language_module = _language_modules.get(module_name, None)
+    if language_module is None:
+        language_module = __import__("text." + module_name, fromlist=[module_name])
+        _language_modules[module_name] = language_module
+    return language_module
+
+
+def save_g2p_cache():
+    if not G2P_CACHE_DIR:
+        return
+    os.makedirs(G2P_CACHE_DIR, exist_ok=True)
+    sentence_cache.save(SENTENCE_CACHE_PATH)
+    english = sys.modules.get("text.english", None)
+    if english is not None:
+        english.save_word_cache()
+
+
+def get_g2p_cache_stats():
+    stats = {"sentence": sentence_cache.stats()}
+    english = sys.modules.get("text.english", None)
+    if english is not None:
+        stats["english_word"] = english._g2p.word_cache.stats()
+    return stats
+
+
+atexit.register(save_g2p_cache)
+
 
 def clean_text(text, language, version=None):
     if version is None:
         version = os.environ.get("version", "v2")
+    key = (text, language, version)
+    cached = sentence_cache.get(key)
+    if cached is None:
+        cached = _clean_text(text, language, version)
+        sentence_cache.put(key, cached)
+    phones, word2ph, norm_text = cached
+    # 返回副本, 避免调用方修改缓存中的列表
+    return list(phones), list(word2ph) if word2ph is not None else None, norm_text
+
+
+def _clean_text(text, language, version):
     if version == "v1":
         symbols = symbols_v1.symbols
         language_module_map = {"zh": "chinese", "ja": "japanese", "en": "english", "id": "english"}
@@ -29,7 +82,7 @@ def clean_text(text, language, version=None):
             return clean_special(text, language, special_s, target_symbol, version)
     
     # Perbaikan: Impor modul bahasa dengan benar
-    language_module = __import__("text." + language_module_map[language], fromlist=[language_module_map[language]])
+    language_module = get_language_module(language_module_map[language])
     
     if hasattr(language_module, "text_normalize"):
         norm_text = language_module.text_normalize(text)
@@ -64,7 +117,7 @@ def clean_special(text, language, special_s, target_symbol, version=None):
         language_module_map = {"zh": "chinese2", "ja": "japanese", "en": "english", "ko": "korean", "yue": "cantonese", "id": "english"}
 
     text = text.replace(special_s, ",")
-    language_module = __import__("text." + language_module_map[language], fromlist=[language_module_map[language]])
+    language_module = get_language_module(language_module_map[language])
     norm_text = language_module.text_normalize(text)
     phones = language_module.g2p(norm_text)
     new_ph = []
@@ -5,6 +5,7 @@ import wordsegment
 from g2p_en import G2p
 
 from text.symbols import punctuation
+from text.g2p_cache import G2PCache
 
 from text.symbols2 import symbols
 
@@ -259,6 +260,9 @@ class en_G2p(G2p):
         for word in ["AE", "AI", "AR", "IOS", "HUD", "OS"]:
             del self.cmu[word.lower()]
 
+        # 单词级缓存: 原始单词(区分大小写, 姓名字典要用) -> 音素
+        self.word_cache = G2PCache(maxsize=int(os.environ.get("g2p_word_cache_size", 50000)))
+
         # 修正多音字
         self.homograph2features["read"] = (["R", "IY1", "D"], ["R", "EH1", "D"], "VBP")
         self.homograph2features["complex"] = (
@@ -307,6 +311,13 @@ class en_G2p(G2p):
         return prons[:-1]
 
     def qryword(self, o_word):
+        phones = self.word_cache.get(o_word)
+        if phones is None:
+            phones = self._qryword(o_word)
+            self.word_cache.put(o_word, phones)
+        return list(phones)
+
+    def _qryword(self, o_word):
         word = o_word.lower()
 
         # 查字典, 单字母除外
@@ -359,6 +370,17 @@ class en_G2p(G2p):
 
 _g2p = en_G2p()
 
+G2P_CACHE_DIR = os.environ.get("g2p_cache_dir", "")
+WORD_CACHE_PATH = os.path.join(G2P_CACHE_DIR, "english_word_cache.pickle") if G2P_CACHE_DIR else ""
+if WORD_CACHE_PATH:
+    _g2p.word_cache.load(WORD_CACHE_PATH)
+
+
+def save_word_cache():
+    if WORD_CACHE_PATH:
+        os.makedirs(G2P_CACHE_DIR, exist_ok=True)
+        _g2p.word_cache.save(WORD_CACHE_PATH)
+
 
 def g2p(text):
     # g2p_en 整段推理，剔除不存在的arpa返回
@@ -7,6 +7,19 @@
     `-a` - `绑定地址, 默认"127.0.0.1"`
     `-p` - `绑定端口, 默认9880`
     `-c` - `TTS配置文件路径, 默认"GPT_SoVITS/configs/tts_infer.yaml"`
+    `--scheduler` - `启用多音色批量调度: 并发请求(可以是不同参考音频)的句子合并到同一次推理中, 默认关闭`
+    `--max_batch_size` - `调度器每次推理的最大句子数, 默认16`
+    `--batch_wait_ms` - `调度器凑batch的最长等待时间(毫秒), 默认20`
+    `--workers` - `pre-fork 工作进程数 (仅 CPU), 默认1`
+    `--threads_per_worker` - `每个工作进程的 torch 线程数, 默认 CPU 核数 / workers`
+
+    启用调度器后, streaming_mode 为 0/1 且带 prompt_text 的请求走调度器 (v3/v4 模型除外),
+    batch_size/split_bucket/parallel_infer/seed 参数对这些请求不生效。其余请求依旧由 TTS.run 串行处理。
+
+    workers > 1 时主进程加载一次模型并把权重移入共享内存, 再 fork 出多个工作进程监听同一端口,
+    每个工作进程只增加推理时的激活内存, 参考特征缓存与请求队列各自独立。
+    此模式下不支持切换 GPT/SoVITS 权重, 也不支持请求级的 gpt_weights_path / sovits_weights_path,
+    engine 只能为 torch 或 torchscript (onnxruntime 的会话不能跨 fork 使用)。
 
 ## 调用:
 
@@ -24,6 +37,7 @@ POST:
     "text": "",                   # str.(required) text to be synthesized
     "text_lang: "",               # str.(required) language of the text to be synthesized
     "ref_audio_path": "",         # str.(required) reference audio path
+    "ref_audio_base64": "",       # str.(optional) reference audio file content in base64, used instead of ref_audio_path (POST only). decoded in memory, never written to disk
     "aux_ref_audio_paths": [],    # list.(optional) auxiliary reference audio paths for multi-speaker tone fusion
     "prompt_text": "",            # str.(optional) prompt text for the reference audio
     "prompt_lang": "",            # str.(required) language of the prompt text for the reference audio
@@ -44,6 +58,10 @@ POST:
     "streaming_mode": False,      # bool or int. return audio chunk by chunk.T he available options are: 0,1,2,3 or True/False (0/False: Disabled | 1/True: Best Quality, Slowest response speed (old version streaming_mode) | 2: Medium Quality, Slow response speed | 3: Lower Quality, Faster response speed )
     "overlap_length": 2,          # int. overlap length of semantic tokens for streaming mode.
     "min_chunk_length": 16,       # int. The minimum chunk length of semantic tokens for streaming mode. (affects audio chunk size)
+    "streaming_left_context": 100, # int. number of previous semantic tokens re-encoded for each streaming chunk, <=0 means the whole prefix.
+    "gpt_weights_path": "",       # str.(optional) GPT weights for this request only, empty means the current weights.
+    "sovits_weights_path": "",    # str.(optional) SoVITS weights for this request only, empty means the current weights.
+    "media_type": "wav",          # str. wav, raw, ogg, aac or opus. In streaming mode ogg/aac/opus are sent as one continuous stream.
 }
 ```
 
@@ -51,6 +69,28 @@ RESP:
 成功: 直接返回 wav 音频流， http code 200
 失败: 返回包含错误信息的 json, http code 400
 
+### 增量文本推理 (WebSocket)
+
+endpoint: `/tts_stream`
+
+适用于 LLM 逐 token 输出的文本: 边接收文本边按 `text_split_method` 判断句子是否结束, 每个句子结束后立即开始推理,
+首包延迟只取决于第一句。参考音频与参考文本的特征只计算一次, 整个会话输出一条连续的音频流。
+每个句子单独占用推理管线, 等待文本时其他请求可以正常推理; 超过 60 秒没有收到新文本会自动结束。`cut0` 不切分, 会等到输入结束才开始推理。
+
+第一条消息 (json): 与 POST /tts 的参数相同, `text` 可省略, `streaming_mode` 默认为 1 (逐句返回), 也可为 2/3
+```json
+{"text_lang": "zh", "ref_audio_path": "archive_jingyuan_1.wav", "prompt_lang": "zh", "prompt_text": "...", "text_split_method": "cut5", "media_type": "wav"}
+```
+之后的消息 (json): 文本增量, 最后一条带 `"end": true`
+```json
+{"text": "先帝创业未半"}
+{"text": "而中道崩殂，", "end": true}
+```
+
+RESP:
+成功: 以二进制消息返回音频流 (格式同 /tts 的流式返回), 结束后服务端关闭连接, code 1000
+失败: 发送包含错误信息的 json 文本消息后关闭连接, 参数错误 code 1008, 推理失败 code 1011
+
 ### 命令控制
 
 endpoint: `/control`
@@ -99,6 +139,48 @@ RESP:
 成功: 返回"success", http code 200
 失败: 返回包含错误信息的 json, http code 400
 
+
+### 参考特征缓存统计
+
+endpoint: `/prompt_cache_stats`
+
+GET:
+```
+http://127.0.0.1:9880/prompt_cache_stats
+```
+
+RESP:
+返回缓存条目数、占用字节数、命中/磁盘命中/未命中/淘汰次数的 json, http code 200
+缓存大小与落盘目录由配置文件中的 `prompt_cache_max_mb` 与 `prompt_cache_dir` 控制
+
+### 常驻模型池统计
+
+endpoint: `/model_pool_stats`
+
+GET:
+```
+http://127.0.0.1:9880/model_pool_stats
+```
+
+RESP:
+返回池中的模型、正在使用的模型、占用字节数、命中/未命中/淘汰次数的 json, http code 200
+预算由配置文件中的 `model_pool_max_mb` 控制。/tts 请求可以用 `gpt_weights_path` / `sovits_weights_path` 指定本次使用的权重,
+池中已有的模型切换时无需重新加载, 请求结束后恢复为当前权重。权重可先用 `GPT_SoVITS/convert_weights_safetensors.py`
+转换为 .safetensors, 加载时 mmap 映射, 不经过 pickle。
+
+### G2P 缓存统计
+
+endpoint: `/g2p_cache_stats`
+
+GET:
+```
+http://127.0.0.1:9880/g2p_cache_stats
+```
+
+RESP:
+返回句子级与英文单词级 G2P 缓存的命中率 json, http code 200
+设置环境变量 `g2p_cache_dir` 后缓存会在退出时保存、启动时加载
+
 """
 
 import os
@@ -111,17 +193,28 @@ sys.path.append(now_dir)
 sys.path.append("%s/GPT_SoVITS" % (now_dir))
 
 import argparse
+import asyncio
+import base64
+import binascii
+import json
+import queue
 import subprocess
 import wave
 import signal
 import numpy as np
 import soundfile as sf
-from fastapi import FastAPI, Response
+import torch
+import anyio
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
 from io import BytesIO
 from tools.i18n.i18n import I18nAuto
 from GPT_SoVITS.TTS_infer_pack.TTS import TTS, TTS_Config
+from GPT_SoVITS.TTS_infer_pack.BatchScheduler import BatchScheduler
+from text.cleaner import get_g2p_cache_stats
+from GPT_SoVITS.TTS_infer_pack.text_segmentation_method import IncrementalSegmenter
 from GPT_SoVITS.TTS_infer_pack.text_segmentation_method import get_method_names as get_cut_method_names
 from pydantic import BaseModel
 import threading
@@ -134,6 +227,11 @@ parser = argparse.ArgumentParser(description="GPT-SoVITS api")
 parser.add_argument("-c", "--tts_config", type=str, default="GPT_SoVITS/configs/tts_infer.yaml", help="tts_infer路径")
 parser.add_argument("-a", "--bind_addr", type=str, default="127.0.0.1", help="default: 127.0.0.1")
 parser.add_argument("-p", "--port", type=int, default="9880", help="default: 9880")
+parser.add_argument("--scheduler", action="store_true", help="启用多音色批量调度")
+parser.add_argument("--max_batch_size", type=int, default=16, help="default: 16")
+parser.add_argument("--batch_wait_ms", type=float, default=20, help="default: 20")
+parser.add_argument("--workers", type=int, default=1, help="pre-fork 工作进程数 (仅 CPU), default: 1")
+parser.add_argument("--threads_per_worker", type=int, default=0, help="default: cpu_count // workers")
 args = parser.parse_args()
 config_path = args.tts_config
 # device = args.device
@@ -144,9 +242,26 @@ argv = sys.argv
 if config_path in [None, ""]:
     config_path = "GPT-SoVITS/configs/tts_infer.yaml"
 
+if args.workers > 1:
+    # tokenizers 的线程池在 fork 之后不可用
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
 tts_config = TTS_Config(config_path)
 print(tts_config)
+if args.workers > 1 and tts_config.engine not in ["torch", "torchscript"]:
+    # onnxruntime 的 InferenceSession 在主进程中创建, 其线程池在 fork 之后不可用, 也不受 --threads_per_worker 限制
+    parser.error(f"--workers > 1 only supports the torch and torchscript engines, got engine: {tts_config.engine}")
 tts_pipeline = TTS(tts_config)
+master_pid = os.getpid()
+if args.workers > 1:
+    tts_pipeline.share_memory()
+# tts_pipeline.prompt_cache 只有一份, 直接调用 tts_pipeline.run 的请求与调度器共用这把锁
+tts_lock = threading.Lock()
+scheduler = (
+    BatchScheduler(tts_pipeline, max_batch_size=args.max_batch_size, max_wait_ms=args.batch_wait_ms, lock=tts_lock)
+    if args.scheduler
+    else None
+)
 
 APP = FastAPI()
 
@@ -155,6 +270,7 @@ class TTS_Request(BaseModel):
     text: str = None
     text_lang: str = None
     ref_audio_path: str = None
+    ref_audio_base64: str = None
     aux_ref_audio_paths: list = None
     prompt_lang: str = None
     prompt_text: str = ""
@@ -176,6 +292,9 @@ class TTS_Request(BaseModel):
     super_sampling: bool = False
     overlap_length: int = 2
     min_chunk_length: int = 16
+    streaming_left_context: int = 100
+    gpt_weights_path: str = ""
+    sovits_weights_path: str = ""
 
 
 def pack_ogg(io_buffer: BytesIO, data: np.ndarray, rate: int):
@@ -265,11 +384,20 @@ def pack_aac(io_buffer: BytesIO, data: np.ndarray, rate: int):
     return io_buffer
 
 
+def pack_opus(io_buffer: BytesIO, data: np.ndarray, rate: int):
+    encoder = FFmpegStreamEncoder(rate, OPUS_OUTPUT_ARGS)
+    io_buffer.write(encoder.write(data, wait=0))
+    io_buffer.write(encoder.close())
+    return io_buffer
+
+
 def pack_audio(io_buffer: BytesIO, data: np.ndarray, rate: int, media_type: str):
     if media_type == "ogg":
         io_buffer = pack_ogg(io_buffer, data, rate)
     elif media_type == "aac":
         io_buffer = pack_aac(io_buffer, data, rate)
+    elif media_type == "opus":
+        io_buffer = pack_opus(io_buffer, data, rate)
     elif media_type == "wav":
         io_buffer = pack_wav(io_buffer, data, rate)
     else:
@@ -278,6 +406,197 @@ def pack_audio(io_buffer: BytesIO, data: np.ndarray, rate: int, media_type: str)
     return io_buffer
 
 
+AAC_OUTPUT_ARGS = ["-c:a", "aac", "-b:a", "192k", "-vn", "-f", "adts"]
+# Opus 只支持 8k/12k/16k/24k/48k 采样率, ffmpeg 会自动重采样; 每 100ms 输出一个 ogg page
+OPUS_OUTPUT_ARGS = ["-c:a", "libopus", "-b:a", "32k", "-vn", "-f", "opus", "-page_duration", "100000"]
+
+
+class FFmpegStreamEncoder:
+    """
+    一个音频流对应一个常驻的 ffmpeg 进程: PCM 逐块写入 stdin, 后台线程持续读取 stdout,
+    输出为一条连续的码流, 不再每个 chunk 启动一次 ffmpeg。
+    """
+
+    def __init__(self, rate: int, output_args: list):
+        self.process = subprocess.Popen(
+            [
+                "ffmpeg",
+                "-loglevel",
+                "error",
+                "-f",
+                "s16le",  # 输入16位有符号小端整数PCM
+                "-ar",
+                str(rate),
+                "-ac",
+                "1",
+                "-i",
+                "pipe:0",
+                *output_args,
+                "-flush_packets",
+                "1",  # 编码出的数据立即写入管道
+                "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.queue = queue.Queue()
+        self.eof = False
+        self.reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self.reader.start()
+
+    def _read_stdout(self):
+        while True:
+            data = self.process.stdout.read1(65536)
+            if not data:
+                break
+            self.queue.put(data)
+        self.queue.put(None)
+
+    def _drain(self, wait: float) -> bytes:
+        """
+        取出目前已编码的数据; wait > 0 时最多等待 wait 秒, 直到第一块数据到达
+        """
+        chunks = []
+        while not self.eof:
+            try:
+                data = self.queue.get(timeout=wait) if wait > 0 and len(chunks) == 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if data is None:
+                self.eof = True
+                break
+            chunks.append(data)
+        return b"".join(chunks)
+
+    def write(self, data: np.ndarray, wait: float = 0.05) -> bytes:
+        try:
+            self.process.stdin.write(data.tobytes())
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited with code {self.process.poll()}")
+        return self._drain(wait)
+
+    def close(self) -> bytes:
+        """
+        结束输入, 返回编码器中剩余的数据
+        """
+        self.process.stdin.close()
+        chunks = []
+        while not self.eof:
+            chunks.append(self._drain(wait=1.0))
+        self.process.wait()
+        return b"".join(chunks)
+
+    def abort(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+class _StreamSink:
+    """
+    只追加写入的文件对象, 供 libsndfile 的 virtual io 使用, drain() 取出新写入的数据
+    """
+
+    def __init__(self):
+        self.position = 0
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def read(self, size=-1):
+        return b""
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        target = offset if whence == 0 else self.position + offset
+        if target != self.position:
+            raise OSError("stream sink is not seekable")
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class SoundFileStreamEncoder:
+    """
+    libsndfile 增量编码 ogg/vorbis, 不启动进程。
+    每次最多写入 32768 帧, 避免 pack_ogg 中提到的 libsndfile 大块写入时的栈溢出。
+    """
+
+    block_frames = 32768
+
+    def __init__(self, rate: int, format: str = "OGG", subtype: str = "VORBIS"):
+        self.sink = _StreamSink()
+        self.file = sf.SoundFile(self.sink, mode="w", samplerate=rate, channels=1, format=format, subtype=subtype)
+
+    def write(self, data: np.ndarray, wait: float = 0) -> bytes:
+        for start in range(0, len(data), self.block_frames):
+            self.file.write(data[start : start + self.block_frames])
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self.file.close()
+        return self.sink.drain()
+
+    def abort(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def open_stream_encoder(media_type: str, rate: int):
+    if media_type == "ogg":
+        return SoundFileStreamEncoder(rate)
+    elif media_type == "aac":
+        return FFmpegStreamEncoder(rate, AAC_OUTPUT_ARGS)
+    elif media_type == "opus":
+        return FFmpegStreamEncoder(rate, OPUS_OUTPUT_ARGS)
+    raise ValueError(f"media_type: {media_type} is not supported")
+
+
+class AudioStreamPacker:
+    """
+    流式响应的打包: wav 只在第一个 chunk 前写入头, raw 原样输出,
+    ogg/aac/opus 整个响应共用一个编码器会话。
+    """
+
+    def __init__(self, media_type: str):
+        self.media_type = media_type
+        self.encoder = None
+        self.first_chunk = True
+
+    def pack(self, chunk: np.ndarray, sr: int) -> bytes:
+        first_chunk, self.first_chunk = self.first_chunk, False
+        if self.media_type == "wav":
+            header = wave_header_chunk(sample_rate=sr) if first_chunk else b""
+            return header + chunk.tobytes()
+        if self.media_type == "raw":
+            return chunk.tobytes()
+        if self.encoder is None:
+            self.encoder = open_stream_encoder(self.media_type, sr)
+        return self.encoder.write(chunk)
+
+    def finish(self) -> bytes:
+        if self.encoder is None:
+            return b""
+        encoder, self.encoder = self.encoder, None
+        return encoder.close()
+
+    def close(self):
+        # 响应中途结束时终止编码器
+        if self.encoder is not None:
+            self.encoder.abort()
+            self.encoder = None
+
+
 # from https://huggingface.co/spaces/coqui/voice-chat-with-mistral/blob/main/app.py
 def wave_header_chunk(frame_input=b"", channels=1, sample_width=2, sample_rate=32000):
     # This will create a wave header then append the frame input
@@ -294,7 +613,64 @@ def wave_header_chunk(frame_input=b"", channels=1, sample_width=2, sample_rate=3
     return wav_buf.read()
 
 
+def close_generator(generator: Generator):
+    try:
+        generator.close()
+    except ValueError:
+        # 生成器正在线程池中执行, 它会在下一次检查 cancel_event 时自行结束并释放 tts_lock
+        pass
+
+
+class CancellableStreamingResponse(StreamingResponse):
+    """
+    客户端断开或发送失败时置位该请求的 cancel_event 并关闭推理生成器,
+    T2S/VITS 在下一个解码步或 chunk 处停止, 不影响其他请求。
+    """
+
+    def __init__(self, content, cancel_event: threading.Event, generator: Generator = None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.cancel_event = cancel_event
+        self.generator = generator
+
+    async def cancel(self):
+        self.cancel_event.set()
+        if self.generator is not None:
+            await run_in_threadpool(close_generator, self.generator)
+
+    async def listen_for_disconnect(self, receive):
+        # 正常返回说明收到了 http.disconnect
+        await super().listen_for_disconnect(receive)
+        await self.cancel()
+
+    async def stream_response(self, send):
+        try:
+            await super().stream_response(send)
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await self.cancel()
+            raise
+
+
+async def run_until_disconnected(request: Request, cancel_event: threading.Event, func, *args):
+    """
+    在线程池中执行 func, 期间每 0.5s 检查一次客户端是否已断开, 断开时置位 cancel_event
+    """
+    task = asyncio.ensure_future(run_in_threadpool(func, *args))
+    while not task.done():
+        await asyncio.wait([task], timeout=0.5)
+        if not task.done() and request is not None and await request.is_disconnected():
+            cancel_event.set()
+    return task.result()
+
+
 def handle_control(command: str):
+    if args.workers > 1:
+        # 由主进程重启或结束所有工作进程
+        if command == "restart":
+            os.kill(master_pid, signal.SIGHUP)
+        elif command == "exit":
+            os.kill(master_pid, signal.SIGTERM)
+        return
     if command == "restart":
         os.execl(sys.executable, sys.executable, *argv)
     elif command == "exit":
@@ -302,7 +678,16 @@ def handle_control(command: str):
         exit(0)
 
 
-def check_params(req: dict):
+# streaming_mode -> (streaming_mode, return_fragment, fixed_length_chunk)
+STREAMING_MODES = {
+    0: (False, False, False),
+    1: (False, True, False),
+    2: (True, False, False),
+    3: (True, False, True),
+}
+
+
+def check_params(req: dict, require_text: bool = True):
     text: str = req.get("text", "")
     text_lang: str = req.get("text_lang", "")
     ref_audio_path: str = req.get("ref_audio_path", "")
@@ -311,9 +696,9 @@ def check_params(req: dict):
     prompt_lang: str = req.get("prompt_lang", "")
     text_split_method: str = req.get("text_split_method", "cut5")
 
-    if ref_audio_path in [None, ""]:
+    if ref_audio_path in [None, ""] and not req.get("ref_audio_bytes", None):
         return JSONResponse(status_code=400, content={"message": "ref_audio_path is required"})
-    if text in [None, ""]:
+    if require_text and text in [None, ""]:
         return JSONResponse(status_code=400, content={"message": "text is required"})
     if text_lang in [None, ""]:
         return JSONResponse(status_code=400, content={"message": "text_lang is required"})
@@ -329,7 +714,7 @@ def check_params(req: dict):
             status_code=400,
             content={"message": f"prompt_lang: {prompt_lang} is not supported in version {tts_config.version}"},
         )
-    if media_type not in ["wav", "raw", "ogg", "aac"]:
+    if media_type not in ["wav", "raw", "ogg", "aac", "opus"]:
         return JSONResponse(status_code=400, content={"message": f"media_type: {media_type} is not supported"})
     # elif media_type == "ogg" and not streaming_mode:
     #     return JSONResponse(status_code=400, content={"message": "ogg format is not supported in non-streaming mode"})
@@ -342,9 +727,30 @@ def check_params(req: dict):
     return None
 
 
-async def tts_handle(req: dict):
+def get_request_weights(req: dict):
+    weights = (req.get("gpt_weights_path", None) or "", req.get("sovits_weights_path", None) or "")
+    return None if weights == ("", "") else weights
+
+
+def check_weights(weights: tuple):
+    if weights is None:
+        return None
+    if args.workers > 1:
+        # 工作进程共享主进程的权重, 在某个工作进程中加载其他权重会各自占用一份内存
+        return JSONResponse(
+            status_code=400,
+            content={"message": "gpt_weights_path/sovits_weights_path are not supported with --workers > 1"},
+        )
+    for path in weights:
+        if path != "" and not os.path.exists(path):
+            return JSONResponse(status_code=400, content={"message": f"weights {path} not exists"})
+    return None
+
+
+async def tts_handle(req: dict, request: Request = None):
     """
     Text to speech handler.
+    The synthesis is cancelled when the client of `request` disconnects.
 
     Args:
         req (dict):
@@ -352,6 +758,7 @@ async def tts_handle(req: dict):
                 "text": "",                   # str.(required) text to be synthesized
                 "text_lang: "",               # str.(required) language of the text to be synthesized
                 "ref_audio_path": "",         # str.(required) reference audio path
+                "ref_audio_base64": "",       # str.(optional) reference audio file content in base64, used instead of ref_audio_path
                 "aux_ref_audio_paths": [],    # list.(optional) auxiliary reference audio paths for multi-speaker tone fusion
                 "prompt_text": "",            # str.(optional) prompt text for the reference audio
                 "prompt_lang": "",            # str.(required) language of the prompt text for the reference audio
@@ -372,7 +779,12 @@ async def tts_handle(req: dict):
                 "streaming_mode": False,      # bool or int. return audio chunk by chunk.T he available options are: 0,1,2,3 or True/False (0/False: Disabled | 1/True: Best Quality, Slowest response speed (old version streaming_mode) | 2: Medium Quality, Slow response speed | 3: Lower Quality, Faster response speed )
                 "overlap_length": 2,          # int. overlap length of semantic tokens for streaming mode.
                 "min_chunk_length": 16,       # int. The minimum chunk length of semantic tokens for streaming mode. (affects audio chunk size)
+                "streaming_left_context": 100, # int. number of previous semantic tokens re-encoded for each streaming chunk, <=0 means the whole prefix.
+                "gpt_weights_path": "",       # str.(optional) GPT weights for this request only, empty means the current weights.
+                "sovits_weights_path": "",    # str.(optional) SoVITS weights for this request only, empty means the current weights.
+                "media_type": "wav",          # str. wav, raw, ogg, aac or opus.
             }
+        request (Request): the http request, used to detect client disconnects.
     returns:
         StreamingResponse: audio stream response.
     """
@@ -381,29 +793,20 @@ async def tts_handle(req: dict):
     return_fragment = req.get("return_fragment", False)
     media_type = req.get("media_type", "wav")
 
+    ref_audio_base64 = req.pop("ref_audio_base64", None)
+    if ref_audio_base64:
+        try:
+            req["ref_audio_bytes"] = base64.b64decode(ref_audio_base64, validate=True)
+        except binascii.Error:
+            return JSONResponse(status_code=400, content={"message": "ref_audio_base64 is not valid base64"})
+
     check_res = check_params(req)
     if check_res is not None:
         return check_res
     
-    if streaming_mode == 0:
-        streaming_mode = False
-        return_fragment = False
-        fixed_length_chunk = False
-    elif streaming_mode == 1:
-        streaming_mode = False
-        return_fragment = True
-        fixed_length_chunk = False
-    elif streaming_mode == 2:
-        streaming_mode = True
-        return_fragment = False
-        fixed_length_chunk = False
-    elif streaming_mode == 3:
-        streaming_mode = True
-        return_fragment = False
-        fixed_length_chunk = True
-
-    else:
+    if streaming_mode not in STREAMING_MODES:
         return JSONResponse(status_code=400, content={"message": f"the value of streaming_mode must be 0, 1, 2, 3(int) or true/false(bool)"})
+    streaming_mode, return_fragment, fixed_length_chunk = STREAMING_MODES[streaming_mode]
 
     req["streaming_mode"] = streaming_mode
     req["return_fragment"] = return_fragment
@@ -413,38 +816,120 @@ async def tts_handle(req: dict):
 
     streaming_mode = streaming_mode or return_fragment
 
+    # 指定了权重的请求在锁内临时切换模型 (常驻模型池命中时无需重新加载), 不走调度器
+    weights = get_request_weights(req)
+    check_res = check_weights(weights)
+    if check_res is not None:
+        return check_res
 
+    if (
+        scheduler is not None
+        and weights is None
+        and not req["streaming_mode"]
+        and req.get("prompt_text", "") not in [None, ""]
+        and not tts_config.use_vocoder
+    ):
+        return await scheduler_handle(req, streaming_mode, media_type)
+
+    cancel_event = threading.Event()
+    req["cancel_event"] = cancel_event
     try:
-        tts_generator = tts_pipeline.run(req)
+        tts_generator = locked_generator(tts_pipeline.run(req), weights)
 
         if streaming_mode:
 
             def streaming_generator(tts_generator: Generator, media_type: str):
-                if_frist_chunk = True
-                for sr, chunk in tts_generator:
-                    if if_frist_chunk and media_type == "wav":
-                        yield wave_header_chunk(sample_rate=sr)
-                        media_type = "raw"
-                        if_frist_chunk = False
-                    yield pack_audio(BytesIO(), chunk, sr, media_type).getvalue()
+                packer = AudioStreamPacker(media_type)
+                try:
+                    for sr, chunk in tts_generator:
+                        data = packer.pack(chunk, sr)
+                        if data:
+                            yield data
+                    data = packer.finish()
+                    if data:
+                        yield data
+                finally:
+                    packer.close()
+                    tts_generator.close()
 
             # _media_type = f"audio/{media_type}" if not (streaming_mode and media_type in ["wav", "raw"]) else f"audio/x-{media_type}"
-            return StreamingResponse(
-                streaming_generator(
-                    tts_generator,
-                    media_type,
-                ),
+            stream = streaming_generator(
+                tts_generator,
+                media_type,
+            )
+            return CancellableStreamingResponse(
+                stream,
+                cancel_event=cancel_event,
+                generator=stream,
                 media_type=f"audio/{media_type}",
             )
 
         else:
-            sr, audio_data = next(tts_generator)
+            sr, audio_data = await run_until_disconnected(request, cancel_event, next, tts_generator)
+            # run 结束时总会置位 cancel_event, 需要在关闭生成器之前判断客户端是否已断开
+            disconnected = cancel_event.is_set()
+            # 关闭时会在锁内收尾 (停止流水线, 恢复临时切换的权重), 不能在事件循环中执行
+            await run_in_threadpool(close_generator, tts_generator)
+            if disconnected:
+                # 客户端已断开, 不再编码音频
+                return Response(status_code=499)
             audio_data = pack_audio(BytesIO(), audio_data, sr, media_type).getvalue()
             return Response(audio_data, media_type=f"audio/{media_type}")
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "tts failed", "Exception": str(e)})
 
 
+def locked_generator(tts_generator: Generator, weights: tuple = None):
+    """
+    持锁执行 tts_generator, 指定 weights 时临时切换权重, 结束后恢复。
+    恢复在生成器结束或 close 时执行, 调用方需在线程池中迭代与关闭 (close_generator), 不能在事件循环中执行。
+    """
+    with tts_lock:
+        if weights is None:
+            yield from tts_generator
+            return
+        previous = (tts_config.t2s_weights_path, tts_config.vits_weights_path)
+        try:
+            # 切换到一半失败 (如 GPT 权重损坏) 时也要恢复已经切换的 SoVITS 权重
+            tts_pipeline.use_weights(*weights)
+            yield from tts_generator
+        finally:
+            tts_pipeline.use_weights(*previous)
+
+
+async def scheduler_handle(req: dict, streaming_mode: bool, media_type: str):
+    try:
+        jobs = await scheduler.submit(req)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"message": "tts failed", "Exception": str(e)})
+
+    if streaming_mode:
+
+        async def streaming_generator(media_type: str):
+            packer = AudioStreamPacker(media_type)
+            try:
+                async for sr, chunk in scheduler.stream(jobs):
+                    data = await run_in_threadpool(packer.pack, chunk, sr)
+                    if data:
+                        yield data
+                data = await run_in_threadpool(packer.finish)
+                if data:
+                    yield data
+            finally:
+                packer.close()
+
+        return StreamingResponse(streaming_generator(media_type), media_type=f"audio/{media_type}")
+
+    try:
+        chunks = [item async for item in scheduler.stream(jobs)]
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"message": "tts failed", "Exception": str(e)})
+    sr = chunks[0][0]
+    audio_data = np.concatenate([chunk for _, chunk in chunks])
+    audio_data = pack_audio(BytesIO(), audio_data, sr, media_type).getvalue()
+    return Response(audio_data, media_type=f"audio/{media_type}")
+
+
 @APP.get("/control")
 async def control(command: str = None):
     if command is None:
@@ -454,6 +939,7 @@ async def control(command: str = None):
 
 @APP.get("/tts")
 async def tts_get_endpoint(
+    http_request: Request,
     text: str = None,
     text_lang: str = None,
     ref_audio_path: str = None,
@@ -478,6 +964,9 @@ async def tts_get_endpoint(
     streaming_mode: Union[bool, int] = False,
     overlap_length: int = 2,
     min_chunk_length: int = 16,
+    streaming_left_context: int = 100,
+    gpt_weights_path: str = "",
+    sovits_weights_path: str = "",
 ):
     req = {
         "text": text,
@@ -504,20 +993,177 @@ async def tts_get_endpoint(
         "super_sampling": super_sampling,
         "overlap_length": int(overlap_length),
         "min_chunk_length": int(min_chunk_length),
+        "streaming_left_context": int(streaming_left_context),
+        "gpt_weights_path": gpt_weights_path,
+        "sovits_weights_path": sovits_weights_path,
     }
-    return await tts_handle(req)
+    return await tts_handle(req, http_request)
 
 
 @APP.post("/tts")
-async def tts_post_endpoint(request: TTS_Request):
+async def tts_post_endpoint(request: TTS_Request, http_request: Request):
     req = request.dict()
-    return await tts_handle(req)
+    return await tts_handle(req, http_request)
+
+
+# 增量输入时超过该时间 (秒) 没有收到新文本则结束会话, 避免空闲的会话一直占用推理管线
+TEXT_STREAM_IDLE_TIMEOUT = 60
+
+
+async def close_websocket(websocket: WebSocket, content: dict, code: int):
+    try:
+        await websocket.send_json(content)
+        await websocket.close(code=code)
+    except Exception:
+        pass
+
+
+@APP.websocket("/tts_stream")
+async def tts_stream_endpoint(websocket: WebSocket):
+    """
+    Text to speech with incremental text input.
+    The first message carries the /tts params, following messages carry text deltas,
+    every sentence is synthesized as soon as it is closed.
+    """
+    await websocket.accept()
+    try:
+        message = await websocket.receive_json()
+        req = TTS_Request(**message).dict()
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        await close_websocket(websocket, {"message": "invalid params", "Exception": str(e)}, 1008)
+        return
+
+    if "streaming_mode" not in message:
+        req["streaming_mode"] = 1
+    media_type = req["media_type"]
+
+    ref_audio_base64 = req.pop("ref_audio_base64", None)
+    if ref_audio_base64:
+        try:
+            req["ref_audio_bytes"] = base64.b64decode(ref_audio_base64, validate=True)
+        except binascii.Error:
+            await close_websocket(websocket, {"message": "ref_audio_base64 is not valid base64"}, 1008)
+            return
+
+    check_res = check_params(req, require_text=False)
+    if check_res is not None:
+        await close_websocket(websocket, json.loads(check_res.body), 1008)
+        return
+    if req["streaming_mode"] not in STREAMING_MODES:
+        await close_websocket(
+            websocket, {"message": "the value of streaming_mode must be 0, 1, 2, 3(int) or true/false(bool)"}, 1008
+        )
+        return
+    # 文本逐句到达, 0 与 1 相同, 均为逐句分段返回
+    req["streaming_mode"], req["return_fragment"], req["fixed_length_chunk"] = STREAMING_MODES[req["streaming_mode"]]
+
+    weights = get_request_weights(req)
+    check_res = check_weights(weights)
+    if check_res is not None:
+        await close_websocket(websocket, json.loads(check_res.body), 1008)
+        return
+
+    # 每收到一个完整的句子就单独持锁推理一次; 等待文本时不占用推理管线, 其他请求可以在句与句之间执行。
+    # 参考音频与参考文本的特征由 TTS 缓存, 第一句之后不再重复计算
+    segmenter = IncrementalSegmenter(req["text_split_method"])
+    texts = asyncio.Queue()
+    for text in segmenter.feed(req.pop("text", None) or ""):
+        texts.put_nowait(text)
+    # 第一个是会话的取消事件; 每句的推理使用各自的 cancel_event (run 结束时会将其置位), 会话取消时一并置位
+    cancel_events = [threading.Event()]
+    packer = AudioStreamPacker(media_type)
+
+    def cancel():
+        for event in cancel_events:
+            event.set()
+
+    async def receive_text():
+        try:
+            while True:
+                message = await websocket.receive_json()
+                if not isinstance(message, dict):
+                    raise ValueError("text message must be a json object")
+                for text in segmenter.feed(message.get("text", None) or ""):
+                    texts.put_nowait(text)
+                if message.get("end", False):
+                    break
+            for text in segmenter.flush():
+                texts.put_nowait(text)
+            texts.put_nowait(None)
+            # 输入结束后继续监听, 客户端断开时取消推理
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+            cancel()
+        except WebSocketDisconnect:
+            cancel()
+            texts.put_nowait(None)
+        except Exception as e:
+            cancel()
+            texts.put_nowait(None)
+            return str(e)
+        return None
+
+    def next_packet(tts_generator: Generator):
+        for sr, chunk in tts_generator:
+            data = packer.pack(chunk, sr)
+            if data:
+                return data
+        return None
+
+    async def synthesize(text: str):
+        cancel_event = threading.Event()
+        cancel_events.append(cancel_event)
+        tts_generator = locked_generator(tts_pipeline.run({**req, "text": text, "cancel_event": cancel_event}), weights)
+        try:
+            while True:
+                data = await run_in_threadpool(next_packet, tts_generator)
+                if data is None:
+                    break
+                await websocket.send_bytes(data)
+        finally:
+            cancel_event.set()
+            await run_in_threadpool(close_generator, tts_generator)
+            cancel_events.remove(cancel_event)
+
+    receiver = asyncio.ensure_future(receive_text())
+    try:
+        while not cancel_events[0].is_set():
+            try:
+                text = await asyncio.wait_for(texts.get(), timeout=TEXT_STREAM_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                print("text stream idle timeout")
+                break
+            if text is None or cancel_events[0].is_set():
+                break
+            await synthesize(text)
+        if not cancel_events[0].is_set():
+            data = await run_in_threadpool(packer.finish)
+            if data:
+                await websocket.send_bytes(data)
+        error = receiver.result() if receiver.done() else None
+        if error is not None:
+            await close_websocket(websocket, {"message": "invalid text message", "Exception": error}, 1008)
+        elif not receiver.done():
+            # 正常结束或空闲超时, 客户端仍在连接, 直接关闭 (code 1000)
+            await websocket.close()
+    except WebSocketDisconnect:
+        cancel()
+    except Exception as e:
+        cancel()
+        await close_websocket(websocket, {"message": "tts failed", "Exception": str(e)}, 1011)
+    finally:
+        cancel()
+        receiver.cancel()
+        packer.close()
 
 
 @APP.get("/set_refer_audio")
 async def set_refer_aduio(refer_audio_path: str = None):
     try:
-        tts_pipeline.set_ref_audio(refer_audio_path)
+        with tts_lock:
+            tts_pipeline.set_ref_audio(refer_audio_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "set refer audio failed", "Exception": str(e)})
     return JSONResponse(status_code=200, content={"message": "success"})
@@ -547,7 +1193,10 @@ async def set_gpt_weights(weights_path: str = None):
     try:
         if weights_path in ["", None]:
             return JSONResponse(status_code=400, content={"message": "gpt weight path is required"})
-        tts_pipeline.init_t2s_weights(weights_path)
+        if args.workers > 1:
+            return JSONResponse(status_code=400, content={"message": "changing weights is not supported with --workers > 1"})
+        with tts_lock:
+            tts_pipeline.init_t2s_weights(weights_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "change gpt weight failed", "Exception": str(e)})
 
@@ -559,17 +1208,98 @@ async def set_sovits_weights(weights_path: str = None):
     try:
         if weights_path in ["", None]:
             return JSONResponse(status_code=400, content={"message": "sovits weight path is required"})
-        tts_pipeline.init_vits_weights(weights_path)
+        if args.workers > 1:
+            return JSONResponse(status_code=400, content={"message": "changing weights is not supported with --workers > 1"})
+        with tts_lock:
+            tts_pipeline.init_vits_weights(weights_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "change sovits weight failed", "Exception": str(e)})
     return JSONResponse(status_code=200, content={"message": "success"})
 
 
+
+@APP.get("/prompt_cache_stats")
+async def prompt_cache_stats():
+    return JSONResponse(status_code=200, content=tts_pipeline.get_prompt_cache_stats())
+
+
+@APP.get("/model_pool_stats")
+async def model_pool_stats():
+    return JSONResponse(status_code=200, content=tts_pipeline.get_model_pool_stats())
+
+
+@APP.get("/g2p_cache_stats")
+async def g2p_cache_stats():
+    return JSONResponse(status_code=200, content=get_g2p_cache_stats())
+
+
+@APP.get("/scheduler_stats")
+async def scheduler_stats():
+    if scheduler is None:
+        return JSONResponse(status_code=400, content={"message": "scheduler is not enabled"})
+    return JSONResponse(status_code=200, content=scheduler.stats())
+
+
+def serve_prefork(host: str, port: int, workers: int, threads_per_worker: int):
+    """
+    主进程绑定端口后 fork 出 workers 个工作进程, 各自在同一个 socket 上运行 uvicorn。
+    工作进程意外退出时重新 fork; SIGTERM/SIGINT 结束全部进程, SIGHUP 结束后重新运行。
+    """
+    config = uvicorn.Config(app=APP, host=host, port=port, workers=1)
+    sock = config.bind_socket()
+    if threads_per_worker <= 0:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    children = {}
+    state = {"stopping": False, "restart": False}
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            torch.set_num_threads(threads_per_worker)
+            uvicorn.Server(config).run(sockets=[sock])
+            # 只让 0 号进程退出时执行 atexit (保存 G2P 缓存), 避免多个进程同时写同一个文件
+            if index == 0:
+                sys.exit(0)
+            os._exit(0)
+        children[pid] = index
+        print(f"Started worker {index} (pid {pid})")
+
+    def stop(signum, frame):
+        state["stopping"] = True
+        state["restart"] = signum == signal.SIGHUP
+        for pid in list(children):
+            os.kill(pid, signal.SIGTERM)
+
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, stop)
+    for index in range(workers):
+        spawn(index)
+
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is not None and not state["stopping"]:
+            print(f"Worker {index} (pid {pid}) exited, restarting")
+            spawn(index)
+    sock.close()
+    if state["restart"]:
+        os.execl(sys.executable, sys.executable, *argv)
+
+
 if __name__ == "__main__":
     try:
         if host == "None":  # 在调用时使用 -a None 参数，可以让api监听双栈
             host = None
-        uvicorn.run(app=APP, host=host, port=port, workers=1)
+        if args.workers > 1:
+            # 预先绑定的 socket 需要确定的地址, 双栈时改为监听所有 IPv4 地址
+            serve_prefork(host or "0.0.0.0", port, args.workers, args.threads_per_worker)
+        else:
+            uvicorn.run(app=APP, host=host, port=port, workers=1)
     except Exception:
         traceback.print_exc()
         os.kill(os.getpid(), signal.SIGTERM)
@@ -0,0 +1,122 @@
+"""
+api_v2 并发压测
+
+` python tools/tts_load_test.py --url http://127.0.0.1:9880 -c 20 -n 200 --ref ref1.wav "参考文本1" --ref ref2.wav "参考文本2" `
+
+每个请求轮流使用 --ref 指定的参考音色, 统计整条请求延迟与首包延迟的 p50/p95、请求吞吐;
+服务端开启 --scheduler 时额外通过 /scheduler_stats 统计句子吞吐与平均 batch 大小。
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_TEXTS = [
+    "今天天气不错，我们一起去公园散步吧。路上还可以买一杯咖啡。",
+    "The quick brown fox jumps over the lazy dog. It was a sunny afternoon.",
+    "请在会议开始前五分钟到达会议室。记得带上笔记本电脑和充电器。",
+]
+
+
+def get_json(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return None
+
+
+def one_request(args, i: int) -> dict:
+    ref_audio_path, prompt_text = args.ref[i % len(args.ref)]
+    payload = {
+        "text": args.text[i % len(args.text)],
+        "text_lang": args.text_lang,
+        "ref_audio_path": ref_audio_path,
+        "prompt_text": prompt_text,
+        "prompt_lang": args.prompt_lang,
+        "media_type": "wav",
+        "streaming_mode": args.streaming_mode,
+    }
+    request = urllib.request.Request(
+        f"{args.url}/tts",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    t0 = time.perf_counter()
+    first_byte = None
+    size = 0
+    try:
+        with urllib.request.urlopen(request, timeout=args.timeout) as resp:
+            while True:
+                chunk = resp.read(8192)
+                if not chunk:
+                    break
+                if first_byte is None:
+                    first_byte = time.perf_counter() - t0
+                size += len(chunk)
+        ok = True
+    except Exception as e:
+        print(f"request {i} failed: {e}")
+        ok = False
+    return {"ok": ok, "latency": time.perf_counter() - t0, "first_byte": first_byte, "bytes": size}
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) > 0 else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="api_v2 load test")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:9880")
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("--ref", nargs=2, action="append", metavar=("REF_AUDIO_PATH", "PROMPT_TEXT"), required=True)
+    parser.add_argument("--prompt_lang", type=str, default="zh")
+    parser.add_argument("--text", type=str, nargs="+", default=DEFAULT_TEXTS)
+    parser.add_argument("--text_lang", type=str, default="zh")
+    parser.add_argument("--streaming_mode", type=int, default=0, help="0: 整段返回, 1: 按句返回")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    stats_before = get_json(f"{args.url}/scheduler_stats")
+    done = [0]
+    lock = threading.Lock()
+
+    def task(i):
+        res = one_request(args, i)
+        with lock:
+            done[0] += 1
+            if done[0] % max(1, args.requests // 10) == 0:
+                print(f"{done[0]}/{args.requests}")
+        return res
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(task, range(args.requests)))
+    wall = time.perf_counter() - t0
+    stats_after = get_json(f"{args.url}/scheduler_stats")
+
+    ok = [r for r in results if r["ok"]]
+    latency = [r["latency"] for r in ok]
+    first_byte = [r["first_byte"] for r in ok if r["first_byte"] is not None]
+    print("-" * 60)
+    print(f"concurrency: {args.concurrency}  requests: {args.requests}  failed: {len(results) - len(ok)}")
+    print(f"wall time: {wall:.2f}s  throughput: {len(ok) / wall:.2f} req/s")
+    print(f"latency    p50: {percentile(latency, 50):.3f}s  p95: {percentile(latency, 95):.3f}s")
+    print(f"first byte p50: {percentile(first_byte, 50):.3f}s  p95: {percentile(first_byte, 95):.3f}s")
+    if stats_before is not None and stats_after is not None:
+        sentences = stats_after["sentences"] - stats_before["sentences"]
+        batches = stats_after["batches"] - stats_before["batches"]
+        print(
+            f"scheduler: {sentences / wall:.2f} sentences/s  "
+            f"avg batch size: {sentences / batches if batches > 0 else 0.0:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
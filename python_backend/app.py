@@ -1,14 +1,20 @@
 import os
-from flask import Flask, request, send_file
+from flask import Flask, request, Response, stream_with_context
 from flask_cors import CORS
 import torch
 import uuid
 import time
+import hashlib
+import struct
+import threading
 import librosa
 import soundfile as sf
 import traceback
 import numpy as np
 import re
+from collections import OrderedDict
+
+from worker_pool import DeadlineExceeded, QueueFull, pool_from_env, serve
 
 # Patch torch.load untuk keamanan dan kompatibilitas
 orig_load = torch.load
@@ -29,80 +35,199 @@ print("Starting Optimized Indonesian-Phonetic Engine (XTTS v2)...")
 device = "cuda" if torch.cuda.is_available() else "cpu"
 print(f"Device detecteed: {device}")
 
-# Load model XTTS v2
-# Engine Hindi ('hi') digunakan sebagai basis fonetik Indonesia yang paling akurat
-tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(device)
+OUTPUT_SR = 24000
+# wav: PCM16 dengan header WAV streaming; raw: PCM16 little-endian tanpa header
+MEDIA_TYPES = {'wav', 'raw'}
+
+def load_xtts():
+    global OUTPUT_SR
+    # Load model XTTS v2
+    # Engine Hindi ('hi') digunakan sebagai basis fonetik Indonesia yang paling akurat
+    tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(device)
+    xtts_model = tts.synthesizer.tts_model
+    OUTPUT_SR = xtts_model.config.audio.output_sample_rate
+    return xtts_model
+
+# Setiap worker memegang instance model XTTS sendiri (XTTS_WORKERS), dimuat sekali saat startup.
+# XTTS_MAX_QUEUE membatasi antrian, XTTS_DEADLINE (detik) batas waktu per request.
+pool = pool_from_env("XTTS", init_worker=load_xtts)
 
 UPLOAD_FOLDER = 'temp_audio'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+TEMP_MAX_AGE = 3600
+JANITOR_INTERVAL = 600
+
+# Cache conditioning latents (gpt_cond_latent, speaker_embedding) per hash audio referensi, LRU
+LATENT_CACHE_SIZE = int(os.environ.get("XTTS_LATENT_CACHE_SIZE", "64"))
+_latent_cache = OrderedDict()
+_latent_lock = threading.Lock()
+
+def temp_janitor():
+    """Membersihkan file sementara yang lebih tua dari TEMP_MAX_AGE di background"""
+    while True:
+        now = time.time()
+        for f in os.listdir(UPLOAD_FOLDER):
+            f_path = os.path.join(UPLOAD_FOLDER, f)
+            try:
+                if os.stat(f_path).st_mtime < now - TEMP_MAX_AGE:
+                    os.remove(f_path)
+            except OSError:
+                pass
+        time.sleep(JANITOR_INTERVAL)
+
+threading.Thread(target=temp_janitor, daemon=True).start()
+
+def preprocess_reference(ref_path):
+    # Audio Preprocessing untuk menangkap karakteristik suara asli
+    y, sr = librosa.load(ref_path, sr=22050, mono=True)
+    # Ambil 10 detik terbaik
+    y, _ = librosa.effects.trim(y, top_db=25)
+    y = librosa.util.normalize(y) * 0.95
+    sf.write(ref_path, y, 22050, format='WAV', subtype='PCM_16')
+
+def get_conditioning_latents(xtts_model, audio_bytes):
+    """Latents dari cache; jika belum ada, hitung sekali dari audio referensi lalu simpan"""
+    key = hashlib.sha256(audio_bytes).hexdigest()
+    with _latent_lock:
+        if key in _latent_cache:
+            _latent_cache.move_to_end(key)
+            print(f"[LATENT] Cache hit {key[:12]}")
+            return _latent_cache[key]
+
+    ref_path = os.path.join(UPLOAD_FOLDER, f"ref_{uuid.uuid4()}.wav")
+    try:
+        with open(ref_path, "wb") as f:
+            f.write(audio_bytes)
+        try:
+            preprocess_reference(ref_path)
+        except Exception as e:
+            print(f"[ERROR] Preprocessing: {str(e)}")
+
+        config = xtts_model.config
+        latents = xtts_model.get_conditioning_latents(
+            audio_path=[ref_path],
+            gpt_cond_len=config.gpt_cond_len,
+            gpt_cond_chunk_len=config.gpt_cond_chunk_len,
+            max_ref_length=config.max_ref_len,
+            sound_norm_refs=config.sound_norm_refs,
+        )
+    finally:
+        try: os.remove(ref_path)
+        except OSError: pass
+
+    with _latent_lock:
+        _latent_cache[key] = latents
+        _latent_cache.move_to_end(key)
+        while len(_latent_cache) > LATENT_CACHE_SIZE:
+            _latent_cache.popitem(last=False)
+    return latents
+
+def wav_stream_header(sample_rate, channels=1, sample_width=2):
+    # Panjang data belum diketahui saat streaming, ukuran diisi maksimum agar player membaca sampai EOF
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 0xFFFFFFFF, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate,
+        sample_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b"data", 0xFFFFFFFF,
+    )
+
+def to_pcm16(chunk):
+    chunk = chunk.detach().float().cpu().numpy().reshape(-1)
+    return (np.clip(chunk, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+def synthesis_stream(xtts_model, text, language, latents, **kwargs):
+    """Generator chunk audio PCM16"""
+    gpt_cond_latent, speaker_embedding = latents
+    for chunk in xtts_model.inference_stream(
+        text,
+        language,
+        gpt_cond_latent,
+        speaker_embedding,
+        enable_text_splitting=True,
+        **kwargs,
+    ):
+        yield to_pcm16(chunk)
+
+def clone_job(xtts_model, audio_bytes, text, media_type):
+    """Dijalankan di worker pool dengan model milik worker tersebut"""
+    latents = get_conditioning_latents(xtts_model, audio_bytes)
+
+    print(f"[SYNTHESIS] Cloning using Hindi Phonetic Bridge (Best for Indo)...")
+    # Menggunakan 'hi' (Hindi) karena bunyi vokalnya (A, I, U, E, O)
+    # sangat identik dengan Indonesia. Menghilangkan aksen 'bule'.
+    stream = synthesis_stream(
+        xtts_model,
+        text,
+        "hi",
+        latents,
+        speed=1.2,           # Lebih cepat agar tidak lambat/boring
+        temperature=0.7,     # Keseimbangan antara kemiripan & emosi
+        repetition_penalty=3.0,
+    )
+    try:
+        first_chunk = next(stream, None)
+    except Exception as e:
+        print(f"[ERROR] Engine Failure: {str(e)}")
+        # Fallback terakhir ke 'en' jika 'hi' gagal (meskipun 'hi' pasti ada di list anda)
+        stream = synthesis_stream(xtts_model, text, "en", latents, speed=1.2)
+        first_chunk = next(stream, None)
+    if first_chunk is None:
+        # Engine tidak menghasilkan audio sama sekali (mis. teks kosong setelah splitting)
+        raise RuntimeError("engine produced no audio")
+
+    if media_type == 'wav':
+        yield wav_stream_header(OUTPUT_SR)
+    yield first_chunk
+    yield from stream
+    print(f"[SUCCESS] Natural sound generated.")
+
 @app.route('/clone', methods=['POST'])
 def clone_voice():
-    now = time.time()
-    for f in os.listdir(UPLOAD_FOLDER):
-        f_path = os.path.join(UPLOAD_FOLDER, f)
-        if os.stat(f_path).st_mtime < now - 3600:
-            try: os.remove(f_path)
-            except: pass
-
     if 'audio' not in request.files or 'text' not in request.form:
         return "Missing audio or text", 400
-    
+
     audio_file = request.files['audio']
     text = request.form['text']
-    u_id = str(uuid.uuid4())
-    
-    ref_path = os.path.join(UPLOAD_FOLDER, f"ref_{u_id}.wav")
-    out_path = os.path.join(UPLOAD_FOLDER, f"out_{u_id}.wav")
-    
+    media_type = request.form.get('media_type', 'wav')
+    if media_type not in MEDIA_TYPES:
+        return f"Unsupported media_type: {media_type}, expected one of {sorted(MEDIA_TYPES)}", 400
+
     try:
-        audio_file.save(ref_path)
-        
-        # Audio Preprocessing untuk menangkap karakteristik suara asli
-        y, sr = librosa.load(ref_path, sr=22050, mono=True)
-        # Ambil 10 detik terbaik
-        y, _ = librosa.effects.trim(y, top_db=25)
-        y = librosa.util.normalize(y) * 0.95
-        sf.write(ref_path, y, 22050, format='WAV', subtype='PCM_16')
-        
-    except Exception as e:
-        print(f"[ERROR] Preprocessing: {str(e)}")
+        job = pool.submit(clone_job, audio_file.read(), text, media_type)
+    except QueueFull as e:
+        return "Server busy, retry later", 429, {"Retry-After": str(e.retry_after)}
 
     try:
-        print(f"[SYNTHESIS] Cloning using Hindi Phonetic Bridge (Best for Indo)...")
-        
-        # Menggunakan 'hi' (Hindi) karena bunyi vokalnya (A, I, U, E, O) 
-        # sangat identik dengan Indonesia. Menghilangkan aksen 'bule'.
-        tts.tts_to_file(
-            text=text,
-            speaker_wav=ref_path,
-            language="hi", 
-            file_path=out_path,
-            speed=1.2,           # Lebih cepat agar tidak lambat/boring
-            temperature=0.7,     # Keseimbangan antara kemiripan & emosi
-            repetition_penalty=3.0,
-            enable_text_splitting=True
-        )
-        
-        if os.path.exists(out_path) and os.path.getsize(out_path) > 100:
-            print(f"[SUCCESS] Natural sound generated.")
-            return send_file(out_path, mimetype='audio/wav')
-        else:
-            return "Synthesis failed", 500
-            
+        # Chunk pertama ditunggu di sini agar error engine masih bisa dikembalikan sebagai 500
+        first_chunk = job.next_chunk()
+    except DeadlineExceeded:
+        return "Deadline exceeded", 504
     except Exception as e:
-        print(f"[ERROR] Engine Failure: {str(e)}")
-        # Fallback terakhir ke 'en' jika 'hi' gagal (meskipun 'hi' pasti ada di list anda)
-        try:
-             tts.tts_to_file(text=text, speaker_wav=ref_path, language="en", file_path=out_path, speed=1.2)
-             return send_file(out_path, mimetype='audio/wav')
-        except:
-             return f"AI Engine Error: {str(e)}", 500
+        traceback.print_exc()
+        return f"AI Engine Error: {str(e)}", 500
+    if first_chunk is None:
+        return "Synthesis failed", 500
+
+    # audio/L16 berarti big-endian, sedangkan raw di sini little-endian, jadi dilabeli octet-stream
+    mimetype = 'audio/wav' if media_type == 'wav' else 'application/octet-stream'
+    return Response(
+        stream_with_context(job.stream(first_chunk)),
+        mimetype=mimetype,
+        headers={"X-Sample-Rate": str(OUTPUT_SR)},
+    )
 
 @app.route('/health', methods=['GET'])
 def health():
-    return {"status": "ok", "engine": "XTTSv2-Phonetic", "device": device}
+    return {
+        "status": "ok",
+        "engine": "XTTSv2-Phonetic",
+        "device": device,
+        "latent_cache": len(_latent_cache),
+        **pool.stats(),
+    }
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    serve(app, pool, '0.0.0.0', 5000)
@@ -1,129 +1,204 @@
 """
-GPT-SoVITS Bridge Server v2.5 - ULTRA-ROBUST
+GPT-SoVITS Bridge Server v2.6 - ZERO-DISK
 Indonesian Native + Fallback (No FFmpeg required)
 """
 
 import os
+import io
+import base64
+import hashlib
+import tempfile
+import threading
+import traceback
+from collections import OrderedDict
+
 import requests
-from flask import Flask, request, send_file
+from requests.adapters import HTTPAdapter
+from flask import Flask, request, Response, stream_with_context
 from flask_cors import CORS
-import uuid
-import time
-import traceback
 import librosa
 import soundfile as sf
 import numpy as np
 
+from worker_pool import DeadlineExceeded, QueueFull, pool_from_env, serve
+
 app = Flask(__name__)
 CORS(app)
 
-UPLOAD_FOLDER = os.path.join(os.getcwd(), 'temp_audio')
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
 GSV_API_URL = "http://127.0.0.1:9880/tts"
+REF_SR = 32000
+WHISPER_SR = 16000
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# Antrian terbatas di depan api_v2: GSV_WORKERS request diproses bersamaan,
+# GSV_MAX_QUEUE menunggu, sisanya dijawab 429. GSV_DEADLINE (detik) batas waktu per request.
+pool = pool_from_env("GSV")
+
+# Koneksi keep-alive ke api_v2, dipakai ulang oleh semua request
+_gsv_session = requests.Session()
+_gsv_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool.workers))
+
+class UpstreamError(Exception):
+    pass
 
-# Lazy load whisper untuk menghindari error saat startup jika ffmpeg tidak ada
+# Whisper dimuat sekali saat startup (lihat __main__); jika gagal dimuat, prompt dikosongkan
 _stt_model = None
+_stt_lock = threading.Lock()
+
+# Cache transkrip Whisper (LRU), key = sha256 dari audio referensi yang sudah dipotong
+TRANSCRIPT_CACHE_SIZE = int(os.environ.get("TRANSCRIPT_CACHE_SIZE", "256"))
+_transcript_cache = OrderedDict()
+_transcript_lock = threading.Lock()
 
 def get_stt_model():
     global _stt_model
-    if _stt_model is None:
-        try:
-            import whisper
-            device = "cuda" if os.environ.get("USE_GPU") == "1" else "cpu"
-            print(f"📦 Loading Whisper model...")
-            _stt_model = whisper.load_model("base")
-        except:
-            print("⚠️ Whisper failed to load. Using empty prompt fallback.")
-            _stt_model = False
+    with _stt_lock:
+        if _stt_model is None:
+            try:
+                import whisper
+                device = "cuda" if os.environ.get("USE_GPU") == "1" else "cpu"
+                print(f"📦 Loading Whisper model...")
+                _stt_model = whisper.load_model("base", device=device)
+            except:
+                print("⚠️ Whisper failed to load. Using empty prompt fallback.")
+                _stt_model = False
     return _stt_model
 
-def python_trim_audio(input_path, output_path):
-    """Memotong audio menggunakan Librosa (7 detik dari tengah)"""
+def decode_audio(data, filename=""):
+    """Decode upload langsung dari memori; format yang tidak didukung soundfile lewat file sementara"""
+    try:
+        return librosa.load(io.BytesIO(data), sr=REF_SR)
+    except Exception:
+        suffix = os.path.splitext(filename)[1] or ".wav"
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+            f.write(data)
+        try:
+            return librosa.load(f.name, sr=REF_SR)
+        finally:
+            os.remove(f.name)
+
+def python_trim_audio(y, sr):
+    """Memotong audio di memori (7 detik dari tengah)"""
+    duration = librosa.get_duration(y=y, sr=sr)
+    start_sec = max(0, (duration / 2) - 3.5)
+    end_sec = start_sec + 7
+    start_sample = int(start_sec * sr)
+    end_sample = int(end_sec * sr)
+    return y[start_sample:end_sample]
+
+def encode_wav(y, sr):
+    buffer = io.BytesIO()
+    sf.write(buffer, y, sr, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+def transcribe(y, sr, audio_hash):
+    """Transkrip Whisper dari array numpy (tanpa ffmpeg), hasilnya di-cache per hash audio"""
+    with _transcript_lock:
+        if audio_hash in _transcript_cache:
+            _transcript_cache.move_to_end(audio_hash)
+            print(f"[WHISPER] Cache hit {audio_hash[:12]}")
+            return _transcript_cache[audio_hash]
+
+    prompt_text = ""
     try:
-        y, sr = librosa.load(input_path, sr=32000)
-        duration = librosa.get_duration(y=y, sr=sr)
-        start_sec = max(0, (duration / 2) - 3.5)
-        end_sec = start_sec + 7
-        start_sample = int(start_sec * sr)
-        end_sample = int(end_sec * sr)
-        y_trimmed = y[start_sample:end_sample]
-        sf.write(output_path, y_trimmed, sr)
-        return True
+        model = get_stt_model()
+        if model:
+            print(f"[WHISPER] Transcribing...")
+            audio_16k = librosa.resample(y, orig_sr=sr, target_sr=WHISPER_SR).astype(np.float32)
+            with _stt_lock:
+                result = model.transcribe(audio_16k, language="id")
+            prompt_text = result.get("text", "").strip()
+            print(f"[WHISPER] Prompt: \"{prompt_text}\"")
+    except Exception as stt_err:
+        print(f"⚠️ STT Skip: {stt_err}")
+        return ""
+
+    with _transcript_lock:
+        _transcript_cache[audio_hash] = prompt_text
+        _transcript_cache.move_to_end(audio_hash)
+        while len(_transcript_cache) > TRANSCRIPT_CACHE_SIZE:
+            _transcript_cache.popitem(last=False)
+    return prompt_text
+
+def clone_job(_, raw_bytes, filename, text, media_type, streaming_mode):
+    """Dijalankan di worker pool: potong audio, transkrip, lalu teruskan audio dari api_v2 chunk demi chunk"""
+    # Potong audio (di memori)
+    print(f"[GSV-OPTIMIZE] Trimming audio...")
+    try:
+        y, sr = decode_audio(raw_bytes, filename)
+        y = python_trim_audio(y, sr)
+        ref_bytes = encode_wav(y, sr)
     except Exception as e:
         print(f"[PY-TRIM-ERROR] {e}")
-        return False
+        y, sr, ref_bytes = None, None, raw_bytes
+
+    audio_hash = hashlib.sha256(ref_bytes).hexdigest()
+    prompt_text = transcribe(y, sr, audio_hash) if y is not None else ""
+
+    # Generate Voice
+    print(f"[GSV-BRIDGE] Generating Native Indo Voice...")
+    payload = {
+        "text": text,
+        "text_lang": "id",
+        "ref_audio_base64": base64.b64encode(ref_bytes).decode("ascii"),
+        "prompt_lang": "id",
+        "prompt_text": prompt_text,
+        "media_type": media_type,
+        "streaming_mode": streaming_mode,
+    }
+
+    upstream = _gsv_session.post(GSV_API_URL, json=payload, stream=True, timeout=pool.deadline)
+    try:
+        if upstream.status_code != 200:
+            raise UpstreamError(upstream.text)
+        for chunk in upstream.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            if chunk:
+                yield chunk
+    finally:
+        upstream.close()
 
 @app.route('/clone', methods=['POST'])
 def clone_voice():
     if 'audio' not in request.files or 'text' not in request.form:
         return "Missing audio or text", 400
-    
+
     audio_file = request.files['audio']
     text = request.form['text']
-    u_id = str(uuid.uuid4())
-    
-    raw_path = os.path.abspath(os.path.join(UPLOAD_FOLDER, f"raw_{u_id}.wav"))
-    ref_path = os.path.abspath(os.path.join(UPLOAD_FOLDER, f"ref_{u_id}.wav"))
-    out_path = os.path.abspath(os.path.join(UPLOAD_FOLDER, f"out_{u_id}.wav"))
-    
+    media_type = request.form.get('media_type', 'wav')
+    streaming_mode = int(request.form.get('streaming_mode', 0))
+
     try:
-        audio_file.save(raw_path)
-        
-        # Potong audio
-        print(f"[GSV-OPTIMIZE] Trimming audio...")
-        success = python_trim_audio(raw_path, ref_path)
-        final_ref = ref_path if success and os.path.exists(ref_path) else raw_path
-        
-        # Auto-Transcribe dengan error handling ([WinError 2] fix)
-        prompt_text = ""
-        try:
-            model = get_stt_model()
-            if model:
-                print(f"[WHISPER] Transcribing...")
-                # Whisper butuh ffmpeg. Jika tdk ada, bagian ini akan error.
-                # Kita tangkap errornya agar tidak mematikan seluruh server.
-                result = model.transcribe(final_ref, language="id")
-                prompt_text = result.get("text", "").strip()
-                print(f"[WHISPER] Prompt: \"{prompt_text}\"")
-        except Exception as stt_err:
-            print(f"⚠️ STT Skip: {stt_err} (Mungkin FFmpeg tidak ada)")
-            prompt_text = ""
-
-        # Generate Voice
-        print(f"[GSV-BRIDGE] Generating Native Indo Voice...")
-        payload = {
-            "text": text,
-            "text_lang": "id", 
-            "ref_audio_path": final_ref,
-            "prompt_lang": "id",
-            "prompt_text": prompt_text,
-            "media_type": "wav"
-        }
-        
-        time.sleep(0.3)
-        response = requests.get(GSV_API_URL, params=payload, timeout=300)
-        
-        if response.status_code == 200:
-            with open(out_path, "wb") as f:
-                f.write(response.content)
-            return send_file(out_path, mimetype='audio/wav')
-        else:
-            return f"API Error: {response.text}", 500
-            
+        job = pool.submit(
+            clone_job, audio_file.read(), audio_file.filename or "", text, media_type, streaming_mode
+        )
+    except QueueFull as e:
+        return "Server busy, retry later", 429, {"Retry-After": str(e.retry_after)}
+
+    try:
+        # Chunk pertama ditunggu di sini agar error masih bisa dikembalikan sebagai 500
+        first_chunk = job.next_chunk()
+    except DeadlineExceeded:
+        return "Deadline exceeded", 504
+    except UpstreamError as e:
+        return f"API Error: {e}", 500
     except Exception as e:
         traceback.print_exc()
         return f"Bridge failure: {str(e)}", 500
-    finally:
-        for p in [raw_path, ref_path]:
-            if os.path.exists(p):
-                try: os.remove(p)
-                except: pass
+    if first_chunk is None:
+        return "API Error: empty response", 500
+
+    return Response(stream_with_context(job.stream(first_chunk)), mimetype=f"audio/{media_type}")
 
 @app.route('/health', methods=['GET'])
 def health():
-    return {"status": "online", "engine": "GPT-SoVITS-Robust-V2.5"}
+    return {
+        "status": "online",
+        "engine": "GPT-SoVITS-ZeroDisk-V2.6",
+        "transcript_cache": len(_transcript_cache),
+        **pool.stats(),
+    }
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # Whisper dimuat sekali saat startup, bukan pada request pertama
+    get_stt_model()
+    serve(app, pool, '0.0.0.0', 5001)
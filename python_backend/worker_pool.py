@@ -0,0 +1,184 @@
+"""
+Worker pool untuk bridge Flask (app.py / app_gptsovits.py)
+
+Antrian kerja terbatas di depan model, sejumlah worker thread yang masing-masing
+memegang state sendiri (misalnya instance model), backpressure (QueueFull -> 429),
+dan deadline per request.
+"""
+
+import math
+import os
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Job:
+    """Satu request. fn adalah generator; hasilnya diteruskan chunk demi chunk ke handler HTTP"""
+
+    def __init__(self, fn, args, kwargs, deadline):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.cancelled = threading.Event()
+        self.results = queue.Queue()
+
+    def expired(self):
+        return time.monotonic() > self.deadline
+
+    def next_chunk(self):
+        """Menunggu chunk berikutnya; None jika selesai. Error dari worker dilempar ulang di sini"""
+        timeout = self.deadline - time.monotonic()
+        try:
+            item = self.results.get(timeout=max(timeout, 0))
+        except queue.Empty:
+            self.cancel()
+            raise DeadlineExceeded()
+        if item is _DONE:
+            return None
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def stream(self, first_chunk=None):
+        """Generator untuk Response Flask; klien putus -> job dibatalkan lewat GeneratorExit"""
+        try:
+            if first_chunk is not None:
+                yield first_chunk
+            while True:
+                chunk = self.next_chunk()
+                if chunk is None:
+                    return
+                yield chunk
+        except DeadlineExceeded:
+            print("[POOL] Deadline exceeded while streaming")
+        except Exception as e:
+            # Header sudah terkirim, stream hanya bisa diakhiri
+            print(f"[POOL] Streaming error: {e}")
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class WorkPool:
+    def __init__(self, workers=1, max_queue=8, deadline=300.0, init_worker=None, name="pool"):
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.deadline = float(deadline)
+        self.name = name
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.avg_seconds = 0.0
+
+        # Model dimuat sekali saat startup, satu state per worker
+        states = [init_worker() if init_worker is not None else None for _ in range(self.workers)]
+        for i, state in enumerate(states):
+            threading.Thread(target=self._run, args=(state,), name=f"{name}-worker-{i}", daemon=True).start()
+
+    def retry_after(self):
+        """Perkiraan detik sampai ada slot kosong, untuk header Retry-After"""
+        avg = self.avg_seconds if self.avg_seconds > 0 else 5.0
+        return max(1, math.ceil(avg * (self._queue.qsize() + 1) / self.workers))
+
+    def submit(self, fn, *args, deadline=None, **kwargs):
+        job = Job(fn, args, kwargs, time.monotonic() + (deadline or self.deadline))
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull(self.retry_after())
+        return job
+
+    def _run(self, state):
+        while True:
+            job = self._queue.get()
+            if job.cancelled.is_set() or job.expired():
+                # Kedaluwarsa selama mengantri, tidak perlu dikerjakan
+                with self._lock:
+                    self.expired += 1
+                job.results.put(DeadlineExceeded())
+                continue
+
+            with self._lock:
+                self.in_flight += 1
+            t0 = time.monotonic()
+            ok = False
+            chunks = None
+            try:
+                chunks = job.fn(state, *job.args, **job.kwargs)
+                for chunk in chunks:
+                    if job.cancelled.is_set() or job.expired():
+                        break
+                    job.results.put(chunk)
+                ok = True
+            except Exception as e:
+                job.results.put(e)
+            finally:
+                if chunks is not None:
+                    chunks.close()
+                job.results.put(_DONE)
+                elapsed = time.monotonic() - t0
+                with self._lock:
+                    self.in_flight -= 1
+                    if ok:
+                        self.completed += 1
+                        self.avg_seconds = elapsed if self.avg_seconds == 0 else 0.8 * self.avg_seconds + 0.2 * elapsed
+                    else:
+                        self.failed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self._queue.qsize(),
+                "queue_max": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "avg_seconds": round(self.avg_seconds, 3),
+                "deadline_seconds": self.deadline,
+            }
+
+
+def pool_from_env(prefix, init_worker=None, default_workers=1):
+    """Konfigurasi dari environment: {prefix}_WORKERS, {prefix}_MAX_QUEUE, {prefix}_DEADLINE"""
+    return WorkPool(
+        workers=int(os.environ.get(f"{prefix}_WORKERS", default_workers)),
+        max_queue=int(os.environ.get(f"{prefix}_MAX_QUEUE", "8")),
+        deadline=float(os.environ.get(f"{prefix}_DEADLINE", "300")),
+        init_worker=init_worker,
+        name=prefix.lower(),
+    )
+
+
+def serve(app, pool, host, port):
+    """Server WSGI produksi (waitress) menggantikan app.run(debug=True)"""
+    from waitress import serve as waitress_serve
+
+    # Thread koneksi cukup untuk worker + antrian, sehingga request berlebih dijawab 429 dan tidak menggantung
+    threads = pool.workers + pool.max_queue + 4
+    print(f"🚀 Serving on {host}:{port} ({pool.workers} workers, queue {pool.max_queue}, {threads} threads)")
+    waitress_serve(app, host=host, port=port, threads=threads)